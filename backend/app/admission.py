@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Admission control (rate limiting and load shedding) in front of the routes that hit mongo and minio hardest.
+
+Every request is put into a route class (`ROUTE_CLASSES`, e.g. uploads, exports, the patient list, everything else)
+and only admitted if:
+- the client's token bucket for that route class has a token left (`client_rate` tokens per second, up to
+  `client_burst`), clients being told apart by their address (as forwarded by nginx, which is only trusted from the
+  `FORWARDED_ALLOW_IPS` proxies, see `gunicorn_conf.py`) or the `ADMISSION_CLIENT_HEADER` request header
+- the route class' token bucket shared by all clients has a token left (`route_rate`/`route_burst`)
+
+Both buckets are checked at once and a token is only taken out of either if both have one, so a request shed by the
+route bucket does not cost the client a token.
+
+`ADMISSION_CLIENT_HEADER` is taken as is, i.e. whoever sends the request picks the bucket it is counted against. Only
+set it when the api is reachable through a proxy alone (`FORWARDED_ALLOW_IPS`) that sets that header itself,
+overwriting whatever the client sent (e.g. to an authenticated user or device id), otherwise clients can dodge their
+limits by making up a new id per request.
+- fewer than `max_concurrency` requests of the route class are in flight in this worker (uploads, exports, bulk
+  creates, image downloads)
+
+Requests that are not admitted are answered straight away with a `429 Too Many Requests` and a `Retry-After` header
+instead of piling up in front of mongo/minio, which keeps the (unlimited but for the per client bucket) detail view
+responsive during upload bursts at shift start. The defaults (`DEFAULT_ROUTE_LIMITS`) can be overridden per route class
+via `ADMISSION_LIMITS`, a json object such as `{"upload": {"client_rate": 2, "max_concurrency": 8}}`.
+
+The token buckets are kept in the backend picked via `ADMISSION_BACKEND`:
+- `memory` (default): per process buckets, bounded to `ADMISSION_MAX_BUCKETS` buckets
+- `redis`: any redis compatible server at `REDIS_URL` (needs the optional `redis` package), shared between workers
+- `none`: admission control disabled
+
+The concurrency caps are always per worker process.
+"""
+import os
+import re
+import json
+import math
+import time
+from collections import OrderedDict, Counter
+from fastapi.responses import ORJSONResponse
+
+
+DEFAULT_MAX_BUCKETS = 100000
+
+# (method, path pattern, route class) checked in order, the first match wins and anything else is `default`
+ROUTE_CLASSES = [
+    ("PUT", re.compile(r"/patients/[^/]+"), "upload"),
+    ("POST", re.compile(r"/patients/[^/]+/images/uploads(/complete)?"), "upload"),
+    ("POST", re.compile(r"/patients/bulk|/patients/[^/]+/images/bulk"), "bulk"),
+    ("GET", re.compile(r"/patients/export"), "export"),
+    ("GET", re.compile(r"/patients/?"), "list"),
+    ("GET", re.compile(r"/images/.+"), "image"),
+]
+# probes and scrapes are never limited
+EXEMPT_PATHS = re.compile(r"/health/.*|/metrics")
+
+
+class RouteLimits:
+
+    def __init__(self, client_rate: float = None, client_burst: int = None, route_rate: float = None,
+                 route_burst: int = None, max_concurrency: int = None):
+        self.client_rate = client_rate
+        self.client_burst = client_burst or (math.ceil(client_rate) if client_rate else None)
+        self.route_rate = route_rate
+        self.route_burst = route_burst or (math.ceil(route_rate) if route_rate else None)
+        self.max_concurrency = max_concurrency
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+DEFAULT_ROUTE_LIMITS = {
+    "default": RouteLimits(client_rate=100, client_burst=200),
+    "list": RouteLimits(client_rate=20, client_burst=60, route_rate=200, route_burst=400),
+    "upload": RouteLimits(client_rate=5, client_burst=30, route_rate=50, route_burst=100, max_concurrency=16),
+    # bulk patient creates and whole study image ingests
+    "bulk": RouteLimits(client_rate=1, client_burst=10, max_concurrency=4),
+    "export": RouteLimits(client_rate=0.5, client_burst=5, max_concurrency=2),
+    # a detail view loads a handful of images at once, and large scans keep a connection to storage busy for a while
+    "image": RouteLimits(client_rate=50, client_burst=200, max_concurrency=64),
+}
+
+
+class MemoryBackend:
+    """
+    In process token buckets, least recently used buckets are dropped (i.e. start over full) once `max_buckets` is
+    reached
+    """
+
+    def __init__(self, max_buckets: int = DEFAULT_MAX_BUCKETS, clock=time.monotonic):
+        self.max_buckets = max_buckets
+        self._clock = clock
+        self._buckets = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """
+        Take a token out of the bucket `key` (refilled at `rate` tokens per second up to `burst` tokens)
+        :return: 0 if a token was taken, else the number of seconds until the next token is available
+        """
+        return (await self.take_all([(key, rate, burst)]))[0]
+
+    async def take_all(self, buckets: list[tuple]) -> list[float]:
+        """
+        Take a token out of each of the `buckets` (tuples of key, rate and burst, see `take`) if every one of them has a
+        token, else out of none of them
+        :return: per bucket 0 if it had a token, else the number of seconds until its next token is available
+        """
+        now = self._clock()
+        refilled = []
+        for key, rate, burst in buckets:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            refilled.append(min(burst, tokens + (now - updated_at) * rate))
+        retry_afters = [0.0 if tokens >= 1 else (1 - tokens) / rate for tokens, (_, rate, _) in zip(refilled, buckets)]
+        admitted = not any(retry_afters)
+        for tokens, (key, _, _) in zip(refilled, buckets):
+            self._buckets[key] = (tokens - 1 if admitted else tokens, now)
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return retry_afters
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "buckets": len(self._buckets), "max_buckets": self.max_buckets}
+
+
+class RedisBackend:
+    """
+    Token buckets shared by every worker, kept in a redis compatible server. Takes any client exposing the
+    `redis.asyncio` style `eval` coroutine.
+
+    The buckets work exactly like the `MemoryBackend` ones, every take is a lua script (so a single atomic round trip)
+    refilling the buckets for the time passed since the last take and taking a token out of each of them if they all
+    have one. A bucket expires once it would be full again, which is as good as full.
+    """
+
+    # KEYS: buckets  ARGV: now, then rate and burst per bucket
+    # (numbers are stored and returned as full precision strings, redis would truncate a lua number returned as is)
+    TAKE_SCRIPT = """
+        local now = tonumber(ARGV[1])
+        local tokens, retry_afters, admitted = {}, {}, true
+        for i, key in ipairs(KEYS) do
+            local rate, burst = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+            local bucket = redis.call('hmget', key, 'tokens', 'updated_at')
+            local updated_at = tonumber(bucket[2]) or now
+            -- (workers' clocks may be a bit apart)
+            tokens[i] = math.min(burst, (tonumber(bucket[1]) or burst) + math.max(0, now - updated_at) * rate)
+            retry_afters[i] = 0
+            if tokens[i] < 1 then
+                retry_afters[i] = (1 - tokens[i]) / rate
+                admitted = false
+            end
+        end
+        for i, key in ipairs(KEYS) do
+            local rate, burst = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+            if admitted then
+                tokens[i] = tokens[i] - 1
+            end
+            local stored = string.format('%.17g', tokens[i])
+            redis.call('hset', key, 'tokens', stored, 'updated_at', string.format('%.17g', now))
+            redis.call('expire', key, math.ceil(burst / rate) + 1)
+            retry_afters[i] = string.format('%.17g', retry_afters[i])
+        end
+        return retry_afters
+    """
+
+    def __init__(self, redis_client, prefix: str = "fos:admission:", clock=time.time):
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self._clock = clock
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """
+        Take a token out of the bucket `key` (refilled at `rate` tokens per second up to `burst` tokens)
+        :return: 0 if a token was taken, else the number of seconds until the next token is available
+        """
+        return (await self.take_all([(key, rate, burst)]))[0]
+
+    async def take_all(self, buckets: list[tuple]) -> list[float]:
+        """
+        Take a token out of each of the `buckets` (tuples of key, rate and burst, see `take`) if every one of them has a
+        token, else out of none of them
+        :return: per bucket 0 if it had a token, else the number of seconds until its next token is available
+        """
+        retry_afters = await self.redis_client.eval(
+            self.TAKE_SCRIPT, len(buckets), *(f"{self.prefix}{key}" for key, _, _ in buckets),
+            self._clock(), *(value for _, rate, burst in buckets for value in (rate, burst))
+        )
+        return [float(retry_after) for retry_after in retry_afters]
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
+
+    async def close(self):
+        await self.redis_client.aclose()
+
+
+class Rejected(Exception):
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+
+    def __init__(self, backend, limits: dict = None, client_header: str = None):
+        self.backend = backend
+        self.limits = {**DEFAULT_ROUTE_LIMITS, **(limits or {})}
+        self.client_header = client_header.lower() if client_header else None
+        self.in_flight = Counter()
+        self.admitted = Counter()
+        self.rejected = Counter()
+
+    def client_key(self, scope) -> str:
+        if self.client_header:
+            for name, value in scope["headers"]:
+                if name.decode("latin-1") == self.client_header:
+                    return value.decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def admit(self, route_class: str, client: str):
+        """
+        Check a request of `route_class` by `client` against the limits and take up a concurrency slot if it is admitted
+        (hand that back via `release`)
+        :raises Rejected: if the request is to be shed
+        """
+        limits = self.limits.get(route_class, self.limits["default"])
+        if limits.max_concurrency is not None and self.in_flight[route_class] >= limits.max_concurrency:
+            self.rejected[(route_class, "concurrency")] += 1
+            # in flight requests of heavy routes tend to take a while, so a second is as good a guess as any
+            raise Rejected("concurrency", 1)
+        # take up the slot before awaiting the buckets, requests coming in meanwhile have to see it taken
+        self.in_flight[route_class] += 1
+        buckets, reasons = [], []
+        if limits.client_rate:
+            buckets.append((f"{route_class}:client:{client}", limits.client_rate, limits.client_burst))
+            reasons.append("client_rate")
+        if limits.route_rate:
+            buckets.append((f"{route_class}:route", limits.route_rate, limits.route_burst))
+            reasons.append("route_rate")
+        try:
+            if buckets and any(retry_afters := await self.backend.take_all(buckets)):
+                reason = next(reason for reason, retry_after in zip(reasons, retry_afters) if retry_after)
+                raise Rejected(reason, max(retry_afters))
+        except BaseException as e:
+            self.release(route_class)
+            if isinstance(e, Rejected):
+                self.rejected[(route_class, e.reason)] += 1
+            raise
+        self.admitted[route_class] += 1
+
+    def release(self, route_class: str):
+        self.in_flight[route_class] -= 1
+
+    def stats(self) -> dict:
+        return {
+            **self.backend.stats(),
+            "limits": {route_class: limits.as_dict() for route_class, limits in self.limits.items()},
+            "in_flight": dict(self.in_flight),
+            "admitted": dict(self.admitted),
+            "rejected": {f"{route_class}:{reason}": count for (route_class, reason), count in self.rejected.items()},
+        }
+
+    async def close(self):
+        if hasattr(self.backend, "close"):
+            await self.backend.close()
+
+
+def route_class(method: str, path: str):
+    """
+    :return: the route class of a request, or None if it is exempt from admission control
+    """
+    if EXEMPT_PATHS.fullmatch(path):
+        return None
+    for route_method, pattern, name in ROUTE_CLASSES:
+        if method == route_method and pattern.fullmatch(path):
+            return name
+    return "default"
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware running every http request past the app's `admission` controller (if it has one)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        controller = getattr(scope.get("app"), "admission", None)
+        if scope["type"] != "http" or controller is None:
+            return await self.app(scope, receive, send)
+
+        path = scope["path"]
+        if (root_path := scope.get("root_path")) and path.startswith(root_path):
+            path = path[len(root_path):]
+        if (name := route_class(scope["method"], path)) is None:
+            return await self.app(scope, receive, send)
+
+        try:
+            await controller.admit(name, controller.client_key(scope))
+        except Rejected as e:
+            retry_after = max(1, math.ceil(e.retry_after))
+            response = ORJSONResponse(
+                {"detail": f"Too many requests ({e.reason} limit of the {name} routes), retry in {retry_after}s"},
+                status_code=429,
+                headers={"Retry-After": str(retry_after)}
+            )
+            return await response(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(name)
+
+
+def load_limits(raw: str) -> dict:
+    """
+    Parse the `ADMISSION_LIMITS` overrides, unspecified settings of a known route class keep their default
+    """
+    try:
+        overrides = json.loads(raw)
+        return {
+            name: RouteLimits(**{
+                **(DEFAULT_ROUTE_LIMITS[name].as_dict() if name in DEFAULT_ROUTE_LIMITS else {}),
+                # a new rate without a burst gets the matching default burst rather than the old one
+                **({"client_burst": None} if "client_rate" in settings else {}),
+                **({"route_burst": None} if "route_rate" in settings else {}),
+                **settings
+            })
+            for name, settings in overrides.items()
+        }
+    except (TypeError, ValueError, AttributeError) as e:
+        raise SystemError(f"Invalid ADMISSION_LIMITS: {raw}") from e
+
+
+def create_admission_controller():
+    """
+    Build the admission controller configured via the environment (see the module docstring)
+    :return: the controller, or None if admission control is disabled
+    """
+    backend_name = os.environ.get("ADMISSION_BACKEND", "memory")
+    limits = load_limits(os.environ["ADMISSION_LIMITS"]) if os.environ.get("ADMISSION_LIMITS") else None
+    client_header = os.environ.get("ADMISSION_CLIENT_HEADER")
+    if backend_name == "memory":
+        max_buckets = int(os.environ.get("ADMISSION_MAX_BUCKETS", DEFAULT_MAX_BUCKETS))
+        return AdmissionController(MemoryBackend(max_buckets=max_buckets), limits=limits, client_header=client_header)
+    if backend_name == "redis":
+        try:
+            import redis.asyncio
+        except ImportError:
+            raise SystemError("ADMISSION_BACKEND=redis requires the `redis` package to be installed")
+        if "REDIS_URL" not in os.environ:
+            raise SystemError("Missing environment variable: REDIS_URL")
+        return AdmissionController(
+            RedisBackend(redis.asyncio.from_url(os.environ["REDIS_URL"])), limits=limits, client_header=client_header
+        )
+    if backend_name == "none":
+        return None
+    raise SystemError(f"Unknown ADMISSION_BACKEND: {backend_name}")
@@ -1,7 +1,11 @@
 #!/bin/sh
 
-SCRIPT_DIR=$(realpath $(dirname $0))
-${SCRIPT_DIR}/minio_init.sh || exit 1
+# Buckets, indexes and fixture data are set up by the separate bootstrap job (see `python -m app.bootstrap`)
+# (exec so that the server itself gets the container's SIGTERM and can shut down gracefully)
+if [ "${SERVING_MODE}" = "production" ]; then
+    # gunicorn supervising WEB_CONCURRENCY uvicorn workers, see gunicorn_conf.py
+    exec gunicorn -c python:app.gunicorn_conf app.main:app
+fi
 
 # If running behind a proxy like Nginx or Traefik add --proxy-headers
-uvicorn app.main:app --proxy-headers --reload --host 0.0.0.0 --port 80 --root-path ${PROXY_PREFIX_PATH} || exit 1
+exec uvicorn app.main:app --proxy-headers --reload --host 0.0.0.0 --port 80 --root-path ${PROXY_PREFIX_PATH}
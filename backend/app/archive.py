@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Lifecycle of the patient images: images taken more than `ARCHIVE_AFTER_DAYS` days ago are rarely looked at again, so
+they are moved out of the hot patient image bucket into the `ARCHIVE_IMG_BUCKET` (cold) bucket, optionally stored with
+the `ARCHIVE_STORAGE_CLASS` storage class (e.g. `STANDARD_IA` or `GLACIER_IR` on s3) and marked with the archive `tier`
+on their metadata document. The detail and image history endpoints leave archived images out unless asked to include
+them. Their thumbnail/preview renditions are small and stay in the hot bucket, so archived images can still be browsed.
+
+An image is copied to the cold bucket before it is marked as archived and only then dropped from the hot bucket, so
+its content is always in at least one of the two (the image endpoint falls back to the cold bucket, see
+`image_proxy.py`). A content addressed image (see `blobs.py`) only leaves the hot bucket once every reference on its
+content is an archived image (no hot image, nor an upload still on its way, refers to it), and re-uploads of archived
+content bring it back into the hot bucket.
+
+Each pass walks the hot images in `(img_timestamp, _id)` order off the `tier_img_timestamp_id` index (see
+`indexes.py`), so it only ever reads the images it is after, however many got archived already.
+
+The api workers run an archival pass every `ARCHIVE_INTERVAL_SECONDS` when `ARCHIVE_IMG_BUCKET` is set. Passes are
+idempotent (workers racing each other at worst copy an image twice), so the same can also be run as a one off instead,
+e.g. from a cron job:
+    python -m app.archive
+"""
+import os
+import asyncio
+import logging
+import datetime
+from botocore.exceptions import ClientError
+from . import utils, storage, indexes
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_AFTER_DAYS = 365
+DEFAULT_INTERVAL_SECONDS = 3600
+DEFAULT_BATCH_SIZE = 500
+ARCHIVE_SCAN_SORT = [("img_timestamp", 1), ("_id", 1)]
+
+
+def _is_not_found(error: ClientError) -> bool:
+    return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+
+def build_archive_query(older_than: datetime.datetime, last: dict = None) -> dict:
+    """
+    Query of the hot images taken before `older_than`, in `ARCHIVE_SCAN_SORT` order
+    :param last: the last image (`img_timestamp` and `_id`) of the previous batch, to continue after
+    """
+    query = {"img_timestamp": {"$lt": utils.as_utc(older_than)}, **utils.HOT_IMAGES}
+    if last is not None:
+        query["$or"] = [
+            {"img_timestamp": {"$gt": last["img_timestamp"]}},
+            {"img_timestamp": last["img_timestamp"], "_id": {"$gt": last["_id"]}},
+        ]
+    return query
+
+
+async def archive_image(db_client, object_storage, image_doc: dict, hot_bucket: str, cold_bucket: str,
+                        storage_class: str = None) -> bool:
+    """
+    Move a single (hot) image to the cold bucket (see the module docstring)
+    :param image_doc: the image's metadata document (at least its `_id`, `object_key` and `sha256`)
+    :return: whether the image got archived (False if it was replaced or archived by someone else meanwhile)
+    """
+    object_key = image_doc.get("object_key") or image_doc["_id"]
+    try:
+        await object_storage.copy_object(
+            hot_bucket, object_key, cold_bucket, object_key,
+            extra_args={"StorageClass": storage_class} if storage_class else None
+        )
+    except ClientError as e:
+        # the content may have left the hot bucket already (another image of the same content got there first), as
+        # long as the cold bucket has it we are good
+        if not _is_not_found(e):
+            raise
+        await object_storage.head_object(cold_bucket, object_key)
+
+    # only if it still is the image we copied, one replaced meanwhile (e.g. by a re-upload at the same timestamp) has
+    # content that never made it to the cold bucket
+    result = await db_client.images.update_one(
+        {
+            "_id": image_doc["_id"], "object_key": image_doc.get("object_key"), "sha256": image_doc.get("sha256"),
+            **utils.HOT_IMAGES
+        },
+        {"$set": {"tier": utils.ARCHIVE_TIER, "archived_at": datetime.datetime.now(datetime.timezone.utc)}}
+    )
+    if result.modified_count == 0:
+        return False
+
+    if image_doc.get("sha256"):
+        # the content is only marked archived if every reference on it is an archived image, a hot image or an upload
+        # that took its reference but is yet to be recorded (see `blobs.store_content`) keeps it hot. Uploads taking
+        # their reference after the mark see it and put the content back into the hot bucket.
+        archived_references = await db_client.images.count_documents(
+            {"sha256": image_doc["sha256"], "tier": utils.ARCHIVE_TIER}
+        )
+        result = await db_client.blobs.update_one(
+            {"_id": image_doc["sha256"], "refcount": archived_references}, {"$set": {"tier": utils.ARCHIVE_TIER}}
+        )
+        if result.matched_count:
+            await object_storage.delete_object(hot_bucket, object_key)
+            # such an upload clears the tier before putting the content back, so if it did that before our delete the
+            # tier shows it by now and we restore the object, otherwise its upload comes after the delete
+            if await db_client.blobs.find_one(
+                    {"_id": image_doc["sha256"], "tier": {"$ne": utils.ARCHIVE_TIER}}, {"_id": 1}
+            ) is not None:
+                await object_storage.copy_object(cold_bucket, object_key, hot_bucket, object_key)
+    else:
+        await object_storage.delete_object(hot_bucket, object_key)
+    await utils.bump_patient_revision(db_client, utils.parse_image_key(image_doc["_id"])[0])
+    return True
+
+
+async def archive_images(db_client, object_storage, hot_bucket: str, cold_bucket: str, older_than: datetime.datetime,
+                         storage_class: str = None, batch_size: int = DEFAULT_BATCH_SIZE, on_update=None) -> dict:
+    """
+    Archive every hot image taken before `older_than`, `batch_size` images at a time
+    :param on_update: optional coroutine function called with the key of every archived image
+    :return: counts of archived images and of images that failed to archive (they are retried on the next pass)
+    """
+    archived, failed = 0, 0
+    last = None
+    # keyset paging so that images failing to archive (which stay hot) are not fetched over and over
+    while image_docs := await db_client.images.find(
+            build_archive_query(older_than, last), {"img_timestamp": 1, "object_key": 1, "sha256": 1}
+    ).sort(ARCHIVE_SCAN_SORT).limit(batch_size).to_list(length=None):
+        for image_doc in image_docs:
+            try:
+                if not await archive_image(db_client, object_storage, image_doc, hot_bucket, cold_bucket, storage_class):
+                    continue
+            except ClientError:
+                logger.exception("Failed to archive %s", image_doc["_id"])
+                failed += 1
+                continue
+            archived += 1
+            if on_update is not None:
+                await on_update(image_doc["_id"])
+        last = image_docs[-1]
+    return {"archived": archived, "failed": failed}
+
+
+class ArchiveWorker:
+    """
+    Runs an archival pass (see `archive_images`) every `interval_seconds` in the background
+    """
+
+    def __init__(self, db_client, object_storage, hot_bucket: str, cold_bucket: str,
+                 archive_after_days: float = DEFAULT_ARCHIVE_AFTER_DAYS, interval_seconds: float = DEFAULT_INTERVAL_SECONDS,
+                 storage_class: str = None, on_update=None):
+        self.db_client = db_client
+        self.object_storage = object_storage
+        self.hot_bucket = hot_bucket
+        self.cold_bucket = cold_bucket
+        self.archive_after = datetime.timedelta(days=archive_after_days)
+        self.interval_seconds = interval_seconds
+        self.storage_class = storage_class
+        self.on_update = on_update
+        self.last_result = None
+        self._task = None
+
+    async def run_once(self) -> dict:
+        self.last_result = await archive_images(
+            self.db_client, self.object_storage, self.hot_bucket, self.cold_bucket,
+            datetime.datetime.now(datetime.timezone.utc) - self.archive_after,
+            storage_class=self.storage_class, on_update=self.on_update
+        )
+        return self.last_result
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                # e.g. mongo or minio being briefly unavailable, the next pass picks up where this one left off
+                logger.exception("Archival pass failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+def create_archive_worker(db_client, object_storage, on_update=None):
+    """
+    Build the archive worker configured via the environment (see the module docstring)
+    :return: the worker, or None if archival is disabled (no `ARCHIVE_IMG_BUCKET`)
+    """
+    if not os.environ.get("ARCHIVE_IMG_BUCKET"):
+        return None
+    return ArchiveWorker(
+        db_client, object_storage, os.environ["PATIENT_IMG_BUCKET"], os.environ["ARCHIVE_IMG_BUCKET"],
+        archive_after_days=float(os.environ.get("ARCHIVE_AFTER_DAYS", DEFAULT_ARCHIVE_AFTER_DAYS)),
+        interval_seconds=float(os.environ.get("ARCHIVE_INTERVAL_SECONDS", DEFAULT_INTERVAL_SECONDS)),
+        storage_class=os.environ.get("ARCHIVE_STORAGE_CLASS"),
+        on_update=on_update
+    )
+
+
+async def main():
+    utils.collect_parameters([
+        "MINIO_SERVER_HOST", "MINIO_SERVER_ACCESS_KEY", "MINIO_SERVER_SECRET_KEY",
+        "DB_NAME", "DB_HOST", "DB_USER", "DB_PASS",
+        "PATIENT_IMG_BUCKET", "ARCHIVE_IMG_BUCKET"
+    ])
+    db_client, db_handle = await utils.get_mongodb_connection()
+    object_storage = storage.create_object_storage()
+    try:
+        await indexes.ensure_indexes(db_handle)
+        await object_storage.ensure_bucket(os.environ["ARCHIVE_IMG_BUCKET"])
+        print(await create_archive_worker(db_handle, object_storage).run_once())
+    finally:
+        db_client.close()
+        object_storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,4 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
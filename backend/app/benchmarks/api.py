@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Load test / latency benchmark of the api's hot paths (create, list, detail and upload).
+
+Loads a synthetic dataset (see `datagen`) into scratch mongo/minio targets (the test database and bucket by default),
+then fires `--requests` requests per scenario from `--concurrency` concurrent clients at the app (served in process, or
+a running deployment via `--base-url`) and reports p50/p95/p99 latency plus throughput per scenario.
+
+Results are written as json (`--output`) so that runs can be compared, `--compare` a previous result file to flag
+scenarios whose latency or throughput regressed by more than `--threshold` percent (exits non zero if any did).
+
+Usage (from the backend dir, with the usual app env vars set):
+    python -m app.benchmarks.api --patients 100000 --images-per-patient 3 --output bench.json
+    python -m app.benchmarks.api --patients 100000 --images-per-patient 3 --output bench2.json --compare bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import pathlib
+import argparse
+import statistics
+import subprocess
+import httpx
+from asgi_lifespan import LifespanManager
+from .. import utils, storage, indexes, seed
+from . import datagen
+
+
+SCENARIOS = ["create", "list", "detail", "upload"]
+
+
+class Scenario:
+    """
+    One benchmarked operation, `run_once` issues a single request and returns its response
+    """
+
+    def __init__(self, name: str, client: httpx.AsyncClient, patient_ids: list[str], rng: random.Random):
+        self.name = name
+        self.client = client
+        self.patient_ids = patient_ids
+        self.rng = rng
+        self.list_cursor = None
+        self.new_patients = datagen.generate_patients(sys.maxsize, seed=rng.randrange(2 ** 32))
+        self.img_paths = [seed.IMG_DATASET_DIR/img_uri for img_uri in datagen.FIXTURE_IMAGES]
+
+    async def run_once(self) -> httpx.Response:
+        return await getattr(self, f"run_{self.name}")()
+
+    async def run_create(self):
+        patient = next(self.new_patients)
+        return await self.client.post('/patients/', json={key: patient[key] for key in ["first_name", "last_name", "date_of_birth"]})
+
+    async def run_list(self):
+        # walk through the list like a client paging through it, starting over once at the end
+        params = {"limit": 100, **({"cursor": self.list_cursor} if self.list_cursor else {})}
+        response = await self.client.get('/patients/', params=params)
+        self.list_cursor = response.json().get("next_cursor") if response.status_code == 200 else None
+        return response
+
+    async def run_detail(self):
+        return await self.client.get(f'/patients/{self.rng.choice(self.patient_ids)}')
+
+    async def run_upload(self):
+        img_path = self.rng.choice(self.img_paths)
+        return await self.client.put(
+            f'/patients/{self.rng.choice(self.patient_ids)}',
+            files={'uploaded_img_file': (img_path.name, img_path.read_bytes(), 'image/jpeg')}
+        )
+
+
+async def run_scenario(scenario: Scenario, request_count: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    remaining = iter(range(request_count))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                response = await scenario.run_once()
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return summarise(latencies, errors, elapsed)
+
+
+def summarise(latencies: list[float], errors: int, elapsed: float) -> dict:
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "p50_ms": round(percentiles[49], 3),
+        "p95_ms": round(percentiles[94], 3),
+        "p99_ms": round(percentiles[98], 3),
+        "max_ms": round(max(latencies), 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    :return: descriptions of every regression beyond `threshold` percent against the `baseline` results
+    """
+    regressions = []
+    for name, current in results["scenarios"].items():
+        if (previous := baseline.get("scenarios", {}).get(name)) is None:
+            continue
+        for metric, higher_is_worse in [("p50_ms", True), ("p95_ms", True), ("p99_ms", True), ("throughput_rps", False)]:
+            if not previous[metric]:
+                continue
+            change = (current[metric] - previous[metric]) / previous[metric] * 100
+            print(f"  {name:<8} {metric:<15} {previous[metric]:>10} -> {current[metric]:>10} ({change:+.1f}%)")
+            if (change if higher_is_worse else -change) > threshold:
+                regressions.append(f"{name} {metric} {change:+.1f}%")
+    return regressions
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=seed.IMG_DATASET_DIR
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def add_workload_arguments(parser: argparse.ArgumentParser):
+    """
+    Arguments describing the dataset and the load fired at it (shared with the other api level benchmarks)
+    """
+    parser.add_argument("--patients", type=int, default=10000, help="number of synthetic patients to load")
+    parser.add_argument("--images-per-patient", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma separated subset of {SCENARIOS}")
+    parser.add_argument("--db", default=os.environ.get("TEST_DB_NAME"), help="scratch database to (re)load")
+    parser.add_argument("--bucket", default=os.environ.get("TEST_PATIENT_IMG_BUCKET"), help="scratch bucket to (re)load")
+    parser.add_argument("--skip-load", action="store_true", help="reuse the dataset loaded by a previous run")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_workload_arguments(parser)
+    parser.add_argument("--base-url", help="benchmark a running deployment (already loaded) instead of the in process app")
+    parser.add_argument("--output", help="write the results to this json file")
+    parser.add_argument("--compare", help="previous results json file to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    args = parser.parse_args()
+
+    # point the app at the scratch targets, just like the test fixtures do
+    os.environ["DB_NAME"], os.environ["PATIENT_IMG_BUCKET"] = args.db, args.bucket
+    patient_ids = await prepare_dataset(args)
+
+    results = {
+        "meta": {
+            "timestamp": utils.get_utcnow(),
+            "git_revision": git_revision(),
+            **{key: value for key, value in vars(args).items() if key not in ("output", "compare", "threshold")}
+        },
+        "scenarios": {}
+    }
+    rng = random.Random(args.seed)
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+            await run_scenarios(client, args, patient_ids, rng, results)
+    else:
+        from ..main import app
+        # (generous shutdown timeout as the app finishes off the derivatives of every upload before shutting down)
+        async with LifespanManager(app, shutdown_timeout=300):
+            async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=60) as client:
+                await run_scenarios(client, args, patient_ids, rng, results)
+
+    if args.output:
+        pathlib.Path(args.output).write_text(json.dumps(results, indent=2))
+    if args.compare:
+        print(f"Compared to {args.compare}:")
+        if regressions := compare(results, json.loads(pathlib.Path(args.compare).read_text()), args.threshold):
+            print(f"Regressions beyond {args.threshold}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+async def prepare_dataset(args) -> list[str]:
+    """
+    (Re)load the synthetic dataset into the scratch database and bucket unless `--skip-load`
+    :return: ids of all the patients in the scratch database
+    """
+    db_client, db_handle = await utils.get_mongodb_connection(db_name=args.db)
+    object_storage = storage.create_object_storage()
+    try:
+        if not args.skip_load:
+            print(f"Loading {args.patients} patients with {args.images_per_patient} images each into '{args.db}'/'{args.bucket}' ...")
+            await db_handle.drop_collection("patients")
+            await db_handle.drop_collection("images")
+            await indexes.ensure_indexes(db_handle)
+            patients = datagen.generate_patients(args.patients, args.images_per_patient, seed=args.seed)
+            load_start = time.perf_counter()
+            await seed.seed_patients(db_handle, object_storage, args.bucket, patients)
+            print(f"Loaded in {time.perf_counter() - load_start:.1f}s")
+        return [str(patient["_id"]) async for patient in db_handle.patients.find({}, {"_id": 1})]
+    finally:
+        db_client.close()
+        object_storage.close()
+
+
+async def run_scenarios(client, args, patient_ids, rng, results):
+    for name in args.scenarios.split(","):
+        scenario = Scenario(name, client, patient_ids, random.Random(rng.randrange(2 ** 32)))
+        # a few warm up requests so connection setup and first touch caches do not skew the numbers
+        await run_scenario(scenario, min(args.concurrency, args.requests), args.concurrency)
+        results["scenarios"][name] = summary = await run_scenario(scenario, args.requests, args.concurrency)
+        print(f"{name:<8} p50 {summary['p50_ms']:>9.2f}ms  p95 {summary['p95_ms']:>9.2f}ms  p99 {summary['p99_ms']:>9.2f}ms  "
+              f"{summary['throughput_rps']:>9.1f} req/s  {summary['errors']} errors")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Synthetic patient data generator, scales `fixtures.FIXTURE_DATA` up to arbitrary sizes.
+
+Generated patients follow the exact shape of the fixture entries (including their `images_lst`, which point at the
+images in `img_dataset/`) plus a deterministic `_id`, so the same seed always produces the same dataset.
+"""
+import uuid
+import random
+import datetime
+from .. import fixtures
+
+
+FIRST_NAMES = sorted({entity["first_name"] for entity in fixtures.FIXTURE_DATA} | {
+    "Suraj", "Maria", "Wei", "Aisha", "Lars", "Priya", "Tomas", "Yuki", "Omar", "Chloe", "Kofi", "Ines"
+})
+LAST_NAMES = sorted({entity["last_name"] for entity in fixtures.FIXTURE_DATA} | {
+    "Ravichandran", "Garcia", "Chen", "Okafor", "Nilsson", "Patel", "Novak", "Haddad", "Kowalski", "Tanaka"
+})
+FIXTURE_IMAGES = sorted({img_obj["img_uri"] for entity in fixtures.FIXTURE_DATA for img_obj in entity["images_lst"]})
+IMAGE_HISTORY_START = datetime.datetime(2015, 1, 1)
+
+
+def deterministic_uuid4(rng: random.Random) -> uuid.UUID:
+    """
+    A uuid drawn from `rng` that still is a valid version 4 uuid (our routes only accept those)
+    """
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def generate_patient(rng: random.Random, images_per_patient: int = 0) -> dict:
+    img_timestamps = sorted(
+        IMAGE_HISTORY_START + datetime.timedelta(seconds=rng.randrange(10 * 365 * 24 * 3600))
+        for _ in range(images_per_patient)
+    )
+    return {
+        "_id": deterministic_uuid4(rng),
+        "first_name": rng.choice(FIRST_NAMES),
+        # suffix the last names so that the sort key has a realistic spread rather than a handful of huge runs of duplicates
+        "last_name": f"{rng.choice(LAST_NAMES)}{rng.randrange(100000):05d}",
+        "date_of_birth": (datetime.date(1940, 1, 1) + datetime.timedelta(days=rng.randrange(365 * 80))).isoformat(),
+        "images_lst": [
+            {"img_uri": rng.choice(FIXTURE_IMAGES), "img_timestamp": img_timestamp.isoformat()}
+            for img_timestamp in img_timestamps
+        ]
+    }
+
+
+def generate_patients(count: int, images_per_patient: int = 0, seed: int = 0):
+    """
+    Generate `count` synthetic patients (lazily, so arbitrarily large datasets never have to fit in memory)
+    :return: iterator of fixture style patient dicts
+    """
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield generate_patient(rng, images_per_patient)
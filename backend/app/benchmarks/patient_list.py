@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Benchmark of the keyset paginated patient list against a large patient collection.
+
+Walks the entire patient list page by page (exactly like a client following `next_cursor` would) and reports the
+latency of pages by how deep into the list they are, which should stay flat no matter how far in we are. For contrast it
+also times the equivalent skip/limit (offset) query at a few depths. Before timing anything it explains the first and a
+deep page and bails out unless both are read off the list sort order index (no collection scan, no in memory sort).
+
+Usage (from the backend dir, with the usual app env vars set, against a scratch database as it gets re-populated):
+    python -m app.benchmarks.patient_list --db test --patients 1000000 --page-size 100
+"""
+import os
+import time
+import asyncio
+import argparse
+import itertools
+import statistics
+from .. import utils, models, indexes
+from . import datagen
+
+
+INSERT_BATCH_SIZE = 10000
+
+
+async def populate(db_handle, patient_count: int, seed: int = 0):
+    """
+    (Re)populate the patients collection with `patient_count` synthetic patients unless it already has that many
+    """
+    if await db_handle.patients.estimated_document_count() == patient_count:
+        return
+    await db_handle.drop_collection("patients")
+    patients = datagen.generate_patients(patient_count, seed=seed)
+    while batch := list(itertools.islice(patients, INSERT_BATCH_SIZE)):
+        await db_handle.patients.insert_many(
+            [utils.patient_to_document(models.PatientInput.model_validate(patient)) for patient in batch], ordered=False
+        )
+
+
+async def walk_pages(db_handle, page_size: int) -> list[float]:
+    """
+    Follow `next_cursor` all the way through the list
+    :return: latency (in milliseconds) of every page in list order
+    """
+    latencies, cursor = [], None
+    while True:
+        start = time.perf_counter()
+        _, cursor = await utils.list_patients_page(db_handle, page_size, cursor=cursor)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if cursor is None:
+            return latencies
+
+
+async def time_offset_page(db_handle, page_size: int, page_number: int) -> float:
+    start = time.perf_counter()
+    await db_handle.patients.find({}, utils.PATIENT_LIST_PROJECTION).sort(utils.PATIENT_LIST_SORT) \
+        .skip(page_number * page_size).to_list(length=page_size)
+    return (time.perf_counter() - start) * 1000
+
+
+async def explain_page(db_handle, page_size: int, cursor: str = None) -> dict:
+    """
+    Explain the query of one page of the list
+    :return: the winning plan's index, whether it sorts in memory and how many index keys/documents it examined
+    """
+    plan = await db_handle.patients.find(utils.build_patient_list_query(cursor=cursor), utils.PATIENT_LIST_PROJECTION) \
+        .sort(utils.PATIENT_LIST_SORT).limit(page_size + 1).explain()
+    winning_plan = str(plan["queryPlanner"]["winningPlan"])
+    return {
+        "index": "last_name_first_name_id" if "last_name_first_name_id" in winning_plan else None,
+        "collection_scan": "COLLSCAN" in winning_plan,
+        "in_memory_sort": "'SORT'" in winning_plan,
+        "keys_examined": plan.get("executionStats", {}).get("totalKeysExamined"),
+        "docs_examined": plan.get("executionStats", {}).get("totalDocsExamined"),
+    }
+
+
+def summarise(latencies: list[float]) -> str:
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return f"p50 {statistics.median(latencies):7.2f}ms  p95 {p95:7.2f}ms  max {latencies[-1]:7.2f}ms"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.environ.get("TEST_DB_NAME"), help="scratch database to (re)populate")
+    parser.add_argument("--patients", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--buckets", type=int, default=10, help="number of list depth buckets to report")
+    args = parser.parse_args()
+
+    db_client, db_handle = await utils.get_mongodb_connection(db_name=args.db)
+    try:
+        print(f"Populating {args.patients} patients into '{args.db}' ...")
+        await populate(db_handle, args.patients)
+        await indexes.ensure_indexes(db_handle)
+
+        middle_patient = await db_handle.patients.find({}, utils.PATIENT_LIST_PROJECTION).sort(utils.PATIENT_LIST_SORT) \
+            .skip(args.patients // 2).to_list(length=1)
+        deep_cursor = utils.encode_list_cursor(middle_patient[0])
+        for label, cursor in (("first page", None), ("middle page", deep_cursor)):
+            plan = await explain_page(db_handle, args.page_size, cursor=cursor)
+            print(f"Explain {label}: {plan}")
+            if plan["index"] is None or plan["collection_scan"] or plan["in_memory_sort"]:
+                raise SystemError(f"The {label} of the patient list is not read off the list index")
+
+        print(f"Walking the patient list {args.page_size} patients per page ...")
+        latencies = await walk_pages(db_handle, args.page_size)
+        bucket_size = max(1, len(latencies) // args.buckets)
+        print(f"{len(latencies)} pages, keyset (cursor) pagination latency by depth:")
+        for start in range(0, len(latencies), bucket_size):
+            print(f"  pages {start:>7}-{start + bucket_size - 1:<7} {summarise(latencies[start:start + bucket_size])}")
+
+        print("Offset (skip/limit) pagination latency for comparison:")
+        for page_number in [0, len(latencies) // 100, len(latencies) // 10, len(latencies) // 2, len(latencies) - 1]:
+            latency = await time_offset_page(db_handle, args.page_size, page_number)
+            print(f"  page {page_number:>7} {latency:10.2f}ms")
+    finally:
+        db_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Throughput scaling of the production serving mode over the number of workers.
+
+Loads the synthetic dataset once (see `api`), then for every worker count in `--workers` starts the production server
+(gunicorn + uvicorn workers, see `gunicorn_conf.py`) against the scratch database/bucket, waits until it is ready and
+runs the api benchmark scenarios against it. Reports throughput (and p95 latency) per scenario and worker count along
+with the speedup over the smallest worker count.
+
+Keep the per worker pool sizes (`MONGO_MAX_POOL_SIZE`, `S3_MAX_POOL_CONNECTIONS`, `DERIVATIVE_WORKERS`) set the way
+production runs them, as they are inherited by the workers started here. The load generator shares the machine with
+the server, so give it a `--concurrency` high enough to saturate the largest worker count.
+
+Usage (from the backend dir, with the usual app env vars set):
+    python -m app.benchmarks.scaling --workers 1,2,4,8 --concurrency 64 --output scaling.json
+
+`--markdown` additionally prints the results as the table the README records the reference numbers in.
+"""
+import os
+import sys
+import json
+import random
+import signal
+import asyncio
+import pathlib
+import argparse
+import subprocess
+import httpx
+from .. import utils
+from . import api, startup
+
+
+async def benchmark_workers(worker_count: int, args, patient_ids: list[str]) -> dict:
+    port = startup.free_port()
+    env = {**os.environ, "WEB_CONCURRENCY": str(worker_count), "BIND": f"127.0.0.1:{port}", "BOOTSTRAP_ON_STARTUP": "false"}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "python:app.gunicorn_conf", "app.main:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    results = {"scenarios": {}}
+    try:
+        # every worker warms up on its own, give them all a moment after the first one reports ready
+        await asyncio.to_thread(startup.wait_until_ready, process, f"http://127.0.0.1:{port}", args.timeout)
+        await asyncio.sleep(1)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            await api.run_scenarios(client, args, patient_ids, random.Random(args.seed), results)
+    finally:
+        # graceful shutdown, exactly like the container's SIGTERM
+        process.send_signal(signal.SIGTERM)
+        process.wait()
+    return results["scenarios"]
+
+
+def markdown_table(results: dict) -> str:
+    """
+    :return: the throughput and p95 latency per scenario and worker count as a markdown table, headed by the run's setup
+    """
+    meta, baseline = results["meta"], results["workers"][min(results["workers"])]
+    lines = [
+        f"{meta['timestamp']}, revision {meta['git_revision']}, {meta['cpu_count']} cpus, "
+        f"concurrency {meta['concurrency']}",
+        "",
+        "| workers | " + " | ".join(f"{name} req/s (speedup, p95)" for name in baseline) + " |",
+        "|---|" + "---|" * len(baseline),
+    ]
+    for worker_count, scenarios in results["workers"].items():
+        lines.append(f"| {worker_count} | " + " | ".join(
+            f"{summary['throughput_rps']:.1f} ({summary['throughput_rps'] / baseline[name]['throughput_rps']:.2f}x, "
+            f"{summary['p95_ms']:.1f}ms)"
+            for name, summary in scenarios.items()
+        ) + " |")
+    return "\n".join(lines)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    api.add_workload_arguments(parser)
+    parser.add_argument("--workers", default="1,2,4", help="comma separated worker counts to benchmark")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for the server to become ready")
+    parser.add_argument("--output", help="write the results to this json file")
+    parser.add_argument("--markdown", action="store_true", help="also print the results as a markdown table")
+    args = parser.parse_args()
+
+    os.environ["DB_NAME"], os.environ["PATIENT_IMG_BUCKET"] = args.db, args.bucket
+    patient_ids = await api.prepare_dataset(args)
+
+    results = {
+        "meta": {
+            "timestamp": utils.get_utcnow(),
+            "git_revision": api.git_revision(),
+            "cpu_count": os.cpu_count(),
+            **{key: value for key, value in vars(args).items() if key != "output"}
+        },
+        "workers": {}
+    }
+    for worker_count in map(int, args.workers.split(",")):
+        print(f"--- {worker_count} worker(s)")
+        results["workers"][worker_count] = await benchmark_workers(worker_count, args, patient_ids)
+
+    baseline = results["workers"][min(results["workers"])]
+    print(f"\n{'workers':<8} " + " ".join(f"{name:>24}" for name in baseline))
+    for worker_count, scenarios in results["workers"].items():
+        print(f"{worker_count:<8} " + " ".join(
+            f"{summary['throughput_rps']:>9.1f} req/s ({summary['throughput_rps'] / baseline[name]['throughput_rps']:>4.2f}x)"
+            for name, summary in scenarios.items()
+        ))
+
+    if args.markdown:
+        print(markdown_table(results))
+    if args.output:
+        pathlib.Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
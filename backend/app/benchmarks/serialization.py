@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Micro-benchmark of the cost of turning patient documents into response bodies, per 1k patients.
+
+Compares FastAPI's default response path (validation against the route's `response_model` followed by the standard
+library json encoder, i.e. what the routes did before `responses.py`) with the fast path (picking the response fields
+and encoding them with orjson) for the detail (one patient, with images, per response), list (one page of 1k abridged
+patients) and export (1k patients, with images) shapes. No database or object storage is involved.
+
+Usage (from the backend dir):
+    python -m app.benchmarks.serialization --images-per-patient 3 --repeat 20
+"""
+import os
+import time
+import asyncio
+import argparse
+import statistics
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from .. import utils, models, responses
+from . import datagen
+
+
+PATIENT_COUNT = 1000
+
+
+def patient_documents(images_per_patient: int, seed: int = 0) -> list[dict]:
+    """
+    Documents shaped exactly like what `utils.get_patient_entity` hands to the detail route
+    """
+    documents = []
+    for patient in datagen.generate_patients(PATIENT_COUNT, images_per_patient, seed=seed):
+        document = utils.patient_to_document(models.PatientInput.model_validate(patient))
+        document["date_of_birth"] = document["date_of_birth"].date()
+        document["images"] = [
+            utils.format_patient_image_object(utils.build_patient_image_document(f"{patient['_id']}/{img_obj['img_timestamp']}Z.jpg"))
+            for img_obj in reversed(patient["images_lst"])
+        ]
+        documents.append(document)
+    return documents
+
+
+async def default_path(field, content) -> bytes:
+    value = await serialize_response(field=field, response_content=content, by_alias=False)
+    return JSONResponse(value).body
+
+
+async def measure(fn, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": round(statistics.median(timings), 3), "min_ms": round(min(timings), 3)}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images-per-patient", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20, help="timed repetitions per shape and path")
+    args = parser.parse_args()
+    os.environ.setdefault("PATIENT_IMG_BUCKET", "patient-images")
+
+    documents = patient_documents(args.images_per_patient)
+    list_documents = [{key: document[key] for key in ("_id", "first_name", "last_name")} for document in documents]
+    patient_field = create_response_field("Response_get_patient", models.Patient, mode="serialization")
+    collection_field = create_response_field("Response_list_patients", models.PatientCollection, mode="serialization")
+
+    async def detail_default():
+        for document in documents:
+            await default_path(patient_field, document)
+
+    async def detail_fast():
+        for document in documents:
+            responses.json_response(responses.patient_payload(document)).body
+
+    async def list_default():
+        await default_path(collection_field, models.PatientCollection(patients=list_documents, next_cursor="cursor"))
+
+    async def list_fast():
+        responses.json_response({
+            "patients": [responses.patient_list_payload(document) for document in list_documents], "next_cursor": "cursor"
+        }).body
+
+    async def export_default():
+        "\n".join(models.Patient.model_validate(document).model_dump_json() for document in documents).encode()
+
+    async def export_fast():
+        b"".join(responses.dumps(responses.patient_payload(document), newline=True) for document in documents)
+
+    shapes = {"detail": (detail_default, detail_fast), "list": (list_default, list_fast), "export": (export_default, export_fast)}
+    print(f"Serialising {PATIENT_COUNT} patients ({args.images_per_patient} images each), median of {args.repeat} runs:")
+    for name, (default_fn, fast_fn) in shapes.items():
+        before, after = await measure(default_fn, args.repeat), await measure(fast_fn, args.repeat)
+        print(f"{name:<8} default {before['median_ms']:>9.2f}ms  fast {after['median_ms']:>9.2f}ms  "
+              f"({before['median_ms'] / after['median_ms']:.1f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Cold start benchmark of an api worker.
+
+Starts a fresh uvicorn process `--runs` times per startup mode (bootstrapping on startup vs. leaving that to the
+bootstrap job, see `BOOTSTRAP_ON_STARTUP`) and measures how long it takes from spawning the process until
+`/health/live` (the worker takes requests) and `/health/ready` (its connections are warm) first answer with a 200.
+
+Usage (from the backend dir, with the usual app env vars set and the bootstrap job run once beforehand):
+    python -m app.benchmarks.startup --runs 10 --output startup.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import pathlib
+import argparse
+import statistics
+import subprocess
+import httpx
+
+
+MODES = {"bootstrap_on_startup": "true", "separate_bootstrap": "false"}
+POLL_INTERVAL_SECONDS = 0.01
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(process: subprocess.Popen, base_url: str, timeout: float, start: float = None) -> dict:
+    """
+    Poll a freshly spawned worker's health probes until it is ready
+    :return: dict of seconds from `start` (defaults to now) until the worker was live and ready
+    """
+    start = start or time.perf_counter()
+    timings = {}
+    with httpx.Client(base_url=base_url, timeout=1) as client:
+        while "ready_seconds" not in timings:
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f"worker did not become ready within {timeout}s")
+            if process.poll() is not None:
+                raise RuntimeError(f"worker exited with {process.returncode} during startup")
+            probe = "live" if "live_seconds" not in timings else "ready"
+            try:
+                response = client.get(f"/health/{probe}")
+            except httpx.TransportError:
+                response = None
+            if response is not None and response.status_code == 200:
+                timings[f"{probe}_seconds"] = time.perf_counter() - start
+            else:
+                time.sleep(POLL_INTERVAL_SECONDS)
+    return timings
+
+
+def measure_startup(bootstrap_on_startup: str, timeout: float) -> dict:
+    """
+    :return: dict of seconds from spawning a worker until it was live and ready
+    """
+    port = free_port()
+    env = {**os.environ, "BOOTSTRAP_ON_STARTUP": bootstrap_on_startup}
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        return wait_until_ready(process, f"http://127.0.0.1:{port}", timeout, start=start)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def summarise(samples: list[float]) -> dict:
+    return {
+        "median_seconds": round(statistics.median(samples), 3),
+        "min_seconds": round(min(samples), 3),
+        "max_seconds": round(max(samples), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="workers started per mode")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"comma separated subset of {list(MODES)}")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="write the results to this json file")
+    args = parser.parse_args()
+
+    results = {}
+    for mode in args.modes.split(","):
+        runs = [measure_startup(MODES[mode], args.timeout) for _ in range(args.runs)]
+        results[mode] = {
+            "runs": args.runs,
+            "live": summarise([run["live_seconds"] for run in runs]),
+            "ready": summarise([run["ready_seconds"] for run in runs]),
+        }
+        print(f"{mode:<22} live {results[mode]['live']['median_seconds']:>7.3f}s  ready {results[mode]['ready']['median_seconds']:>7.3f}s  (median of {args.runs})")
+
+    if args.output:
+        pathlib.Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
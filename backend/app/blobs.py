@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Content addressed storage of the patient images uploaded through the api (deduplication of re-uploads).
+
+Every distinct image content is stored exactly once, under `blobs/{sha256}.{ext}`, and tracked by a document in the
+`blobs` collection (`_id` being the sha256 hex digest) holding its object key, size, content type, derivatives and a
+`refcount` of the image documents referencing it. Image documents keep their `{patient_id}/{img_timestamp}.{ext}` key as
+their id and point at their content via `object_key` (and `sha256`), so uploading content that is already stored (for
+the same patient or any other one) boils down to a metadata write referencing the existing object.
+
+Blobs whose refcount drops to zero are left in place (a later re-upload of that content revives them for free),
+sweeping them is left to a maintenance job. Images uploaded straight to object storage via presigned urls never pass
+through the api, so those are stored under their own key as before (as are images predating this).
+"""
+import asyncio
+import hashlib
+import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from . import utils
+
+
+BLOB_PREFIX = "blobs"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def blob_key(digest: str, filename: str) -> str:
+    """
+    Object storage key of the content with the (sha256 hex) `digest`, keeping the extension of `filename` so that the
+    object is still served with a sensible type
+    """
+    file_type_suffix = filename.rsplit(".", 1)
+    file_type_suffix = f".{file_type_suffix[1].lower()}" if len(file_type_suffix) > 1 else ""
+    return f"{BLOB_PREFIX}/{digest}{file_type_suffix}"
+
+
+def hash_fileobj(fileobj) -> tuple[str, int]:
+    """
+    sha256 a (seekable, binary) file like object a chunk at a time and rewind it for whoever reads it next. This blocks
+    so run it in a thread (hashlib releases the GIL while hashing the chunks).
+    :return: tuple of (hex digest, size in bytes)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    while chunk := fileobj.read(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+class _KeepOpen:
+    """
+    File like object passing everything through to `fileobj` but `close`, boto3 closes what it uploaded from and
+    `store_content` may have to upload the same content twice
+    """
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+    def close(self):
+        pass
+
+
+async def _acquire(db_client, digest: str):
+    """
+    Take a reference on an already stored content
+    :return: the blob document or None if the content is not stored yet
+    """
+    return await db_client.blobs.find_one_and_update(
+        {"_id": digest}, {"$inc": {"refcount": 1}}, return_document=ReturnDocument.AFTER
+    )
+
+
+async def release(db_client, digest: str):
+    await db_client.blobs.update_one({"_id": digest}, {"$inc": {"refcount": -1}})
+
+
+async def store_content(db_client, object_storage, bucket: str, fileobj, filename: str, content_type: str = None):
+    """
+    Store a content (uploading it only if we do not have it yet) and take a reference on it, which the caller has to
+    hand to an image document (or `release`)
+    :return: tuple of (the blob document, size in bytes, whether the content was new)
+    :rtype: tuple(dict, int, bool)
+    """
+    # hashed ahead of the upload (a second, local, read of the spooled upload) rather than while streaming it to
+    # storage: the digest decides whether there is anything to upload at all, and an upload hashed on the way would
+    # have to go under a temporary key and be copied to its `blobs/` key after, i.e. transfer every duplicate as well
+    # as every new content twice
+    digest, size = await asyncio.to_thread(hash_fileobj, fileobj)
+    created = False
+    if (blob := await _acquire(db_client, digest)) is None:
+        object_key = blob_key(digest, filename)
+        await object_storage.upload_fileobj(
+            _KeepOpen(fileobj), bucket, object_key, extra_args={"ContentType": content_type} if content_type else None
+        )
+        blob = {
+            "_id": digest,
+            "object_key": object_key,
+            "size": size,
+            "refcount": 1,
+            "created_at": datetime.datetime.now(datetime.timezone.utc)
+        }
+        if content_type:
+            blob["content_type"] = content_type
+        try:
+            await db_client.blobs.insert_one(blob)
+            created = True
+        except DuplicateKeyError:
+            # a concurrent upload of the very same content got there first, so use theirs (which may have been
+            # archived since, our upload over its object notwithstanding)
+            blob = await _acquire(db_client, digest)
+    if blob.get("tier") == utils.ARCHIVE_TIER:
+        # the content only lives in the cold bucket (see `archive.py`), this new image of it is hot though. The tier is
+        # cleared before uploading, so an archival pass deleting the hot object meanwhile either deletes it before our
+        # upload or sees the tier cleared after its delete (and restores the object from the cold bucket)
+        await db_client.blobs.update_one({"_id": digest}, {"$unset": {"tier": ""}})
+        fileobj.seek(0)
+        await object_storage.upload_fileobj(
+            fileobj, bucket, blob["object_key"], extra_args={"ContentType": content_type} if content_type else None
+        )
+    return blob, size, created
+
+
+def build_image_document(img_key: str, blob: dict, size: int, content_type: str = None) -> dict:
+    """
+    `images` collection document recording the image `img_key` as pointing at the content `blob`
+    """
+    image_doc = utils.build_patient_image_document(img_key, size=size, content_type=blob.get("content_type") or content_type)
+    image_doc["object_key"] = blob["object_key"]
+    image_doc["sha256"] = blob["_id"]
+    if blob.get("derivatives"):
+        image_doc["derivatives"] = blob["derivatives"]
+    return image_doc
+
+
+async def store_image(db_client, object_storage, bucket: str, fileobj, img_key: str, filename: str, content_type: str = None):
+    """
+    Store an uploaded patient image (uploading its content only if we do not have it yet) and record it under `img_key`
+    :return: tuple of (the recorded image document, whether the content was new)
+    :rtype: tuple(dict, bool)
+    """
+    blob, size, created = await store_content(db_client, object_storage, bucket, fileobj, filename, content_type=content_type)
+    image_doc = build_image_document(img_key, blob, size, content_type=content_type)
+    previous = await db_client.images.find_one_and_replace({"_id": img_key}, image_doc, upsert=True)
+    if previous is not None and previous.get("sha256"):
+        # the image at this key was replaced, so drop its reference on whatever it pointed at before
+        await release(db_client, previous["sha256"])
+    await utils.bump_patient_revision(db_client, image_doc["patient_id"])
+    return image_doc, created
+
+
+async def record_images(db_client, image_docs: list[dict]):
+    """
+    Record many new image documents (all of the same patient, their content references already taken) with a single
+    bulk write. Images already recorded are not replaced, if any of them is none of the image documents get recorded.
+    :raises BulkWriteError: if any of the images could not be recorded (e.g. a duplicate key)
+    """
+    try:
+        await db_client.images.insert_many(image_docs, ordered=False)
+    except BulkWriteError as e:
+        failed = {error["op"]["_id"] for error in e.details["writeErrors"]}
+        await db_client.images.delete_many(
+            {"_id": {"$in": [image_doc["_id"] for image_doc in image_docs if image_doc["_id"] not in failed]}}
+        )
+        raise
+    await utils.bump_patient_revision(db_client, image_docs[0]["patient_id"])
+
+
+async def recount(db_client):
+    """
+    Recompute every blob's refcount from the image documents referencing it
+    """
+    counts = {
+        group["_id"]: group["count"]
+        async for group in db_client.images.aggregate([
+            {"$match": {"sha256": {"$exists": True}}},
+            {"$group": {"_id": "$sha256", "count": {"$sum": 1}}}
+        ])
+    }
+    async for blob in db_client.blobs.find({}, {"refcount": 1}):
+        if blob["refcount"] != counts.get(blob["_id"], 0):
+            await db_client.blobs.update_one({"_id": blob["_id"]}, {"$set": {"refcount": counts.get(blob["_id"], 0)}})
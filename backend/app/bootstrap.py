@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+One off bootstrap job of a deployment: creates the image buckets and the archive bucket if there is one (all of them
+private, images are only ever served by the api, see `image_proxy.py`), the mongo indexes and loads the fixture
+patients.
+
+Every step is idempotent so this can run before every (re)deploy, after which the api workers can be started with
+`BOOTSTRAP_ON_STARTUP=false` and skip all of it.
+
+Usage (from the backend dir, with the usual app env vars set):
+    python -m app.bootstrap
+"""
+import os
+import asyncio
+from . import utils, storage, indexes, fixtures
+
+
+async def bootstrap(db_client, object_storage, buckets: list[str] = None, populate_fixtures: bool = True):
+    """
+    :param buckets: buckets to create (defaults to `PATIENT_IMG_BUCKET` and, if set, `TEST_PATIENT_IMG_BUCKET`), the
+    fixture images go into the first one
+    """
+    buckets = buckets or [os.environ[name] for name in ("PATIENT_IMG_BUCKET", "TEST_PATIENT_IMG_BUCKET") if os.environ.get(name)]
+    await asyncio.gather(*(object_storage.ensure_bucket(bucket) for bucket in buckets))
+    if os.environ.get("ARCHIVE_IMG_BUCKET"):
+        await object_storage.ensure_bucket(os.environ["ARCHIVE_IMG_BUCKET"])
+    await indexes.ensure_indexes(db_client)
+    if populate_fixtures:
+        await fixtures.populate_fixtures(db_client, object_storage)
+
+
+async def main():
+    db_client, db_handle = await utils.get_mongodb_connection()
+    object_storage = storage.create_object_storage()
+    try:
+        await bootstrap(db_handle, object_storage)
+    finally:
+        db_client.close()
+        object_storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import json
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+from . import utils, models
+
+
+BULK_CHUNK_SIZE = 1000
+DUPLICATE_KEY_ERROR_CODE = 11000
+
+
+async def iter_ndjson_records(byte_stream):
+    """
+    Turn an async stream of bytes (e.g. `Request.stream()`) into an async stream of parsed records, one per non blank
+    line, without ever holding more than one line of the body in memory. Lines that are not valid json are yielded as
+    the `ValueError` raised while parsing them so that they can be reported against their position.
+    """
+    buffer = b""
+    async for chunk in byte_stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_ndjson_line(line)
+    if buffer.strip():
+        yield _parse_ndjson_line(buffer)
+
+
+def _parse_ndjson_line(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return e
+
+
+async def bulk_create_patients(db_client, records, chunk_size: int = BULK_CHUNK_SIZE) -> dict:
+    """
+    Validate and insert patients from an (async) iterable of raw records, `chunk_size` records at a time.
+
+    Every chunk is written with a single unordered `insert_many` so one bad record (failed validation or a duplicate id)
+    does not stop the rest of the chunk from going in, the failures are reported back per record instead.
+
+    :param db_client: the mongodb database handle
+    :param records: async iterable of raw (dict) patient records (or exceptions for records that could not be parsed)
+    :param int chunk_size: number of records validated and inserted at a time
+    :return: dict in the shape of `models.BulkCreateResult`
+    """
+    result = {"inserted_count": 0, "inserted_ids": [], "errors": []}
+    chunk = []
+    index = 0
+    async for record in records:
+        chunk.append((index, record))
+        index += 1
+        if len(chunk) >= chunk_size:
+            await _insert_chunk(db_client, chunk, result)
+            chunk = []
+    if chunk:
+        await _insert_chunk(db_client, chunk, result)
+    result["errors"].sort(key=lambda error: error["index"])
+    return result
+
+
+async def _insert_chunk(db_client, chunk, result: dict):
+    indexes, documents = [], []
+    for index, record in chunk:
+        if isinstance(record, Exception):
+            result["errors"].append({
+                "index": index,
+                "errors": [{"loc": [], "msg": f"Invalid JSON: {record}", "type": "value_error.json"}]
+            })
+            continue
+        try:
+            documents.append(utils.patient_to_document(models.PatientInput.model_validate(record)))
+            indexes.append(index)
+        except ValidationError as e:
+            result["errors"].append({
+                "index": index,
+                "errors": [{"loc": list(error["loc"]), "msg": error["msg"], "type": error["type"]} for error in e.errors()]
+            })
+
+    if not documents:
+        return
+
+    failed_positions = set()
+    try:
+        await db_client.patients.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details["writeErrors"]:
+            failed_positions.add(write_error["index"])
+            duplicate = write_error.get("code") == DUPLICATE_KEY_ERROR_CODE
+            result["errors"].append({
+                "index": indexes[write_error["index"]],
+                "errors": [{
+                    "loc": ["_id"] if duplicate else [],
+                    "msg": "A patient with this id already exists" if duplicate else write_error.get("errmsg", "Write failed"),
+                    "type": "value_error.duplicate" if duplicate else "write_error"
+                }]
+            })
+
+    for position, document in enumerate(documents):
+        if position not in failed_positions:
+            result["inserted_ids"].append(document["_id"])
+    result["inserted_count"] = len(result["inserted_ids"])
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Read-through response cache (used in front of `utils.get_patient_entity`).
+
+The backend is picked via `PATIENT_CACHE_BACKEND`:
+- `memory` (default): per process TTL + LRU cache bounded to `PATIENT_CACHE_MAX_ENTRIES` entries
+- `redis`: any redis compatible server at `REDIS_URL` (needs the optional `redis` package), shared between workers
+- `none`: caching disabled
+
+Entries expire after `PATIENT_CACHE_TTL_SECONDS` either way, which also bounds how stale an entry can get through
+writes this process does not know about (e.g. the reconcile command).
+
+Every invalidation bumps the generation of its key, and a loaded value is only cached if the generation of its key is
+still the one read before the load started. Otherwise a load that read mongo just before a write could land after the
+write's invalidation and put the old record (and its ETag) back for a whole TTL.
+"""
+import os
+import json
+import time
+import itertools
+from collections import OrderedDict
+from pydantic_core import to_json
+
+
+DEFAULT_TTL_SECONDS = 30
+DEFAULT_MAX_ENTRIES = 10000
+# how long redis keeps the generation of an invalidated key, way longer than any load takes
+GENERATION_TTL_SECONDS = 86400
+
+
+class CacheMetrics:
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def as_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations
+        }
+
+
+class MemoryBackend:
+    """
+    In process TTL cache with least recently used eviction once `max_entries` is reached.
+
+    Values are stored as is (no serialisation), so callers must not mutate what they get back. The generations of the
+    `max_entries` most recently invalidated keys are kept, any other key reports the highest generation dropped so far
+    (so a dropped generation never goes back to one a load in flight could have read).
+    """
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._generations = OrderedDict()
+        self._generation_counter = itertools.count(1)
+        self._generation_floor = 0
+
+    async def get(self, key: str):
+        if (entry := self._entries.get(key)) is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def generation(self, key: str) -> int:
+        return self._generations.get(key, self._generation_floor)
+
+    async def set(self, key: str, value, generation: int = None):
+        """
+        Cache `value` under `key`, unless `generation` is given and `key` got invalidated since it was read
+        """
+        if generation is not None and generation != await self.generation(key):
+            return
+        self._entries[key] = (self._clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+        self._generations[key] = next(self._generation_counter)
+        self._generations.move_to_end(key)
+        while len(self._generations) > self.max_entries:
+            _, dropped_generation = self._generations.popitem(last=False)
+            self._generation_floor = max(self._generation_floor, dropped_generation)
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "size": len(self._entries), "max_entries": self.max_entries, "evictions": self.evictions}
+
+
+class RedisBackend:
+    """
+    Cache backed by a redis compatible server. Takes any client exposing the `redis.asyncio` style `get`, `set(ex=)` and
+    `eval` coroutines, values are stored as json (so they come back as plain json types).
+
+    The generations are counters next to the entries, shared by every worker, and compared and bumped by lua scripts so
+    that no other worker's invalidation can get in between.
+    """
+
+    # KEYS: entry, generation  ARGV: value, generation read before the load, ttl
+    SET_IF_CURRENT_SCRIPT = """
+        if tonumber(redis.call('get', KEYS[2]) or '0') ~= tonumber(ARGV[2]) then
+            return 0
+        end
+        redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[3])
+        return 1
+    """
+    # KEYS: entry, generation  ARGV: generation ttl
+    INVALIDATE_SCRIPT = """
+        redis.call('incr', KEYS[2])
+        redis.call('expire', KEYS[2], ARGV[1])
+        return redis.call('del', KEYS[1])
+    """
+
+    def __init__(self, redis_client, ttl_seconds: float = DEFAULT_TTL_SECONDS, prefix: str = "fos:patient:"):
+        self.redis_client = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    async def get(self, key: str):
+        value = await self.redis_client.get(f"{self.prefix}{key}")
+        return json.loads(value) if value is not None else None
+
+    async def generation(self, key: str) -> int:
+        return int(await self.redis_client.get(f"{self.prefix}gen:{key}") or 0)
+
+    async def set(self, key: str, value, generation: int = None):
+        """
+        Cache `value` under `key`, unless `generation` is given and `key` got invalidated since it was read
+        """
+        ttl_seconds = max(1, int(self.ttl_seconds))
+        if generation is None:
+            await self.redis_client.set(f"{self.prefix}{key}", to_json(value), ex=ttl_seconds)
+            return
+        await self.redis_client.eval(
+            self.SET_IF_CURRENT_SCRIPT, 2, f"{self.prefix}{key}", f"{self.prefix}gen:{key}",
+            to_json(value), generation, ttl_seconds
+        )
+
+    async def delete(self, key: str):
+        await self.redis_client.eval(
+            self.INVALIDATE_SCRIPT, 2, f"{self.prefix}{key}", f"{self.prefix}gen:{key}", GENERATION_TTL_SECONDS
+        )
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
+
+    async def close(self):
+        await self.redis_client.aclose()
+
+
+class NullBackend:
+
+    async def get(self, key: str):
+        return None
+
+    async def generation(self, key: str):
+        return None
+
+    async def set(self, key: str, value, generation=None):
+        pass
+
+    async def delete(self, key: str):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "none"}
+
+
+class ResponseCache:
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.metrics = CacheMetrics()
+
+    async def get_or_load(self, key: str, loader):
+        """
+        Return the cached value for `key`, else await `loader()` and cache what it returns (`None`, i.e. not found, is
+        never cached, and neither is what was loaded while `key` got invalidated)
+        """
+        if (value := await self.backend.get(key)) is not None:
+            self.metrics.hits += 1
+            return value
+        self.metrics.misses += 1
+        # read before the load so that an invalidation that lands while loading is noticed
+        generation = await self.backend.generation(key)
+        if (value := await loader()) is not None:
+            await self.backend.set(key, value, generation=generation)
+        return value
+
+    async def invalidate(self, key: str):
+        self.metrics.invalidations += 1
+        await self.backend.delete(key)
+
+    def stats(self) -> dict:
+        return {**self.backend.stats(), **self.metrics.as_dict()}
+
+    async def close(self):
+        if hasattr(self.backend, "close"):
+            await self.backend.close()
+
+
+def create_response_cache() -> ResponseCache:
+    """
+    Build the response cache configured via the environment (see the module docstring)
+    """
+    backend_name = os.environ.get("PATIENT_CACHE_BACKEND", "memory")
+    ttl_seconds = float(os.environ.get("PATIENT_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+    if backend_name == "memory":
+        max_entries = int(os.environ.get("PATIENT_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        return ResponseCache(MemoryBackend(ttl_seconds=ttl_seconds, max_entries=max_entries))
+    if backend_name == "redis":
+        try:
+            import redis.asyncio
+        except ImportError:
+            raise SystemError("PATIENT_CACHE_BACKEND=redis requires the `redis` package to be installed")
+        if "REDIS_URL" not in os.environ:
+            raise SystemError("Missing environment variable: REDIS_URL")
+        return ResponseCache(RedisBackend(redis.asyncio.from_url(os.environ["REDIS_URL"]), ttl_seconds=ttl_seconds))
+    if backend_name == "none":
+        return ResponseCache(NullBackend())
+    raise SystemError(f"Unknown PATIENT_CACHE_BACKEND: {backend_name}")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+HTTP conditional request (ETag / If-None-Match, Last-Modified / If-Modified-Since) helpers.
+
+Patient documents carry a revision counter (`rev`, bumped on every write to the patient or its images) and an
+`updated_at` timestamp, so the validators of a patient's detail can be computed from those two fields alone without
+assembling (or serialising) the full record.
+
+`If-None-Match` is the authoritative validator: an HTTP date only has whole seconds while `updated_at` has
+milliseconds, so `If-Modified-Since` is compared against the precise `updated_at` (a second write within the same
+second must not revalidate to a 304), and a client sending only the `Last-Modified` it got back will mostly be served
+the full record again.
+"""
+import hashlib
+import datetime
+import email.utils
+from fastapi import Response
+from . import utils
+
+
+# clients should always revalidate, but are welcome to keep (and revalidate) their copy
+CACHE_CONTROL = "no-cache"
+
+
+def patient_etag(patient) -> str:
+    return f'"p-{patient["_id"]}-{patient.get("rev", 0)}"'
+
+
+def patient_list_etag(patients, next_cursor) -> str:
+    """
+    ETag of a page of the patient list, a digest of exactly what goes into the (abridged) page
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for patient in patients:
+        digest.update(f'{patient["_id"]}\x1f{patient["first_name"]}\x1f{patient["last_name"]}\x1e'.encode())
+    digest.update(str(next_cursor).encode())
+    return f'"l-{digest.hexdigest()}"'
+
+
+def last_modified(patient):
+    """
+    :return: when the patient (or its images) last changed, or None if we do not know (records predating `updated_at`),
+        not truncated to the seconds of the `Last-Modified` header
+    :rtype: datetime.datetime
+    """
+    updated_at = patient.get("updated_at")
+    if isinstance(updated_at, str):
+        # patients served out of a json backed cache
+        updated_at = datetime.datetime.fromisoformat(updated_at)
+    return utils.as_utc(updated_at) if updated_at else None
+
+
+def has_validators(request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def is_not_modified(request, etag: str, modified_at: datetime.datetime = None) -> bool:
+    """
+    Evaluate the request's preconditions (per RFC 9110 If-None-Match takes precedence over If-Modified-Since, and ETags
+    are compared weakly). `modified_at` is compared at its full precision, so a date truncated to the same second
+    doesn't count as not modified
+    """
+    if (if_none_match := request.headers.get("if-none-match")) is not None:
+        candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+        return "*" in candidates or etag.removeprefix("W/") in candidates
+    if (if_modified_since := request.headers.get("if-modified-since")) is not None and modified_at is not None:
+        try:
+            return modified_at <= email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def validator_headers(etag: str, modified_at: datetime.datetime = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if modified_at is not None:
+        headers["Last-Modified"] = email.utils.format_datetime(modified_at, usegmt=True)
+    return headers
+
+
+def not_modified_response(etag: str, modified_at: datetime.datetime = None) -> Response:
+    return Response(status_code=304, headers=validator_headers(etag, modified_at))
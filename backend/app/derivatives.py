@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Background pipeline producing smaller renditions (derivatives) of every uploaded patient image.
+
+The derivatives are stored beside the original as `{patient_id}/{img_timestamp}.{rendition}.webp` (or
+`blobs/{sha256}.{rendition}.webp` for content addressed originals, see `blobs.py`) and their keys are recorded on the
+image's metadata document (under `derivatives`) once they are all in place.
+
+To (re)generate the derivatives of images that do not have them yet (e.g. ones uploaded before this pipeline existed,
+archived images are left as they are):
+    python -m app.derivatives
+"""
+import io
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from . import utils, storage, indexes
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover
+    Image = None
+
+
+logger = logging.getLogger(__name__)
+
+# rendition name -> bounding box the rendition is shrunk to fit into (aspect ratio is preserved)
+RENDITIONS = {
+    "thumbnail": (256, 256),
+    "preview": (1024, 1024),
+}
+DERIVATIVE_FORMAT = "WEBP"
+DERIVATIVE_CONTENT_TYPE = "image/webp"
+DERIVATIVE_EXTENSION = "webp"
+DERIVATIVE_QUALITY = 80
+
+
+def derivative_key(img_key: str, rendition: str) -> str:
+    """
+    Object storage key of the `rendition` derivative of the original image at `img_key`
+    """
+    patient_id, file_name = img_key.split("/", 1)
+    # strip the extension (the timestamp itself contains dots so only strip a trailing alphabetic extension)
+    stem, _, extension = file_name.rpartition(".")
+    stem = stem if stem and extension.isalpha() else file_name
+    return f"{patient_id}/{stem}.{rendition}.{DERIVATIVE_EXTENSION}"
+
+
+def is_derivative_key(key: str) -> bool:
+    return any(key.endswith(f".{rendition}.{DERIVATIVE_EXTENSION}") for rendition in RENDITIONS)
+
+
+def render_derivatives(image_bytes: bytes) -> dict:
+    """
+    Render every rendition of an image. This is CPU heavy so it runs in the pipeline's process pool (hence it being a
+    plain module level function of bytes in, bytes out).
+    :return: mapping of rendition name to encoded image bytes
+    :rtype: dict(str, bytes)
+    """
+    renditions = {}
+    with Image.open(io.BytesIO(image_bytes)) as original:
+        original = original.convert("RGBA" if original.mode in ("RGBA", "LA", "P") else "RGB")
+        for rendition, bounding_box in RENDITIONS.items():
+            rendered = original.copy()
+            # thumbnail() only ever shrinks, small originals are simply re-encoded
+            rendered.thumbnail(bounding_box, Image.Resampling.LANCZOS)
+            output = io.BytesIO()
+            rendered.save(output, format=DERIVATIVE_FORMAT, quality=DERIVATIVE_QUALITY)
+            renditions[rendition] = output.getvalue()
+    return renditions
+
+
+class DerivativePipeline:
+    """
+    Renders derivatives in a process pool (so resizing never competes with the event loop for the GIL) and keeps track
+    of the in flight jobs so that they can be awaited on shutdown (or in tests).
+    """
+
+    def __init__(self, max_workers: int = None, max_pending: int = None, on_update=None):
+        """
+        :param on_update: optional coroutine function called with the image key once its derivatives are recorded
+        """
+        self.on_update = on_update
+        self.max_workers = max_workers or int(os.environ.get("DERIVATIVE_WORKERS", os.cpu_count() or 1))
+        # bounds how many originals are held in memory waiting on (or being processed by) the process pool
+        self._semaphore = asyncio.Semaphore(max_pending or self.max_workers * 2)
+        self._executor = None
+        self._tasks = set()
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None
+
+    def submit(self, db_client, object_storage, img_key: str, bucket: str = None):
+        """
+        Schedule derivative generation for the image at `img_key` and return right away
+        """
+        if not self.enabled:
+            return None
+        task = asyncio.create_task(self.process(db_client, object_storage, img_key, bucket or os.environ["PATIENT_IMG_BUCKET"]))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def process(self, db_client, object_storage, img_key: str, bucket: str):
+        async with self._semaphore:
+            try:
+                # content addressed images (see `blobs.py`) are rendered once per content, beside the stored content
+                image_doc = await db_client.images.find_one({"_id": img_key}, {"object_key": 1, "sha256": 1}) or {}
+                source_key = image_doc.get("object_key") or img_key
+                image_bytes = await object_storage.download_bytes(bucket, source_key)
+                if self._executor is None:
+                    # spawn rather than fork since the parent process is full of threads (object storage pool, motor)
+                    self._executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+                renditions = await asyncio.get_running_loop().run_in_executor(self._executor, render_derivatives, image_bytes)
+                derivative_keys = {}
+                for rendition, rendered_bytes in renditions.items():
+                    derivative_keys[rendition] = derivative_key(source_key, rendition)
+                    await object_storage.upload_fileobj(
+                        io.BytesIO(rendered_bytes), bucket, derivative_keys[rendition],
+                        extra_args={"ContentType": DERIVATIVE_CONTENT_TYPE}
+                    )
+                await db_client.images.update_one({"_id": img_key}, {"$set": {"derivatives": derivative_keys}})
+                if image_doc.get("sha256"):
+                    # so that later uploads of the same content get them right away
+                    await db_client.blobs.update_one({"_id": image_doc["sha256"]}, {"$set": {"derivatives": derivative_keys}})
+                await utils.bump_patient_revision(db_client, utils.parse_image_key(img_key)[0])
+                if self.on_update is not None:
+                    await self.on_update(img_key)
+                return derivative_keys
+            except Exception:
+                # a broken or non image upload should never take anything else down with it, the original is still there
+                logger.exception("Failed to generate derivatives for %s", img_key)
+                return None
+
+    async def join(self):
+        """
+        Wait for all the currently scheduled jobs to finish
+        """
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def close(self):
+        await self.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+async def main():
+    utils.collect_parameters([
+        "MINIO_SERVER_HOST", "MINIO_SERVER_ACCESS_KEY", "MINIO_SERVER_SECRET_KEY",
+        "DB_NAME", "DB_HOST", "DB_USER", "DB_PASS",
+        "PATIENT_IMG_BUCKET"
+    ])
+    db_client, db_handle = await utils.get_mongodb_connection()
+    object_storage = storage.create_object_storage()
+    pipeline = DerivativePipeline()
+    try:
+        await indexes.ensure_indexes(db_handle)
+        count = 0
+        async for image_doc in db_handle.images.find({"derivatives": {"$exists": False}, **utils.HOT_IMAGES}, {"_id": 1}):
+            pipeline.submit(db_handle, object_storage, image_doc["_id"])
+            count += 1
+            if count % 100 == 0:
+                await pipeline.join()
+        await pipeline.close()
+        print({"processed": count})
+    finally:
+        db_client.close()
+        object_storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
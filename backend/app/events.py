@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Live feed of patient and image changes, pushed to the frontend as server-sent events (`GET /events`).
+
+Every worker runs a single watcher, started with its first subscriber (and stopped again with its last), and fans
+whatever it sees out to all of its subscribers (each with a bounded queue, a subscriber falling too far behind gets a
+`resync` event telling it to re-fetch instead of the backlog). The watcher follows a mongo change stream on the
+`patients` and `images` collections, pushing small deltas:
+- `patient`: `{id, first_name, last_name, date_of_birth, rev, updated_at}` (or `{id, deleted: true}`)
+- `image`: `{patient_id, img_key, image}` with `image` shaped like the detail's `images` (or `{patient_id, img_key,
+  deleted: true}`)
+
+Change streams need mongo to run as a replica set. Against a standalone mongo (such as the docker compose one) the
+watcher falls back to polling the patients' `updated_at` every `EVENTS_POLL_INTERVAL_SECONDS` instead, which still
+gets a `patient` event out for every write (image writes bump the patient's revision) but no `image` deltas. As
+`updated_at` is stamped by whichever worker does the write a write can commit after changes with a later `updated_at`
+were already polled, so every poll looks `EVENTS_POLL_OVERLAP_SECONDS` back from the newest change seen and skips the
+changes (patient revisions) it already published. A `hello` event tells clients which `mode` they are getting (once
+known, and again should it change).
+"""
+import os
+import asyncio
+import logging
+import datetime
+from pymongo.errors import OperationFailure, PyMongoError
+from . import utils, responses
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 100
+DEFAULT_POLL_INTERVAL_SECONDS = 2
+# way longer than it takes a write to commit (or workers' clocks to drift apart)
+DEFAULT_POLL_OVERLAP_SECONDS = 10
+DEFAULT_HEARTBEAT_SECONDS = 15
+RETRY_INITIAL_BACKOFF_SECONDS = 0.5
+RETRY_MAX_BACKOFF_SECONDS = 30
+POLL_BATCH_SIZE = 1000
+# mongo's error codes for "change streams are only supported on replica sets" and for a resume token that fell off
+# the oplog
+CHANGE_STREAMS_UNSUPPORTED = 40573
+CHANGE_STREAM_HISTORY_LOST = 286
+
+WATCHED_COLLECTIONS = ["patients", "images"]
+CHANGE_STREAM_PIPELINE = [
+    {"$match": {
+        "ns.coll": {"$in": WATCHED_COLLECTIONS},
+        "operationType": {"$in": ["insert", "update", "replace", "delete"]}
+    }},
+]
+
+
+def patient_event(patient) -> dict:
+    return {
+        "type": "patient",
+        "data": {
+            "id": patient["_id"],
+            "first_name": patient.get("first_name"),
+            "last_name": patient.get("last_name"),
+            "date_of_birth": patient["date_of_birth"].date() if patient.get("date_of_birth") else None,
+            "rev": patient.get("rev"),
+            "updated_at": utils.as_utc(patient["updated_at"]) if patient.get("updated_at") else None,
+        }
+    }
+
+
+def change_to_event(change):
+    """
+    Turn a change stream document into the delta we push to clients
+    :return: the event dict, or None if the change is of no interest to clients
+    """
+    collection = change["ns"]["coll"]
+    document_id = change["documentKey"]["_id"]
+    deleted = change["operationType"] == "delete"
+    full_document = change.get("fullDocument")
+    if collection == "patients":
+        if deleted or full_document is None:
+            return {"type": "patient", "data": {"id": document_id, "deleted": True}} if deleted else None
+        return patient_event(full_document)
+    if collection == "images":
+        patient_id, _ = utils.parse_image_key(document_id)
+        if deleted:
+            return {"type": "image", "data": {"patient_id": patient_id, "img_key": document_id, "deleted": True}}
+        if full_document is None:
+            return None
+        return {
+            "type": "image",
+            "data": {"patient_id": patient_id, "img_key": document_id, "image": utils.format_patient_image_object(full_document)}
+        }
+    return None
+
+
+def event_patient_id(event):
+    data = event.get("data") or {}
+    return data.get("patient_id") or data.get("id")
+
+
+class Subscription:
+
+    def __init__(self, feed, patient_id=None, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.feed = feed
+        self.patient_id = patient_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def offer(self, event):
+        if self.patient_id is not None and event_patient_id(event) not in (None, self.patient_id):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # too far behind to be worth catching up, so have the client re-fetch instead
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync", "data": {"reason": "subscriber fell behind"}})
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.feed.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class EventFeed:
+    """
+    The per worker watcher (see the module docstring) along with its subscribers
+    """
+
+    def __init__(self, db_client, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 poll_interval_seconds: float = DEFAULT_POLL_INTERVAL_SECONDS,
+                 poll_overlap_seconds: float = DEFAULT_POLL_OVERLAP_SECONDS):
+        self.db_client = db_client
+        self.queue_size = queue_size
+        self.poll_interval_seconds = poll_interval_seconds
+        self.poll_overlap = datetime.timedelta(seconds=poll_overlap_seconds)
+        self.subscribers = set()
+        self.mode = None
+        self.published = 0
+        self._task = None
+
+    def subscribe(self, patient_id=None) -> Subscription:
+        """
+        Subscribe to the feed (of a single patient if `patient_id` is given), starting the watcher if need be
+        """
+        subscription = Subscription(self, patient_id=patient_id, queue_size=self.queue_size)
+        self.subscribers.add(subscription)
+        if self.mode is not None:
+            subscription.offer(self.hello_event())
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._watch())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """
+        Unsubscribe from the feed, stopping the watcher along with the last subscriber (no one to tail mongo for)
+        """
+        self.subscribers.discard(subscription)
+        if not self.subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+            # (found out again by the next watcher)
+            self.mode = None
+
+    def hello_event(self) -> dict:
+        return {"type": "hello", "data": {"mode": self.mode}}
+
+    def _set_mode(self, mode: str):
+        if mode != self.mode:
+            self.mode = mode
+            self.publish(self.hello_event())
+
+    def publish(self, event):
+        self.published += 1
+        for subscription in list(self.subscribers):
+            subscription.offer(event)
+
+    async def _watch(self):
+        backoff = RETRY_INITIAL_BACKOFF_SECONDS
+        resume_token = None
+        while True:
+            try:
+                async with self.db_client.watch(
+                        CHANGE_STREAM_PIPELINE, full_document="updateLookup", resume_after=resume_token
+                ) as stream:
+                    self._set_mode("change_stream")
+                    backoff = RETRY_INITIAL_BACKOFF_SECONDS
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        if (event := change_to_event(change)) is not None:
+                            self.publish(event)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    logger.info("Change streams are not supported by this mongo deployment, polling for changes instead")
+                    self._set_mode("polling")
+                    return await self._poll()
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    # whatever happened in the meantime is lost, so start over and have every client re-fetch
+                    resume_token = None
+                    self.publish({"type": "resync", "data": {"reason": "change history lost"}})
+                logger.warning("Change stream failed (retrying in %ss): %s", backoff, e)
+            except PyMongoError as e:
+                logger.warning("Change stream failed (retrying in %ss): %s", backoff, e)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, RETRY_MAX_BACKOFF_SECONDS)
+
+    async def _poll(self):
+        """
+        Change stream stand in for standalone mongo deployments, served by the `updated_at` index on the patients. Looks
+        `poll_overlap` back from the newest change seen (but not back past its own start) on every poll, the changes
+        published within that window are remembered by patient and revision so that none goes out twice.
+        """
+        # (mongo keeps `updated_at` to the millisecond, a write stamped right after this could be stored as before it)
+        started = newest = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(milliseconds=1)
+        published = {}
+        while True:
+            await asyncio.sleep(self.poll_interval_seconds)
+            try:
+                async for patient in self._changed_patients(max(started, newest - self.poll_overlap)):
+                    updated_at = utils.as_utc(patient["updated_at"])
+                    newest = max(newest, updated_at)
+                    if (change := (patient["_id"], patient.get("rev"))) not in published:
+                        published[change] = updated_at
+                        self.publish(patient_event(patient))
+            except PyMongoError as e:
+                logger.warning("Polling for patient changes failed: %s", e)
+                continue
+            # what is out of the window now is never polled again
+            window_start = max(started, newest - self.poll_overlap)
+            published = {change: updated_at for change, updated_at in published.items() if updated_at > window_start}
+
+    async def _changed_patients(self, since: datetime.datetime):
+        """
+        Every patient changed after `since`, oldest change first (fetched `POLL_BATCH_SIZE` at a time, keyset paged on
+        `(updated_at, _id)` so that changes sharing a timestamp across a batch boundary are not skipped)
+        """
+        query = {"updated_at": {"$gt": since}}
+        while True:
+            patients = await self.db_client.patients.find(query).sort(
+                [("updated_at", 1), ("_id", 1)]
+            ).limit(POLL_BATCH_SIZE).to_list(length=None)
+            for patient in patients:
+                yield patient
+            if len(patients) < POLL_BATCH_SIZE:
+                return
+            last = patients[-1]
+            query = {"$or": [
+                {"updated_at": {"$gt": last["updated_at"]}},
+                {"updated_at": last["updated_at"], "_id": {"$gt": last["_id"]}},
+            ]}
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "watching": self._task is not None and not self._task.done(),
+            "subscribers": len(self.subscribers),
+            "published": self.published
+        }
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+def encode_event(event) -> bytes:
+    return b"event: " + event["type"].encode() + b"\ndata: " + responses.dumps(event["data"]) + b"\n\n"
+
+
+async def sse_stream(subscription: Subscription, heartbeat_seconds: float = DEFAULT_HEARTBEAT_SECONDS):
+    """
+    Server-sent event stream of a subscription, with a comment line every `heartbeat_seconds` of silence so that
+    proxies do not time the connection out
+    """
+    with subscription:
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            yield encode_event(event)
+
+
+def create_event_feed(db_client) -> EventFeed:
+    return EventFeed(
+        db_client,
+        queue_size=int(os.environ.get("EVENTS_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)),
+        poll_interval_seconds=float(os.environ.get("EVENTS_POLL_INTERVAL_SECONDS", DEFAULT_POLL_INTERVAL_SECONDS)),
+        poll_overlap_seconds=float(os.environ.get("EVENTS_POLL_OVERLAP_SECONDS", DEFAULT_POLL_OVERLAP_SECONDS))
+    )
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import zlib
+from . import utils, responses
+
+
+PATIENT_EXPORT_PROJECTION = {"first_name": 1, "last_name": 1, "date_of_birth": 1}
+
+
+async def iter_patient_export(db_client, batch_size: int = 1000, include_images: bool = False, compress: bool = False):
+    """
+    Async generator streaming out every patient as NDJSON (one `models.Patient` json document per line).
+
+    Patients are pulled off the mongo cursor `batch_size` at a time and each batch is encoded (and, if asked for,
+    gzip compressed) and yielded before the next batch is fetched, so memory usage is bounded by the batch size rather
+    than by the size of the collection. When `include_images` is set the images of a whole batch of patients are
+    fetched with one query (see `utils.get_images_for_patients`) instead of one query per patient.
+
+    :param db_client: the mongodb database handle
+    :param int batch_size: number of patients fetched, encoded and yielded at a time
+    :param bool include_images: whether to include each patient's `images`
+    :param bool compress: gzip the stream
+    :return: async iterator of bytes
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+    batch = []
+    async for patient in db_client.patients.find({}, PATIENT_EXPORT_PROJECTION).batch_size(batch_size):
+        batch.append(patient)
+        if len(batch) >= batch_size:
+            yield await _encode_batch(db_client, batch, include_images, compressor)
+            batch = []
+    if batch:
+        yield await _encode_batch(db_client, batch, include_images, compressor)
+    if compressor is not None:
+        yield compressor.flush()
+
+
+async def _encode_batch(db_client, batch, include_images: bool, compressor) -> bytes:
+    images_by_patient = await utils.get_images_for_patients(db_client, [patient["_id"] for patient in batch]) \
+        if include_images else {}
+    lines = []
+    for patient in batch:
+        patient["date_of_birth"] = patient["date_of_birth"].date()
+        if include_images:
+            patient["images"] = images_by_patient.get(patient["_id"], [])
+        lines.append(responses.dumps(responses.patient_payload(patient, include_images=include_images), newline=True))
+    chunk = b"".join(lines)
+    return compressor.compress(chunk) if compressor is not None else chunk
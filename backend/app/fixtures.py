@@ -2,13 +2,13 @@
 # Author: Suraj Ravichandran
 # 01/22/2024
 import os
-import pathlib
-import datetime
-from . import models
+from . import seed
 
 
+# the ids are fixed so that (re)populating the fixtures is idempotent
 FIXTURE_DATA = [
     {
+        "id": "5936a0f3-a854-4c49-bc96-3e1177d6a456",
         "first_name": "Jim",
         "last_name": "Jones",
         "date_of_birth": "1960-10-01",
@@ -24,6 +24,7 @@ FIXTURE_DATA = [
         ]
     },
     {
+        "id": "8ed070b2-5d82-4cc0-8dab-f9dd110b4a3c",
         "first_name": "Winston",
         "last_name": "Rogers",
         "date_of_birth": "1970-04-04",
@@ -35,6 +36,7 @@ FIXTURE_DATA = [
         ]
     },
     {
+        "id": "2e9d0137-002e-4f1d-b0cb-dbf13389ac81",
         "first_name": "Diane",
         "last_name": "Simmons",
         "date_of_birth": "1980-08-01",
@@ -48,33 +50,20 @@ FIXTURE_DATA = [
 ]
 
 
-async def populate_fixtures(db_client, s3_client):
+async def populate_fixtures(db_client, object_storage):
     """
-    Checks if the database is empty and if so populates it with the predefined fixtures from this file
-    (see `FIXTURE_DATA` in this file for data).
+    Populates the database (and bucket) with the predefined fixtures from this file (see `FIXTURE_DATA` in this file
+    for data), anything already there is left as is so this is safe to run on every startup.
     """
-    if await db_client.patients.estimated_document_count():
-        # This database has been populated so no need to re-init with fixture data
-        return
-    else:
-        for entity_data in FIXTURE_DATA:
-            img_lst = entity_data.get("images_lst", [])
-            # This step of parsing into the pydanctic model below ensures the data/schema integrity
-            # so even though we get back to dict post this, it is useful
-            patient = models.Patient.model_validate(entity_data)
-            patient_data = patient.model_dump(by_alias=True)
-            patient_data["date_of_birth"] = datetime.datetime.combine(patient_data["date_of_birth"], datetime.time.min)
-            new_patient = await db_client.patients.insert_one(patient_data)
-            entity_data["id"] = str(new_patient.inserted_id)
-            entity_data["images"] = []
-            for img_obj in img_lst:
-                img_obj = img_obj.copy()
-                p = pathlib.Path(img_obj['img_uri'])
-                img_timestamp_with_suffix = f"{img_obj['img_timestamp']}{p.suffix}"
-                with open(pathlib.Path(__file__).parent.resolve()/p, "rb") as f:
-                    s3_client.upload_fileobj(
-                        f, os.environ["PATIENT_IMG_BUCKET"], f"{new_patient.inserted_id}/{img_timestamp_with_suffix}"
-                    )
-                    # populating the global object with the object storage uris and such enables better testing
-                    img_obj["img_uri"] = f"{os.environ['PATIENT_IMG_BUCKET']}/{new_patient.inserted_id}/{img_timestamp_with_suffix}"
-                entity_data["images"].append(img_obj)
+    await seed.seed_patients(db_client, object_storage, os.environ["PATIENT_IMG_BUCKET"], FIXTURE_DATA)
+
+
+def fixture_images(entity_data, bucket: str = None) -> list[dict]:
+    """
+    The images of a fixture patient the way the api reports them (newest first), handy for testing
+    """
+    bucket = bucket or os.environ["PATIENT_IMG_BUCKET"]
+    return [
+        {"img_uri": f"{bucket}/{img_key}", "img_timestamp": img_key.split("/", 1)[1].removesuffix(img_path.suffix)}
+        for img_key, img_path in sorted(seed.patient_image_keys(entity_data), reverse=True)
+    ]
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Gunicorn configuration of the production serving mode (`SERVING_MODE=production`, see `app_init.sh`): a gunicorn
+master supervising `WEB_CONCURRENCY` uvicorn workers, each with its own event loop and its own mongo/minio pools
+(sized per worker via `MONGO_MAX_POOL_SIZE` and `S3_MAX_POOL_CONNECTIONS`).
+
+Usage (from the backend dir):
+    gunicorn -c python:app.gunicorn_conf app.main:app
+"""
+import os
+import shutil
+import pathlib
+from uvicorn.workers import UvicornWorker
+
+
+bind = os.environ.get("BIND", "0.0.0.0:80")
+workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+worker_class = "app.gunicorn_conf.ProxiedUvicornWorker"
+# on SIGTERM workers stop accepting connections and get this long to finish off in flight requests (and run the app's
+# lifespan shutdown) before they are killed
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.environ.get("WORKER_TIMEOUT", 60))
+keepalive = int(os.environ.get("KEEPALIVE", 5))
+# recycle workers every so often (with some jitter so that they do not all restart at once)
+max_requests = int(os.environ.get("MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+# only the proxy's (nginx') `X-Forwarded-For` is trusted, anyone else could pass off as any client (and get around the
+# per client admission limits with it)
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+accesslog = "-" if os.environ.get("ACCESS_LOG", "false").lower() in ("1", "true", "yes") else None
+
+
+class ProxiedUvicornWorker(UvicornWorker):
+    """
+    Uvicorn worker running behind nginx under `PROXY_PREFIX_PATH`, i.e. what `--proxy-headers --root-path` do for the
+    dev server
+    """
+
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        "proxy_headers": True,
+        "root_path": os.environ.get("PROXY_PREFIX_PATH", ""),
+        # leave a bit of the graceful timeout for the lifespan shutdown (closing pools, draining derivative renders)
+        "timeout_graceful_shutdown": max(1, graceful_timeout - 5),
+    }
+
+
+def on_starting(server):
+    # prometheus multi process mode (see `metrics.py`) keeps its per process files in here, start off clean
+    if multiproc_dir := os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        pathlib.Path(multiproc_dir).mkdir(parents=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
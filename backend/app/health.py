@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Liveness/readiness tracking of an api worker.
+
+A worker is live as soon as it serves requests at all, but only ready once its connections are warm, i.e. it has
+completed a round trip to mongo and to the object storage bucket. Warming up runs in the background (retrying with
+backoff until both succeed) so that the startup itself never waits on either of them.
+"""
+import asyncio
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_INITIAL_BACKOFF_SECONDS = 0.1
+WARM_UP_MAX_BACKOFF_SECONDS = 5
+
+
+class Readiness:
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self.started_at = clock()
+        self.checks = {"mongo": False, "object_storage": False}
+        self.warm_after_seconds = None
+
+    @property
+    def ready(self) -> bool:
+        return all(self.checks.values())
+
+    async def warm_up(self, db_client, object_storage, bucket: str):
+        """
+        Ping mongo and the bucket until both answered once
+        """
+        checks = {
+            "mongo": lambda: db_client.command("ping"),
+            "object_storage": lambda: object_storage.warm_up(bucket),
+        }
+        backoff = WARM_UP_INITIAL_BACKOFF_SECONDS
+        while not self.ready:
+            results = await asyncio.gather(
+                *(check() for name, check in checks.items() if not self.checks[name]), return_exceptions=True
+            )
+            for name, result in zip([name for name in checks if not self.checks[name]], results):
+                if isinstance(result, Exception):
+                    logger.warning("Warming up %s failed (retrying in %ss): %s", name, backoff, result)
+                else:
+                    self.checks[name] = True
+            if not self.ready:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, WARM_UP_MAX_BACKOFF_SECONDS)
+        self.warm_after_seconds = self._clock() - self.started_at
+
+    def status(self) -> dict:
+        return {"ready": self.ready, "checks": dict(self.checks), "warm_after_seconds": self.warm_after_seconds}
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Api side delivery of the patient images (`GET /images/{img_uri}`), the only way to them: the buckets are private and
+nginx does not proxy them (see `bootstrap.py`).
+
+Objects are streamed from object storage a chunk at a time (see `ObjectStorage.iter_chunks`), so even the largest scans
+never sit in the worker's memory as a whole, and single `Range` requests are passed through to storage so that viewers
+can fetch parts of a scan (or resume a download). Content addressed objects (see `blobs.py`) are named after their
+content, so they never change and browsers and any cache in between keep them for good (`Cache-Control: immutable`).
+Every other key (e.g. a presigned upload's `{patient_id}/{timestamp}.ext` and the derivatives rendered from it) can be
+overwritten by uploading at the same timestamp again, so those are only kept as long as their `ETag` still matches
+(`Cache-Control: no-cache`, a revalidation is a cheap `304`).
+
+Setting `IMAGE_CACHE_DIR` additionally keeps hot images (up to `IMAGE_CACHE_MAX_OBJECT_BYTES` each) on local disk, in
+at most `IMAGE_CACHE_MAX_BYTES` all in all (least recently used images are evicted first), so that repeat views do not
+go back to storage. Workers on the same host can share the directory. Overwritable keys are cached per `ETag`, so
+serving one out of the cache takes a `HEAD` of the object to learn its current `ETag` (rather than the whole object).
+
+Images that are not (or no longer) in the patient image bucket are looked up in the `ARCHIVE_IMG_BUCKET` cold bucket
+(see `archive.py`), so links handed out before an image got archived keep working.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+import pathlib
+import datetime
+import email.utils
+from botocore.exceptions import ClientError
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+from . import blobs, conditional
+
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# multiple ranges in one request are not supported by s3 either, those requests get the whole object instead
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+DISK_CHUNK_SIZE = 256 * 1024
+DEFAULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_CACHE_MAX_OBJECT_BYTES = 32 * 1024 * 1024
+# temporary files this old are leftovers of writes that never completed (e.g. of a worker that got killed mid download)
+STALE_TEMP_FILE_SECONDS = 3600
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def match_range(range_header: str):
+    """
+    :return: tuple of the (first, last) byte strings of a single `bytes=` range (either may be empty), or None if there
+        is no such range
+    :raises RangeNotSatisfiable: if the range ends before it starts
+    """
+    if not range_header or (match := RANGE_PATTERN.fullmatch(range_header.strip())) is None:
+        return None
+    first, last = match.groups()
+    if first and last and int(last) < int(first):
+        raise RangeNotSatisfiable(range_header)
+    return first, last
+
+
+def parse_range(range_header: str, size: int):
+    """
+    Resolve a single `bytes=` range against an object of `size` bytes
+    :return: inclusive tuple of (first byte, last byte), or None if the whole object is to be served
+    :raises RangeNotSatisfiable: if the range ends before it starts or lies past the end of the object
+    """
+    if (bounds := match_range(range_header)) is None:
+        return None
+    first, last = bounds
+    if not first and not last:
+        return None
+    if not first:
+        # suffix range, i.e. the last N bytes
+        if int(last) == 0:
+            raise RangeNotSatisfiable(range_header)
+        return max(0, size - int(last)), size - 1
+    if int(first) >= size:
+        raise RangeNotSatisfiable(range_header)
+    return int(first), min(int(last), size - 1) if last else size - 1
+
+
+def is_immutable_key(key: str) -> bool:
+    """
+    :return: whether the object under `key` is content addressed, i.e. can never change
+    """
+    return key.startswith(f"{blobs.BLOB_PREFIX}/")
+
+
+def disk_cache_key(key: str, etag: str = None):
+    """
+    :return: the key the `etag` version of the object `key` is disk cached under, or None if it cannot be cached
+    """
+    if is_immutable_key(key):
+        return key
+    return f"{key}@{etag}" if etag else None
+
+
+def image_headers(key: str, etag: str = None, last_modified: datetime.datetime = None) -> dict:
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if is_immutable_key(key) else REVALIDATE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes"
+    }
+    if etag:
+        headers["ETag"] = etag
+    if last_modified is not None:
+        headers["Last-Modified"] = email.utils.format_datetime(last_modified.astimezone(datetime.timezone.utc), usegmt=True)
+    return headers
+
+
+class DiskCache:
+    """
+    Local disk cache of whole objects, one data file plus a json metadata file per object (named after the sha256 of
+    the object key). Files are written under a temporary name and renamed into place once complete, so readers (in any
+    worker) never see a partially written image.
+    """
+
+    def __init__(self, directory, max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+                 max_object_bytes: int = DEFAULT_CACHE_MAX_OBJECT_BYTES):
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sweep_temp_files()
+        # approximation of what is on disk (other workers write to the directory too), recomputed when evicting
+        self.size_bytes = sum(path.stat().st_size for path in self.directory.glob("*/*") if path.suffix == "")
+
+    def _path(self, key: str) -> pathlib.Path:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return self.directory / digest[:2] / digest
+
+    def _load(self, key: str):
+        path = self._path(key)
+        try:
+            metadata = json.loads(path.with_suffix(".json").read_text())
+            # bump the modification time, which is what eviction goes by
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        if metadata.get("key") != key:
+            return None
+        return {**metadata, "path": path}
+
+    async def get(self, key: str):
+        """
+        :return: the cached object's metadata (`content_type`, `etag`, `last_modified`, `size` and `path`), or None
+        """
+        if (entry := await asyncio.to_thread(self._load, key)) is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def _store(self, key: str, temp_path: pathlib.Path, metadata: dict):
+        path = self._path(key)
+        temp_path.replace(path)
+        metadata_temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.json")
+        metadata_temp_path.write_text(json.dumps({**metadata, "key": key}))
+        metadata_temp_path.replace(path.with_suffix(".json"))
+        self.size_bytes += metadata["size"]
+        if self.size_bytes > self.max_bytes:
+            self._evict()
+
+    def _sweep_temp_files(self):
+        """
+        Drop stale temporary files (see `STALE_TEMP_FILE_SECONDS`), the ones of writes still in progress are left be
+        """
+        stale_before = time.time() - STALE_TEMP_FILE_SECONDS
+        for path in self.directory.glob("*/.*"):
+            try:
+                if path.stat().st_mtime < stale_before:
+                    path.unlink(missing_ok=True)
+            except OSError:
+                continue
+
+    def _evict(self):
+        """
+        Drop least recently used objects until the cache is down to 90% of its size bound
+        """
+        self._sweep_temp_files()
+        entries = []
+        for path in self.directory.glob("*/*"):
+            if path.suffix == "" and not path.name.startswith("."):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        self.size_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if self.size_bytes <= self.max_bytes * 0.9:
+                break
+            path.with_suffix(".json").unlink(missing_ok=True)
+            path.unlink(missing_ok=True)
+            self.size_bytes -= size
+            self.evictions += 1
+
+    async def tee(self, key: str, metadata: dict, chunks):
+        """
+        Pass the chunks of an object through while writing them to the cache, the object only makes it into the cache if
+        every chunk went through (e.g. not if the client went away mid download)
+        """
+        path = self._path(key)
+        temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        await asyncio.to_thread(path.parent.mkdir, exist_ok=True)
+        temp_file = await asyncio.to_thread(open, temp_path, "wb")
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(temp_file.write, chunk)
+                yield chunk
+            await asyncio.to_thread(temp_file.close)
+            try:
+                await asyncio.to_thread(self._store, key, temp_path, metadata)
+            except OSError as e:
+                logger.warning("Could not cache %s: %s", key, e)
+        finally:
+            # without awaiting anything, which a stream that got cancelled or garbage collected (e.g. as the client went
+            # away) may not get to do. The temporary file is only still around if the object did not make it into the
+            # cache.
+            temp_file.close()
+            temp_path.unlink(missing_ok=True)
+
+    @staticmethod
+    async def read(path: pathlib.Path, first: int, last: int, chunk_size: int = DISK_CHUNK_SIZE):
+        with await asyncio.to_thread(open, path, "rb") as cached_file:
+            await asyncio.to_thread(cached_file.seek, first)
+            remaining = last - first + 1
+            while remaining > 0 and (chunk := await asyncio.to_thread(cached_file.read, min(chunk_size, remaining))):
+                remaining -= len(chunk)
+                yield chunk
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes
+        }
+
+
+class ImageProxy:
+
+    def __init__(self, object_storage, disk_cache: DiskCache = None, fallback_bucket: str = None):
+        """
+        :param fallback_bucket: bucket to look for objects that are missing from the requested bucket in
+        """
+        self.object_storage = object_storage
+        self.disk_cache = disk_cache
+        self.fallback_bucket = fallback_bucket
+
+    async def serve(self, request, bucket: str, key: str) -> Response:
+        """
+        Respond to a GET of the object `key` in `bucket` (see the module docstring)
+        """
+        if self.disk_cache is not None and (cache_key := await self._current_cache_key(bucket, key)) is not None:
+            if (entry := await self.disk_cache.get(cache_key)) is not None:
+                return self._serve_cached(request, key, entry)
+
+        range_header = request.headers.get("range")
+        try:
+            if match_range(range_header) is None:
+                range_header = None
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers=image_headers(key))
+        try:
+            s3_object = await self.object_storage.open_object(
+                bucket, key, byte_range=range_header, if_none_match=request.headers.get("if-none-match")
+            )
+        except ClientError as e:
+            error_code = e.response.get("Error", {}).get("Code")
+            status_code = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+            if error_code in ("304", "NotModified") or status_code == 304:
+                return Response(status_code=304, headers=image_headers(key, request.headers.get("if-none-match")))
+            if error_code in ("404", "NoSuchKey") or status_code == 404:
+                if self.fallback_bucket and bucket != self.fallback_bucket:
+                    return await self.serve(request, self.fallback_bucket, key)
+                raise HTTPException(status_code=404, detail=f"Image {key} not found")
+            if error_code == "InvalidRange" or status_code == 416:
+                return Response(status_code=416, headers=image_headers(key))
+            raise
+
+        headers = image_headers(key, s3_object.get("ETag"), s3_object.get("LastModified"))
+        headers["Content-Length"] = str(s3_object["ContentLength"])
+        chunks = self.object_storage.iter_chunks(s3_object["Body"])
+        if "ContentRange" in s3_object:
+            headers["Content-Range"] = s3_object["ContentRange"]
+            return StreamingResponse(chunks, status_code=206, headers=headers, media_type=s3_object.get("ContentType"))
+        cache_key = disk_cache_key(key, s3_object.get("ETag"))
+        if (self.disk_cache is not None and cache_key is not None
+                and s3_object["ContentLength"] <= self.disk_cache.max_object_bytes):
+            chunks = self.disk_cache.tee(cache_key, {
+                "content_type": s3_object.get("ContentType"),
+                "etag": s3_object.get("ETag"),
+                "last_modified": s3_object["LastModified"].isoformat() if s3_object.get("LastModified") else None,
+                "size": s3_object["ContentLength"]
+            }, chunks)
+        return StreamingResponse(chunks, status_code=200, headers=headers, media_type=s3_object.get("ContentType"))
+
+    async def _current_cache_key(self, bucket: str, key: str):
+        """
+        :return: the disk cache key of the object's current version (see `disk_cache_key`), or None if there is none
+        """
+        if is_immutable_key(key):
+            return key
+        try:
+            s3_object = await self.object_storage.head_object(bucket, key)
+        except ClientError:
+            # e.g. archived, leave it to the GET to sort out
+            return None
+        return disk_cache_key(key, s3_object.get("ETag"))
+
+    def _serve_cached(self, request, key: str, entry: dict) -> Response:
+        last_modified = datetime.datetime.fromisoformat(entry["last_modified"]) if entry.get("last_modified") else None
+        headers = image_headers(key, entry.get("etag"), last_modified)
+        if entry.get("etag") and conditional.is_not_modified(request, entry["etag"]):
+            return Response(status_code=304, headers=headers)
+        size = entry["size"]
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        first, last = byte_range or (0, size - 1)
+        headers["Content-Length"] = str(last - first + 1)
+        if byte_range is not None:
+            headers["Content-Range"] = f"bytes {first}-{last}/{size}"
+        return StreamingResponse(
+            DiskCache.read(entry["path"], first, last) if size else iter(()),
+            status_code=206 if byte_range is not None else 200,
+            headers=headers,
+            media_type=entry.get("content_type")
+        )
+
+    def stats(self) -> dict:
+        return {"disk_cache": self.disk_cache.stats() if self.disk_cache is not None else None}
+
+
+def create_image_proxy(object_storage) -> ImageProxy:
+    """
+    Build the image proxy configured via the environment (see the module docstring)
+    """
+    disk_cache = None
+    if cache_dir := os.environ.get("IMAGE_CACHE_DIR"):
+        disk_cache = DiskCache(
+            cache_dir,
+            max_bytes=int(os.environ.get("IMAGE_CACHE_MAX_BYTES", DEFAULT_CACHE_MAX_BYTES)),
+            max_object_bytes=int(os.environ.get("IMAGE_CACHE_MAX_OBJECT_BYTES", DEFAULT_CACHE_MAX_OBJECT_BYTES))
+        )
+    return ImageProxy(object_storage, disk_cache=disk_cache, fallback_bucket=os.environ.get("ARCHIVE_IMG_BUCKET") or None)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Schema and index management of the mongo collections: the indexes every query of the api relies on (`INDEXES`), the
+ones that are no longer used (`OBSOLETE_INDEXES`) and the compaction of documents written before we stopped storing
+null fields.
+
+`ensure_indexes` runs at startup (see `bootstrap.py`) and is idempotent, so the whole thing can also be run as a
+migration ahead of a deploy:
+    python -m app.indexes
+"""
+import asyncio
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from . import utils
+
+
+INDEXES = {
+    "patients": [
+        # keyset pagination sort order of the patient list (also serves last name prefix searches)
+        IndexModel([("last_name", ASCENDING), ("first_name", ASCENDING), ("_id", ASCENDING)], name="last_name_first_name_id"),
+        # first name prefix searches
+        IndexModel([("first_name", ASCENDING), ("last_name", ASCENDING), ("_id", ASCENDING)], name="first_name_last_name_id"),
+        # date of birth filter of the patient list, the trailing list sort order saves the in memory sort
+        IndexModel(
+            [("date_of_birth", ASCENDING), ("last_name", ASCENDING), ("first_name", ASCENDING), ("_id", ASCENDING)],
+            name="date_of_birth_last_name_first_name_id"
+        ),
+        # change polling of the event feed when mongo does not support change streams (see `events.py`), in its
+        # `(updated_at, _id)` keyset paging order
+        IndexModel([("updated_at", ASCENDING), ("_id", ASCENDING)], name="updated_at_id"),
+    ],
+    "images": [
+        # serves the per patient image listing (newest first) on the detail and image history endpoints, the `_id`
+        # tiebreaker makes it cover the keyset paging sort order as well as any `since`/`until` time window
+        IndexModel(
+            [("patient_id", ASCENDING), ("img_timestamp", DESCENDING), ("_id", DESCENDING)], name="patient_id_img_timestamp_id"
+        ),
+        # content reference lookups (see `blobs.recount`), only content addressed images have a `sha256` so the index
+        # leaves out the rest
+        IndexModel(
+            [("sha256", ASCENDING)], name="sha256", partialFilterExpression={"sha256": {"$exists": True}}
+        ),
+        # the archival scan of the hot images (see `archive.build_archive_query`), a partial index cannot select the
+        # documents missing `tier` so it leads instead (hot images are a single `null` range of it, in scan order)
+        IndexModel(
+            [("tier", ASCENDING), ("img_timestamp", ASCENDING), ("_id", ASCENDING)], name="tier_img_timestamp_id"
+        ),
+    ],
+}
+
+# indexes that were superseded by one of the above, they cost every write and serve no query
+OBSOLETE_INDEXES = {
+    "patients": ["updated_at"],
+    "images": ["patient_id_img_timestamp"],
+}
+
+# fields that are left out of documents rather than stored as null (see `utils.patient_to_document` and
+# `utils.build_patient_image_document`) and which documents they are to be stripped from, the patients' `images` are
+# leftovers from when images were embedded in the patient documents
+COMPACT_FIELDS = {
+    "patients": {"images": {"$exists": True}},
+    # (matches missing fields too, which unsetting leaves be)
+    "images": {"size": None, "content_type": None},
+}
+
+
+def _same_index(index_info: dict, index_model: IndexModel) -> bool:
+    """
+    Whether an existing index (as reported by `index_information`) matches the definition of `index_model`
+    """
+    spec = index_model.document
+    return (
+        [(field, direction) for field, direction in index_info["key"]] == list(spec["key"].items())
+        and index_info.get("partialFilterExpression") == spec.get("partialFilterExpression")
+    )
+
+
+async def ensure_indexes(db_client) -> dict:
+    """
+    Bring the indexes of every collection in line with `INDEXES`: missing indexes are created, indexes whose definition
+    changed are rebuilt and `OBSOLETE_INDEXES` are dropped. Indexes that are already in place are left alone, so this
+    is safe to run on every startup.
+    :return: mapping of collection name to the `created` and `dropped` index names
+    """
+    report = {}
+    for collection_name, index_models in INDEXES.items():
+        collection = db_client[collection_name]
+        existing = await collection.index_information()
+        dropped = [name for name in OBSOLETE_INDEXES.get(collection_name, []) if name in existing]
+        dropped += [
+            index_model.document["name"] for index_model in index_models
+            if index_model.document["name"] in existing and not _same_index(existing[index_model.document["name"]], index_model)
+        ]
+        for name in dropped:
+            await collection.drop_index(name)
+        missing = [
+            index_model for index_model in index_models
+            if index_model.document["name"] not in existing or index_model.document["name"] in dropped
+        ]
+        if missing:
+            await collection.create_indexes(missing)
+        report[collection_name] = {"created": [index_model.document["name"] for index_model in missing], "dropped": dropped}
+    return report
+
+
+async def compact_documents(db_client) -> dict:
+    """
+    Strip the `COMPACT_FIELDS` from documents written by older versions
+    :return: mapping of collection name to the number of fields that were stripped
+    """
+    report = {}
+    for collection_name, fields in COMPACT_FIELDS.items():
+        report[collection_name] = 0
+        for field, condition in fields.items():
+            result = await db_client[collection_name].update_many({field: condition}, {"$unset": {field: ""}})
+            report[collection_name] += result.modified_count
+    return report
+
+
+async def main():
+    utils.collect_parameters(["DB_NAME", "DB_HOST", "DB_USER", "DB_PASS"])
+    db_client, db_handle = await utils.get_mongodb_connection()
+    try:
+        print({"indexes": await ensure_indexes(db_handle), "compacted": await compact_documents(db_handle)})
+    finally:
+        db_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Bulk ingest of a whole imaging study (hundreds of frames) for a patient in one request.
+
+The uploaded files can be images as well as zip or tar (optionally gzip/bzip2/xz compressed) archives of images. Archive
+entries are read one at a time straight out of the uploaded archive (tar archives as a stream, never seeking back),
+each into a spooled buffer that only spills to disk for unusually large frames, and handed to `concurrency` upload
+workers through a bounded queue, so no more than a handful of frames are in flight at any time no matter the size of
+the study. Each frame is stored by its content (see `blobs.py`) and all of their metadata is recorded with a single
+bulk write at the end.
+
+Frames are recorded in upload/archive order under the study's timestamp plus one millisecond per frame (mongo keeps
+timestamps to the millisecond), which keeps their keys unique and lists them in order. A study never overwrites images
+the patient already has (an earlier study at the same timestamp, or a single upload within its milliseconds), such a
+study is rejected as a whole (`TimestampConflict`) and has to be uploaded at another timestamp.
+"""
+import os
+import uuid
+import asyncio
+import tarfile
+import zipfile
+import datetime
+import mimetypes
+import posixpath
+import tempfile
+from pymongo.errors import BulkWriteError
+from . import utils, blobs
+
+
+DEFAULT_CONCURRENCY = 8
+# frames up to this size are buffered in memory, larger ones in a temporary file
+SPOOL_MAX_MEMORY_BYTES = 16 * 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+# medical image formats mimetypes does not know about
+IMAGE_SUFFIXES = (".dcm", ".dicom")
+_DONE = object()
+DUPLICATE_KEY_ERROR_CODE = 11000
+
+
+class TimestampConflict(Exception):
+    pass
+
+
+def is_image_name(name: str) -> bool:
+    basename = posixpath.basename(name)
+    if not basename or basename.startswith(".") or "__MACOSX/" in name:
+        return False
+    return (mimetypes.guess_type(basename)[0] or "").startswith("image/") or basename.lower().endswith(IMAGE_SUFFIXES)
+
+
+def _spool(source) -> tempfile.SpooledTemporaryFile:
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY_BYTES)
+    while chunk := source.read(COPY_CHUNK_SIZE):
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def iter_entries(fileobj, filename: str):
+    """
+    Blocking iterator over the images of an uploaded file (the file itself, or the entries of an archive)
+    :return: iterator of (entry name, spooled file) tuples, or of (entry name, None) for entries that are skipped
+    """
+    lowered = filename.lower()
+    if lowered.endswith(".zip"):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                if not is_image_name(info.filename):
+                    yield info.filename, None
+                    continue
+                with archive.open(info) as entry:
+                    yield info.filename, _spool(entry)
+    elif lowered.endswith(TAR_SUFFIXES):
+        with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+            for member in archive:
+                if member.isdir():
+                    continue
+                if not member.isfile() or not is_image_name(member.name):
+                    yield member.name, None
+                    continue
+                yield member.name, _spool(archive.extractfile(member))
+    elif is_image_name(filename):
+        yield filename, fileobj
+    else:
+        yield filename, None
+
+
+async def aiter_entries(uploads):
+    """
+    Async version of `iter_entries` over several uploaded files, each entry is read in a worker thread
+    :param uploads: list of (binary file like object, filename) tuples
+    """
+    for fileobj, filename in uploads:
+        entries = iter_entries(fileobj, filename)
+        while (entry := await asyncio.to_thread(next, entries, _DONE)) is not _DONE:
+            yield entry
+
+
+async def find_conflicting_image(db_client, patient_id: str, first: datetime.datetime, last: datetime.datetime):
+    """
+    :return: the key of an image of the patient timestamped within `first` and `last` (inclusive), or None if there is
+        none
+    """
+    image_doc = await db_client.images.find_one({
+        "patient_id": uuid.UUID(patient_id),
+        # mongo only keeps milliseconds
+        "img_timestamp": {"$gte": first.replace(microsecond=first.microsecond // 1000 * 1000), "$lte": last}
+    }, {"_id": 1})
+    return image_doc["_id"] if image_doc is not None else None
+
+
+async def ingest_study(db_client, object_storage, bucket: str, patient_id: str, uploads,
+                       img_timestamp: datetime.datetime, concurrency: int = DEFAULT_CONCURRENCY) -> dict:
+    """
+    Store every image of the uploaded files and record them for the patient (see the module docstring)
+    :param uploads: list of (binary file like object, filename, content type) tuples
+    :return: dict of `ingested` (list of the recorded image documents, in order), `new_content_count` and `skipped`
+        (entry names that are not images)
+    :raises TimestampConflict: if the patient already has an image within the study's timestamps
+    """
+    if (img_key := await find_conflicting_image(db_client, patient_id, img_timestamp, img_timestamp)) is not None:
+        # spare storing a whole study that is bound to be rejected
+        raise TimestampConflict(img_key)
+    queue = asyncio.Queue(maxsize=concurrency)
+    image_docs, skipped, acquired, errors = {}, [], [], []
+    new_content_count = 0
+    content_types = {filename: content_type for _, filename, content_type in uploads}
+
+    async def upload_worker():
+        nonlocal new_content_count
+        while (item := await queue.get()) is not _DONE:
+            index, name, fileobj = item
+            try:
+                if errors:
+                    # the study is failing anyway, just drain the queue
+                    continue
+                filename = posixpath.basename(name)
+                content_type = content_types.get(name) or mimetypes.guess_type(filename)[0]
+                img_key = utils.build_image_key(
+                    patient_id, utils.format_timestamp(img_timestamp + datetime.timedelta(milliseconds=index)), filename
+                )
+                blob, size, created = await blobs.store_content(
+                    db_client, object_storage, bucket, fileobj, filename, content_type=content_type
+                )
+                acquired.append(blob["_id"])
+                new_content_count += created
+                image_docs[index] = blobs.build_image_document(img_key, blob, size, content_type=content_type)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                fileobj.close()
+
+    workers = [asyncio.create_task(upload_worker()) for _ in range(concurrency)]
+    try:
+        index = 0
+        async for name, fileobj in aiter_entries([(fileobj, filename) for fileobj, filename, _ in uploads]):
+            if errors:
+                break
+            if fileobj is None:
+                skipped.append(name)
+                continue
+            # waits for a free worker, which is what bounds the frames in flight
+            await queue.put((index, name, fileobj))
+            index += 1
+        for _ in workers:
+            await queue.put(_DONE)
+        await asyncio.gather(*workers)
+        if errors:
+            raise errors[0]
+        ingested = [image_docs[index] for index in sorted(image_docs)]
+        if ingested:
+            last = img_timestamp + datetime.timedelta(milliseconds=len(ingested) - 1)
+            if (img_key := await find_conflicting_image(db_client, patient_id, img_timestamp, last)) is not None:
+                raise TimestampConflict(img_key)
+            try:
+                await blobs.record_images(db_client, ingested)
+            except BulkWriteError as e:
+                # another study at the same timestamp got recorded in the meantime
+                if all(error["code"] == DUPLICATE_KEY_ERROR_CODE for error in e.details["writeErrors"]):
+                    raise TimestampConflict(e.details["writeErrors"][0]["op"]["_id"]) from e
+                raise
+    except BaseException:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # nothing got recorded, so hand back the references taken on the stored contents
+        for digest in acquired:
+            await blobs.release(db_client, digest)
+        raise
+
+    return {"ingested": ingested, "new_content_count": new_content_count, "skipped": skipped}
+
+
+def concurrency_from_env() -> int:
+    return int(os.environ.get("IMAGE_INGEST_CONCURRENCY", DEFAULT_CONCURRENCY))
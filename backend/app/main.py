@@ -3,14 +3,17 @@
 # 01/20/2024
 # FoS for Intuitive Surgical
 import os
-import datetime
 import uuid
-import boto3
+import asyncio
+import tarfile
+import zipfile
+import datetime
 from contextlib import asynccontextmanager
 from botocore.exceptions import ClientError
 from typing import Annotated, Union
-from fastapi import FastAPI, Path, File, Form, UploadFile, HTTPException
-from . import utils, models, fixtures
+from fastapi import FastAPI, Request, Response, Path, Query, File, Form, UploadFile, HTTPException
+from fastapi.responses import StreamingResponse, ORJSONResponse
+from . import utils, models, storage, export, bulk, derivatives, cache, conditional, metrics, health, bootstrap, responses, blobs, admission, events, image_proxy, ingest, archive
 
 
 # before we initiate the FastAPI app ensure that we have all the required environment (mongodb info, minio, etc)
@@ -29,28 +32,166 @@ async def lifespan(app: FastAPI):
     """
     # Operations to perform prior to whence the app starts taking requests
 
-    # Motor (mongo's async python client) setup
+    # metrics/tracing have to be set up first so that the clients below get instrumented
+    metrics.configure()
+
+    # Motor (mongo's async python client) setup, motor connects in the background so this does not wait on mongo
     app.mongodb_client, app.mongodb = await utils.get_mongodb_connection()
 
-    # object storage boto3 client setup
-    app.s3_boto = boto3.client('s3',
-        endpoint_url=f"http://{os.environ["MINIO_SERVER_HOST"]}:9000",
-        aws_access_key_id=os.environ["MINIO_SERVER_ACCESS_KEY"],
-        aws_secret_access_key=os.environ["MINIO_SERVER_SECRET_KEY"]
+    # object storage setup (boto3 calls run on a dedicated, bounded thread pool so they never block the event loop,
+    # and the boto3 clients themselves are only built once first needed)
+    app.storage = storage.create_object_storage()
+
+    # api side image delivery (streamed out of object storage, optionally through a local disk cache)
+    app.image_proxy = image_proxy.create_image_proxy(app.storage)
+
+    # read-through cache in front of the patient detail lookups
+    app.patient_cache = cache.create_response_cache()
+    cache_metrics_collector = metrics.cache_collector(app.patient_cache)
+
+    # rate limits/concurrency caps shedding bursts with 429s before they reach mongo and minio
+    app.admission = admission.create_admission_controller()
+    admission_metrics_collector = metrics.admission_collector(app.admission)
+
+    # live feed of patient/image changes (a single change stream watcher per worker, started with the first subscriber)
+    app.events = events.create_event_feed(app.mongodb)
+
+    # thumbnail/preview renditions of uploaded images are rendered in the background (in a process pool)
+    app.derivatives = derivatives.DerivativePipeline(
+        on_update=lambda img_key: app.patient_cache.invalidate(str(utils.parse_image_key(img_key)[0]))
+    )
+
+    # moves images past the retention threshold to the cold bucket in the background (if there is one)
+    app.archiver = archive.create_archive_worker(
+        app.mongodb, app.storage, on_update=lambda img_key: app.patient_cache.invalidate(str(utils.parse_image_key(img_key)[0]))
     )
 
-    # Populate with initial data if db empty
-    await fixtures.populate_fixtures(app.mongodb, app.s3_boto)
+    # Create the buckets, indexes and fixture data (if missing) unless a separate bootstrap job (`python -m
+    # app.bootstrap`) takes care of that, in which case this worker is able to take requests right away
+    if os.environ.get("BOOTSTRAP_ON_STARTUP", "true").lower() in ("1", "true", "yes"):
+        await bootstrap.bootstrap(app.mongodb, app.storage)
+
+    # warm up the mongo and object storage connections in the background, `/health/ready` reports when that is done
+    app.readiness = health.Readiness()
+    app.warm_up = asyncio.create_task(app.readiness.warm_up(app.mongodb, app.storage, os.environ["PATIENT_IMG_BUCKET"]))
+    if app.archiver is not None:
+        app.archiver.start()
 
     # This yields execution back to the FastAPI which starts taking requests
     yield
 
     # Any shutdown cleanup and resource clearance should go here
+    app.warm_up.cancel()
+    if app.archiver is not None:
+        await app.archiver.close()
+    await app.events.close()
+    await app.derivatives.close()
+    await app.patient_cache.close()
+    metrics.unregister(cache_metrics_collector)
+    if app.admission is not None:
+        await app.admission.close()
+    metrics.unregister(admission_metrics_collector)
     app.mongodb_client.close()
+    app.storage.close()
 
 
 # Establish the FastAPI app
-app = FastAPI(lifespan=lifespan)
+# (the heavy patient routes bypass this altogether and encode their responses themselves, see `responses.py`)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(admission.AdmissionMiddleware)
+# added last so that it is the outermost middleware and also times the requests shed by admission control
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+@app.get("/health/live", include_in_schema=False)
+async def liveness():
+    """
+    Liveness probe, the worker is up and serving requests
+    """
+    return {"live": True}
+
+
+@app.get("/health/ready", include_in_schema=False)
+async def readiness(response: Response):
+    """
+    Readiness probe, 503 until the worker's mongo and object storage connections are warm
+    """
+    if not app.readiness.ready:
+        response.status_code = 503
+    return app.readiness.status()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Prometheus scrape endpoint (only available with `METRICS_ENABLED=true`)
+    """
+    if not metrics.enabled():
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    payload, content_type = metrics.render()
+    return Response(content=payload, media_type=content_type)
+
+
+# the stats endpoints are not proxied by nginx (see `nginx_templates`), they are for whoever reaches the api itself
+@app.get("/cache/stats", response_description="Patient detail cache statistics", include_in_schema=False)
+async def cache_stats():
+    """
+    Hit/miss counters (since this worker process started) and occupancy of the patient detail cache (and of the image
+    disk cache under `image_disk_cache`, null unless enabled)
+    """
+    return {**app.patient_cache.stats(), "image_disk_cache": app.image_proxy.stats()["disk_cache"]}
+
+
+@app.get("/admission/stats", response_description="Admission control statistics", include_in_schema=False)
+async def admission_stats():
+    """
+    Limits, in flight requests and admitted/rejected counters (since this worker process started) per route class
+    """
+    if app.admission is None:
+        raise HTTPException(status_code=404, detail="Admission control is disabled")
+    return app.admission.stats()
+
+
+@app.get("/images/{img_uri:path}", response_description="The image's bytes (or the requested range of them)")
+async def get_image(
+        img_uri: Annotated[str, Path(description="`img_uri` (or `thumbnail_uri`/`preview_uri`) of a patient image")],
+        request: Request
+):
+    """
+    Download a patient image by the uri the patient detail lists it under, e.g. `/images/patient-images/{key}`.
+
+    The image is streamed straight out of object storage, single `Range` requests (e.g. `bytes=0-1048575`) are
+    answered with a `206 Partial Content`. Content addressed image uris (`blobs/...`) never change their content, so
+    those responses carry a long lived `immutable` `Cache-Control` header, the rest can be overwritten by another
+    upload at the same timestamp and are to be revalidated (`no-cache`, by `ETag`). Archived images are served out of
+    the cold bucket, which may take longer.
+    """
+    bucket, _, key = img_uri.partition("/")
+    # only ever hand out patient images, not whatever else the object storage credentials may reach
+    if bucket not in (os.environ["PATIENT_IMG_BUCKET"], os.environ.get("ARCHIVE_IMG_BUCKET")) or not key:
+        raise HTTPException(status_code=404, detail=f"Image {img_uri} not found")
+    return await app.image_proxy.serve(request, bucket, key)
+
+
+@app.get("/events", response_description="Server-sent event stream of patient and image changes")
+async def event_stream(
+        patient_id: Annotated[Union[uuid.UUID, None], Query(description="Only stream the changes of this patient")] = None
+):
+    """
+    Subscribe to a `text/event-stream` of changes (e.g. via the browser's `EventSource`) instead of polling the list or
+    detail endpoints:
+    - `patient`: a patient was created or changed (`{id, first_name, last_name, date_of_birth, rev, updated_at}`)
+    - `image`: an image was uploaded or its thumbnail/preview got rendered (`{patient_id, img_key, image}`)
+    - `resync`: events were lost, re-fetch whatever is on display
+    - `hello`: which `mode` the feed runs in, `change_stream` or `polling` (standalone mongo, no `image` events, so
+      re-fetch the detail on `patient` events instead)
+    """
+    return StreamingResponse(
+        events.sse_stream(app.events.subscribe(patient_id=patient_id)),
+        media_type="text/event-stream",
+        # keep nginx from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @app.post(
@@ -69,13 +210,96 @@ async def create_patient(patient: models.PatientInput):
     Note: The patient's medical image(s) will have to uploaded post this create operation, using
     this returned `id` over at the update endpoint (PUT)
     """
-    # TODO: Optimize to one call instead of insert_one and find_one
-    patient_data = patient.model_dump(by_alias=True)
-    patient_data["date_of_birth"] =  datetime.datetime.combine(patient_data["date_of_birth"], datetime.time.min)
-    # see https://stackoverflow.com/a/44273588 for why I'm converting to datetime
-    new_patient = await app.mongodb.patients.insert_one(patient_data)
-    created_patient = await app.mongodb.patients.find_one({"_id": new_patient.inserted_id})
-    return created_patient
+    patient_data = utils.patient_to_document(patient)
+    # insert_one fills in nothing we don't already have (the id is generated on our end) so no need to read it back
+    await app.mongodb.patients.insert_one(patient_data)
+    await app.patient_cache.invalidate(str(patient_data["_id"]))
+    return patient_data
+
+
+@app.post(
+    "/patients/bulk",
+    response_description="Summary of the created patient records and of the rejected ones",
+    response_model=models.BulkCreateResult,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": models.PatientInput.model_json_schema()}},
+                "application/x-ndjson": {"schema": {"type": "string", "description": "One patient json object per line"}}
+            }
+        }
+    }
+)
+async def bulk_create_patients(request: Request):
+    """
+    Create many patient records at once.
+
+    The body is either a JSON array of patients (`Content-Type: application/json`) or newline delimited JSON with one
+    patient per line (`Content-Type: application/x-ndjson`), in which case the body is processed as it streams in.
+
+    Each record is validated and inserted independently, so invalid (or duplicate) records are reported back in `errors`
+    by their position in the request while all the valid ones are still created.
+    """
+    if request.headers.get("content-type", "").split(";")[0].strip() == "application/x-ndjson":
+        records = bulk.iter_ndjson_records(request.stream())
+    else:
+        try:
+            patients = await request.json()
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"Request body is not valid JSON: {e}")
+        if not isinstance(patients, list):
+            raise HTTPException(status_code=422, detail="Request body must be a JSON array of patients")
+        records = utils.aiter_list(patients)
+    return await bulk.bulk_create_patients(app.mongodb, records)
+
+
+@app.post(
+    "/patients/batch-get",
+    response_description="The requested patients (keyed by their ID) and the IDs that were not found",
+    response_model=models.PatientBatch,
+    response_model_by_alias=False
+)
+async def batch_get_patients(batch: models.PatientBatchGetRequest):
+    """
+    Retrieve the detailed medical records (same shape as the GET singular patient endpoint) of many patients at once,
+    e.g. a whole ward for a dashboard, instead of one request per patient.
+
+    Patients are returned in `patients` keyed by their ID, the requested IDs that match no patient are listed in
+    `not_found`.
+    """
+    patients = await utils.get_patient_entities(app.mongodb, batch.ids)
+    return responses.json_response({
+        "patients": {str(patient_id): responses.patient_payload(patient) for patient_id, patient in patients.items()},
+        "not_found": list(dict.fromkeys(patient_id for patient_id in batch.ids if patient_id not in patients))
+    })
+
+
+# Note: this route has to be registered before the `/patients/{patient_id}` one else it'd be shadowed by it
+@app.get(
+    "/patients/export",
+    response_class=StreamingResponse,
+    response_description="NDJSON stream of every patient",
+    responses={200: {"content": {"application/x-ndjson": {}}}}
+)
+async def export_patients(
+        include_images: Annotated[bool, Query(description="Include each patient's `images`")] = False,
+        gzip: Annotated[bool, Query(description="gzip the stream (sent with `Content-Encoding: gzip`)")] = False,
+        batch_size: Annotated[int, Query(ge=1, le=10000, description="Number of patients fetched from the database at a time")] = 1000
+):
+    """
+    Export the full patient roster as newline delimited JSON, one patient (same shape as the GET singular patient
+    endpoint) per line.
+
+    The response is streamed out as the patients are read from the database so it is suitable for exporting
+    arbitrarily large rosters.
+    """
+    headers = {"Content-Encoding": "gzip"} if gzip else None
+    return StreamingResponse(
+        export.iter_patient_export(app.mongodb, batch_size=batch_size, include_images=include_images, compress=gzip),
+        media_type="application/x-ndjson",
+        headers=headers
+    )
 
 
 @app.get(
@@ -84,7 +308,12 @@ async def create_patient(patient: models.PatientInput):
     response_model_by_alias=False
 )
 async def get_patient(
-        patient_id: Annotated[str, Path(pattern=utils.UUID4_REGEX_PATTERN, description="The ID of the patient whose data to get")]
+        patient_id: Annotated[str, Path(pattern=utils.UUID4_REGEX_PATTERN, description="The ID of the patient whose data to get")],
+        request: Request,
+        since: Annotated[Union[datetime.datetime, None], Query(description="Only include images taken at or after this time")] = None,
+        until: Annotated[Union[datetime.datetime, None], Query(description="Only include images taken before this time")] = None,
+        limit: Annotated[Union[int, None], Query(ge=1, le=1000, description="Only include the latest `limit` images")] = None,
+        include_archived: Annotated[bool, Query(description="Also include the images that were moved to the archive")] = False
 ):
     """
     Retrieve a patient's detailed medical record with images (if available) via the `patient_id` parameter specified.
@@ -96,28 +325,130 @@ async def get_patient(
     then use the value specified via the `img_uri` by suffixing to the above base url as follows:
     http://localhost/{img_uri}
 
+    The response carries `ETag` and `Last-Modified` headers, send them back via `If-None-Match`/`If-Modified-Since` to
+    get a bodiless `304 Not Modified` response if the patient's record has not changed since.
+
+    The optional `since`/`until`/`limit` query parameters narrow the `images` down to a time window and/or the latest
+    `limit` images (newest first), use `GET /patients/{patient_id}/images` to page through the rest of a long history.
+
+    Images older than the retention threshold get moved to the archive (cold storage) in the background, and are only
+    included (with `archived` set) when asked for via `include_archived=true`.
     """
-    # Note: First time using the walrus operator for me (Syntactic Sugar FTW!)
-    if (patient := await utils.get_patient_entity(app.mongodb, app.s3_boto, patient_id)) is not None:
-        return patient
+    if conditional.has_validators(request):
+        # a conditional request only needs the patient's revision to be answered
+        if (version := await app.mongodb.patients.find_one({"_id": uuid.UUID(patient_id)}, {"rev": 1, "updated_at": 1})) is None:
+            raise HTTPException(status_code=404, detail=f"Patient {patient_id} not found")
+        etag, modified_at = conditional.patient_etag(version), conditional.last_modified(version)
+        if conditional.is_not_modified(request, etag, modified_at):
+            return conditional.not_modified_response(etag, modified_at)
+
+    if since is None and until is None and limit is None and not include_archived:
+        # Note: First time using the walrus operator for me (Syntactic Sugar FTW!)
+        patient = await app.patient_cache.get_or_load(
+            str(uuid.UUID(patient_id)), lambda: utils.get_patient_entity(app.mongodb, patient_id)
+        )
+    else:
+        # the cache only holds the default records (hot images only), narrowed down ones are cheap index range scans
+        # anyway and archived images are rarely asked for
+        patient = await utils.get_patient_entity(
+            app.mongodb, patient_id, since=since, until=until, limit=limit, include_archived=include_archived
+        )
+    if patient is not None:
+        return responses.json_response(
+            responses.patient_payload(patient),
+            headers=conditional.validator_headers(conditional.patient_etag(patient), conditional.last_modified(patient))
+        )
     else:
         raise HTTPException(status_code=404, detail=f"Patient {patient_id} not found")
 
 
+@app.get(
+    "/patients/{patient_id}/images",
+    response_description="A page of the patient's image history",
+    response_model=models.PatientImagePage
+)
+async def list_patient_images(
+        patient_id: Annotated[str, Path(pattern=utils.UUID4_REGEX_PATTERN, description="The ID of the patient whose images to list")],
+        since: Annotated[Union[datetime.datetime, None], Query(description="Only list images taken at or after this time")] = None,
+        until: Annotated[Union[datetime.datetime, None], Query(description="Only list images taken before this time")] = None,
+        limit: Annotated[int, Query(ge=1, le=1000, description="Maximum number of images to return in this page")] = 100,
+        cursor: Annotated[Union[str, None], Query(description="`next_cursor` token from the previous page")] = None,
+        include_archived: Annotated[bool, Query(description="Also list the images that were moved to the archive")] = False
+):
+    """
+    Page through a patient's image history, newest first, optionally restricted to images taken in the
+    `[since, until)` time window (e.g. the latest 10 images are simply `?limit=10`). Archived images are only listed
+    with `include_archived=true`.
+
+    To fetch the following (older) page pass the `next_cursor` from the response back as the `cursor` query parameter
+    (along with the same `since`/`until`/`include_archived`), when `next_cursor` is null you have reached the oldest image.
+    """
+    if await app.mongodb.patients.find_one({"_id": uuid.UUID(patient_id)}, {"_id": 1}) is None:
+        raise HTTPException(status_code=404, detail=f"Patient {patient_id} not found")
+    try:
+        images, next_cursor = await utils.list_patient_images_page(
+            app.mongodb, patient_id, limit, cursor=cursor, since=since, until=until, include_archived=include_archived
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=422,
+            detail=[{
+                'loc': ["query", 'cursor'],
+                'msg': f"cursor '{cursor}' is not a valid patient image cursor",
+                'type': 'value_error.str.format'
+            }]
+        )
+    return responses.json_response({"images": images, "next_cursor": next_cursor})
+
+
 @app.get(
     "/patients/",
     response_description="List all patients",
     response_model=models.PatientCollection,
     response_model_by_alias=False
 )
-async def list_patients():
+async def list_patients(
+        request: Request,
+        limit: Annotated[int, Query(ge=1, le=1000, description="Maximum number of patients to return in this page")] = 100,
+        cursor: Annotated[Union[str, None], Query(description="`next_cursor` token from the previous page")] = None,
+        first_name: Annotated[Union[str, None], Query(description="Only list patients whose first name starts with this")] = None,
+        last_name: Annotated[Union[str, None], Query(description="Only list patients whose last name starts with this")] = None,
+        date_of_birth: Annotated[Union[datetime.date, None], Query(description="Only list patients born on this date (ISO 8601)")] = None
+):
     """
     This endpoint provides an abridged list of patient entities enough for the physician to search through
     and then retrieve a detailed entity via the GET (singular) patient data endpoint using the id obtained here.
 
-    TODO: This is currently non-paginated and limited to the first 1000 records, fix with pagination
+    Patients are ordered by last name, then first name, and are returned a page (of at most `limit` patients) at a time.
+    To fetch the following page pass the `next_cursor` from the response back as the `cursor` query parameter, when
+    `next_cursor` is null you have reached the last page.
+
+    The optional `first_name`/`last_name` filters are case sensitive prefix matches (e.g. `last_name=Rog`), the optional
+    `date_of_birth` filter an exact match (e.g. `date_of_birth=1986-09-18`).
+
+    Every page carries an `ETag` header, send it back via `If-None-Match` to get a bodiless `304 Not Modified` response
+    if the page has not changed since.
     """
-    return models.PatientCollection(patients=await app.mongodb.patients.find().to_list(length=1000))
+    try:
+        patients, next_cursor = await utils.list_patients_page(
+            app.mongodb, limit, cursor=cursor, first_name=first_name, last_name=last_name, date_of_birth=date_of_birth
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=422,
+            detail=[{
+                'loc': ["query", 'cursor'],
+                'msg': f"cursor '{cursor}' is not a valid patient list cursor",
+                'type': 'value_error.str.format'
+            }]
+        )
+    etag = conditional.patient_list_etag(patients, next_cursor)
+    if conditional.is_not_modified(request, etag):
+        return conditional.not_modified_response(etag)
+    return responses.json_response(
+        {"patients": [responses.patient_list_payload(patient) for patient in patients], "next_cursor": next_cursor},
+        headers=conditional.validator_headers(etag)
+    )
 
 
 @app.put(
@@ -134,6 +465,12 @@ async def update_patient(
     """
     Add a medical image to the patient's medical images set
 
+    Images are stored by their content, so uploading an image that is already stored (e.g. uploading the same scan
+    twice) does not store it again, the new entry in `images` simply points at the already stored image.
+
+    Smaller renditions of the image (`thumbnail_uri`/`preview_uri`) are generated in the background after the upload
+    so they will show up on the patient's record shortly after.
+
     If a timestamp is not specified via the `img_timestamp` form string attribute in the ISO 8601 format, then the current
     utc time will be stored.
     """
@@ -151,13 +488,16 @@ async def update_patient(
 
     if (patient := await app.mongodb.patients.find_one({"_id": uuid.UUID(patient_id)})) is not None:
         try:
-            file_type_suffix = uploaded_img_file.filename.rsplit(".", 1)
-            file_type_suffix = f".{file_type_suffix[1]}" if len(file_type_suffix) > 1 else ""
-            await uploaded_img_file.seek(0)
-            app.s3_boto.upload_fileobj(
-                uploaded_img_file.file, os.environ["PATIENT_IMG_BUCKET"], f"{patient_id}/{img_timestamp}{file_type_suffix}"
+            img_key = utils.build_image_key(patient_id, img_timestamp, uploaded_img_file.filename)
+            # re-uploads of an image we already have only record another reference to the stored one
+            image_doc, _ = await blobs.store_image(
+                app.mongodb, app.storage, os.environ["PATIENT_IMG_BUCKET"], uploaded_img_file.file, img_key,
+                uploaded_img_file.filename, content_type=uploaded_img_file.content_type
             )
-            patient["images"] = utils.get_patient_images(app.s3_boto, patient_id)
+            await app.patient_cache.invalidate(str(patient["_id"]))
+            if "derivatives" not in image_doc:
+                app.derivatives.submit(app.mongodb, app.storage, img_key)
+            patient["images"] = await utils.get_patient_images(app.mongodb, patient_id)
             patient["date_of_birth"] = patient["date_of_birth"].date()
             return patient
         except ClientError as e:
@@ -168,3 +508,198 @@ async def update_patient(
             uploaded_img_file.file.close()
     else:
         raise HTTPException(status_code=404, detail=f"Patient {patient_id} not found")
+
+
+@app.post(
+    "/patients/{patient_id}/images/bulk",
+    response_model=models.ImageIngestResult,
+    response_description="Add a whole imaging study to the specified patient's medical images"
+)
+async def ingest_patient_images(
+        patient_id: Annotated[str, Path(pattern=utils.UUID4_REGEX_PATTERN, description="The ID of the patient for which the study is being uploaded")],
+        files: Annotated[list[UploadFile], File(description="Images and/or zip/tar archives of images")],
+        img_timestamp: Union[str, None] = Form(default=None, description="Timestamp of the study specified in ISO8601 DateTime format")
+):
+    """
+    Add many medical images (e.g. the frames of an imaging study) to the patient's medical images set in one go, as
+    several files and/or as zip or tar (.tar, .tar.gz, .tgz, .tar.bz2, .tar.xz) archives of images.
+
+    The images are recorded in the order they were uploaded in (archive entries in archive order) under the study's
+    `img_timestamp` (the current utc time if not specified) plus one millisecond per image. Archive entries that are not
+    images (going by their file extension) are left out and listed under `skipped`. A study never replaces images the
+    patient already has, if any of them falls within the study's milliseconds nothing is recorded and the response is a
+    `409 Conflict` (upload the study at another timestamp instead).
+
+    Like with the update endpoint (PUT), images that are already stored are not stored again and thumbnail/preview
+    renditions are generated in the background.
+    """
+    try:
+        study_timestamp = utils.as_utc(datetime.datetime.fromisoformat(img_timestamp)) if img_timestamp else datetime.datetime.now(datetime.timezone.utc)
+    except ValueError:
+        raise HTTPException(
+            status_code=422,
+            detail=[{
+                'loc': ["form", 'img_timestamp'],
+                'msg': f"img_timestamp '{img_timestamp}' is not per ISO8601 datetime spec",
+                'type': 'value_error.str.format'
+            }]
+        )
+
+    try:
+        if await app.mongodb.patients.find_one({"_id": uuid.UUID(patient_id)}, {"_id": 1}) is None:
+            raise HTTPException(status_code=404, detail=f"Patient {patient_id} not found")
+        result = await ingest.ingest_study(
+            app.mongodb, app.storage, os.environ["PATIENT_IMG_BUCKET"], patient_id,
+            [(upload.file, upload.filename or "", upload.content_type) for upload in files],
+            study_timestamp, concurrency=ingest.concurrency_from_env()
+        )
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        raise HTTPException(
+            status_code=422,
+            detail=[{'loc': ["body", 'files'], 'msg': f"Unreadable archive: {e}", 'type': 'value_error.archive'}]
+        )
+    except ingest.TimestampConflict as e:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Patient {patient_id} already has an image within the study's timestamps: {e}"
+        )
+    except ClientError as e:
+        raise HTTPException(status_code=500, detail=f"Object storage upload error: {e.response['Error']['Message']}")
+    finally:
+        for upload in files:
+            upload.file.close()
+
+    if result["ingested"]:
+        await app.patient_cache.invalidate(str(uuid.UUID(patient_id)))
+    for image_doc in result["ingested"]:
+        if "derivatives" not in image_doc:
+            app.derivatives.submit(app.mongodb, app.storage, image_doc["_id"])
+    return responses.json_response({
+        "ingested_count": len(result["ingested"]),
+        "new_content_count": result["new_content_count"],
+        "skipped": result["skipped"],
+        "images": await utils.get_patient_images(app.mongodb, patient_id)
+    })
+
+
+@app.post(
+    "/patients/{patient_id}/images/uploads",
+    response_model=models.ImageUploadTicket,
+    status_code=201,
+    response_description="Presigned url(s) to upload the patient's medical image straight to object storage"
+)
+async def initiate_image_upload(
+        patient_id: Annotated[str, Path(pattern=utils.UUID4_REGEX_PATTERN, description="The ID of the patient for which the medical image is being uploaded")],
+        upload: models.ImageUploadRequest
+):
+    """
+    Start a direct-to-storage upload of a medical image (an alternative to the update endpoint (PUT) which does not
+    route the image bytes through this api, so use this one for large images).
+
+    For images up to 64MiB (or of unspecified `size`) the response holds a single presigned `url`, PUT the image bytes to it.
+
+    For larger images (or if `multipart` is set) the response holds an `upload_id` plus one presigned url per part of
+    `part_size` bytes in `parts` instead, PUT each part's bytes to its url (in parallel if you like) and keep the `ETag`
+    response header of each.
+
+    Either way, finish off by calling the upload completion endpoint with the `img_key` (and for multipart uploads the
+    `upload_id` and part ETags) so that the image gets recorded against the patient.
+    """
+    if await app.mongodb.patients.find_one({"_id": uuid.UUID(patient_id)}, {"_id": 1}) is None:
+        raise HTTPException(status_code=404, detail=f"Patient {patient_id} not found")
+
+    img_timestamp = utils.format_timestamp(upload.img_timestamp) if upload.img_timestamp else utils.get_utcnow()
+    img_key = utils.build_image_key(patient_id, img_timestamp, upload.filename)
+    bucket = os.environ["PATIENT_IMG_BUCKET"]
+    expires_in = storage.PRESIGNED_URL_EXPIRY_SECONDS
+
+    if not upload.multipart and (upload.size or 0) <= storage.MULTIPART_THRESHOLD:
+        return models.ImageUploadTicket(
+            img_key=img_key,
+            url=app.storage.presigned_put_url(bucket, img_key, expires_in, content_type=upload.content_type),
+            expires_in=expires_in
+        )
+
+    part_count = max(1, -(-(upload.size or 0) // storage.MULTIPART_PART_SIZE))
+    if part_count > storage.MAX_MULTIPART_PARTS:
+        raise HTTPException(
+            status_code=422,
+            detail=[{
+                'loc': ["body", 'size'],
+                'msg': f"size {upload.size} exceeds the maximum upload size of {storage.MAX_MULTIPART_PARTS * storage.MULTIPART_PART_SIZE}",
+                'type': 'value_error.number.not_le'
+            }]
+        )
+    try:
+        upload_id = await app.storage.create_multipart_upload(bucket, img_key, content_type=upload.content_type)
+    except ClientError as e:
+        raise HTTPException(status_code=500, detail=f"Object storage upload error: {e.response['Error']['Message']}")
+    return models.ImageUploadTicket(
+        img_key=img_key,
+        upload_id=upload_id,
+        part_size=storage.MULTIPART_PART_SIZE,
+        parts=[
+            models.ImageUploadPart(
+                part_number=part_number,
+                url=app.storage.presigned_upload_part_url(bucket, img_key, upload_id, part_number, expires_in)
+            )
+            for part_number in range(1, part_count + 1)
+        ],
+        expires_in=expires_in
+    )
+
+
+@app.post(
+    "/patients/{patient_id}/images/uploads/complete",
+    response_model=models.Patient,
+    response_model_by_alias=False,
+    response_description="The patient's record including the newly uploaded medical image"
+)
+async def complete_image_upload(
+        patient_id: Annotated[str, Path(pattern=utils.UUID4_REGEX_PATTERN, description="The ID of the patient for which the medical image was uploaded")],
+        completion: models.ImageUploadCompletion
+):
+    """
+    Finish a direct-to-storage upload started via the upload initiation endpoint and record the image against the
+    patient.
+    """
+    if (patient := await app.mongodb.patients.find_one({"_id": uuid.UUID(patient_id)})) is None:
+        raise HTTPException(status_code=404, detail=f"Patient {patient_id} not found")
+
+    try:
+        if not completion.img_key.startswith(f"{patient_id}/"):
+            raise ValueError(completion.img_key)
+        utils.parse_image_key(completion.img_key)
+    except ValueError:
+        raise HTTPException(
+            status_code=422,
+            detail=[{
+                'loc': ["body", 'img_key'],
+                'msg': f"img_key '{completion.img_key}' is not an image key of patient {patient_id}",
+                'type': 'value_error'
+            }]
+        )
+
+    bucket = os.environ["PATIENT_IMG_BUCKET"]
+    try:
+        if completion.upload_id:
+            await app.storage.complete_multipart_upload(
+                bucket, completion.img_key, completion.upload_id,
+                [{"PartNumber": part.part_number, "ETag": part.etag} for part in completion.parts or []]
+            )
+        s3_object = await app.storage.head_object(bucket, completion.img_key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ("404", "NoSuchKey", "NoSuchUpload"):
+            raise HTTPException(status_code=404, detail=f"No upload found for {completion.img_key}")
+        if e.response['Error']['Code'] in ("InvalidPart", "InvalidPartOrder", "EntityTooSmall"):
+            raise HTTPException(status_code=422, detail=f"Invalid multipart upload parts: {e.response['Error']['Message']}")
+        raise HTTPException(status_code=500, detail=f"Object storage upload error: {e.response['Error']['Message']}")
+
+    await utils.record_patient_image(
+        app.mongodb, completion.img_key, size=s3_object["ContentLength"], content_type=s3_object.get("ContentType")
+    )
+    await app.patient_cache.invalidate(str(patient["_id"]))
+    app.derivatives.submit(app.mongodb, app.storage, completion.img_key)
+    patient["images"] = await utils.get_patient_images(app.mongodb, patient_id)
+    patient["date_of_birth"] = patient["date_of_birth"].date()
+    return patient
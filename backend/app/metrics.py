@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Prometheus metrics (and optional OpenTelemetry tracing) of the api's hot paths.
+
+Turned on via `METRICS_ENABLED=true` (needs the `prometheus_client` package), in which case `/metrics` serves:
+- `fos_http_request_duration_seconds{route,method,status}`: per route handler latency
+- `fos_mongo_command_duration_seconds{command}`: every command motor sends to mongo (via pymongo command monitoring)
+- `fos_s3_call_duration_seconds{operation}`: every object storage call
+- `fos_step_duration_seconds{step}`: internal steps such as formatting a batch of patient images
+- `fos_patient_cache_*`: patient detail cache counters
+- `fos_admission_*`: requests admitted/shed/in flight per route class (see `admission.py`)
+
+Setting `OTEL_ENABLED=true` additionally wraps the same operations in OpenTelemetry spans (needs `opentelemetry-api`,
+exporter setup is left to the usual `opentelemetry-instrument`/sdk configuration).
+
+When served by several worker processes (see `gunicorn_conf.py`) set `PROMETHEUS_MULTIPROC_DIR` so that `/metrics`
+reports the histograms aggregated over all workers (the patient cache and admission counters are per worker and thus
+left out, each worker's are served at `/cache/stats` and `/admission/stats`).
+
+When disabled every hook here boils down to returning a shared no-op context manager.
+"""
+import os
+import time
+import contextlib
+from pymongo import monitoring
+
+try:
+    import prometheus_client
+    import prometheus_client.core
+    import prometheus_client.registry
+    import prometheus_client.multiprocess
+except ImportError:  # pragma: no cover
+    prometheus_client = None
+
+try:
+    from opentelemetry import trace
+except ImportError:  # pragma: no cover
+    trace = None
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_NOOP = contextlib.nullcontext()
+
+_state = {"enabled": False, "tracer": None}
+_histograms = {}
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "false").lower() in ("1", "true", "yes")
+
+
+def configure(enabled: bool = None, tracing: bool = None) -> bool:
+    """
+    Turn metrics (and tracing) on or off, defaults to the `METRICS_ENABLED`/`OTEL_ENABLED` environment variables
+    :return: whether metrics are enabled
+    """
+    enabled = _env_flag("METRICS_ENABLED") if enabled is None else enabled
+    tracing = _env_flag("OTEL_ENABLED") if tracing is None else tracing
+    if enabled and prometheus_client is None:
+        raise SystemError("METRICS_ENABLED requires the `prometheus_client` package to be installed")
+    if tracing and trace is None:
+        raise SystemError("OTEL_ENABLED requires the `opentelemetry-api` package to be installed")
+
+    if enabled and not _histograms:
+        # registered once per process (the app's lifespan can run several times, e.g. in tests)
+        _histograms.update({
+            "http": prometheus_client.Histogram(
+                "fos_http_request_duration_seconds", "API request handling latency", ["route", "method", "status"],
+                buckets=LATENCY_BUCKETS
+            ),
+            "mongo": prometheus_client.Histogram(
+                "fos_mongo_command_duration_seconds", "MongoDB command latency", ["command"], buckets=LATENCY_BUCKETS
+            ),
+            "s3": prometheus_client.Histogram(
+                "fos_s3_call_duration_seconds", "Object storage call latency", ["operation"], buckets=LATENCY_BUCKETS
+            ),
+            "step": prometheus_client.Histogram(
+                "fos_step_duration_seconds", "Latency of internal processing steps", ["step"], buckets=LATENCY_BUCKETS
+            ),
+        })
+    _state["enabled"] = enabled
+    _state["tracer"] = trace.get_tracer("meddevicefos") if tracing else None
+    return enabled
+
+
+def enabled() -> bool:
+    return _state["enabled"]
+
+
+class _Timer:
+
+    __slots__ = ("histogram", "label", "span", "start")
+
+    def __init__(self, histogram, label: str, span_name: str):
+        self.histogram = histogram
+        self.label = label
+        self.span = _state["tracer"].start_as_current_span(span_name) if _state["tracer"] is not None else None
+
+    def __enter__(self):
+        if self.span is not None:
+            self.span.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.histogram is not None:
+            self.histogram.labels(self.label).observe(time.perf_counter() - self.start)
+        if self.span is not None:
+            self.span.__exit__(*exc_info)
+        return False
+
+
+def timed(kind: str, label: str):
+    """
+    Context manager timing an operation into the `kind` ("s3" or "step") histogram under `label`
+    """
+    if not _state["enabled"] and _state["tracer"] is None:
+        return _NOOP
+    return _Timer(_histograms.get(kind) if _state["enabled"] else None, label, f"{kind} {label}")
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    pymongo command monitoring listener feeding `fos_mongo_command_duration_seconds` (pymongo already measures the
+    duration, so this costs a dict lookup and an observe per command)
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._observe(event)
+
+    def failed(self, event):
+        self._observe(event)
+
+    @staticmethod
+    def _observe(event):
+        if _state["enabled"]:
+            _histograms["mongo"].labels(event.command_name).observe(event.duration_micros / 1e6)
+
+
+def command_listeners() -> list:
+    """
+    Event listeners to register with the motor client (none at all when metrics are disabled)
+    """
+    return [MongoCommandListener()] if _state["enabled"] else []
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every http request, labelled by the route handler's name (rather than the raw path) to
+    keep the label cardinality bounded
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (not _state["enabled"] and _state["tracer"] is None):
+            return await self.app(scope, receive, send)
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        span = None
+        if _state["tracer"] is not None:
+            span = _state["tracer"].start_as_current_span(f"{scope['method']} {scope['path']}")
+            span.__enter__()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            endpoint = scope.get("endpoint")
+            route = getattr(endpoint, "__name__", "unmatched")
+            if _state["enabled"]:
+                _histograms["http"].labels(route, scope["method"], str(status["code"])).observe(time.perf_counter() - start)
+            if span is not None:
+                span.__exit__(None, None, None)
+
+
+def cache_collector(response_cache):
+    """
+    Register a collector exposing the patient cache counters (read at scrape time, so the cache itself stays untouched)
+    """
+    if not _state["enabled"]:
+        return None
+
+    class CacheCollector(prometheus_client.registry.Collector):
+
+        def collect(self):
+            stats = response_cache.stats()
+            for key in ("hits", "misses", "invalidations"):
+                yield prometheus_client.core.CounterMetricFamily(f"fos_patient_cache_{key}", f"Patient cache {key}", value=stats[key])
+            if "size" in stats:
+                yield prometheus_client.core.GaugeMetricFamily("fos_patient_cache_size", "Patient cache entries", value=stats["size"])
+
+    collector = CacheCollector()
+    prometheus_client.REGISTRY.register(collector)
+    return collector
+
+
+def admission_collector(controller):
+    """
+    Register a collector exposing the admission control counters (read at scrape time like the cache's)
+    """
+    if not _state["enabled"] or controller is None:
+        return None
+
+    class AdmissionCollector(prometheus_client.registry.Collector):
+
+        def collect(self):
+            admitted = prometheus_client.core.CounterMetricFamily(
+                "fos_admission_admitted", "Requests admitted by admission control", labels=["route_class"]
+            )
+            for route_class, count in controller.admitted.items():
+                admitted.add_metric([route_class], count)
+            rejected = prometheus_client.core.CounterMetricFamily(
+                "fos_admission_rejected", "Requests shed by admission control", labels=["route_class", "reason"]
+            )
+            for (route_class, reason), count in controller.rejected.items():
+                rejected.add_metric([route_class, reason], count)
+            in_flight = prometheus_client.core.GaugeMetricFamily(
+                "fos_admission_in_flight", "Admitted requests in flight", labels=["route_class"]
+            )
+            for route_class, count in controller.in_flight.items():
+                in_flight.add_metric([route_class], count)
+            yield from (admitted, rejected, in_flight)
+
+    collector = AdmissionCollector()
+    prometheus_client.REGISTRY.register(collector)
+    return collector
+
+
+def unregister(collector):
+    if collector is not None:
+        prometheus_client.REGISTRY.unregister(collector)
+
+
+def render():
+    """
+    :return: tuple of (exposition payload, content type) for the `/metrics` endpoint
+    """
+    registry = prometheus_client.REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = prometheus_client.CollectorRegistry()
+        prometheus_client.multiprocess.MultiProcessCollector(registry)
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
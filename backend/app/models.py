@@ -17,6 +17,18 @@ class PatientImage(BaseModel):
         None,
         description="ISO 8601 formatted timestamp indicating when the patient's medical image was taken"
     )
+    thumbnail_uri: Optional[str] = Field(
+        None,
+        description="Path suffix (same usage as `img_uri`) of a small (fits in 256x256) rendition of the image, null until it has been generated"
+    )
+    preview_uri: Optional[str] = Field(
+        None,
+        description="Path suffix (same usage as `img_uri`) of a mid resolution (fits in 1024x1024) rendition of the image, null until it has been generated"
+    )
+    archived: bool = Field(
+        False,
+        description="Whether the image was moved to the archive (cold) bucket, archived images are only listed on request"
+    )
 
 
 class PatientInput(BaseModel):
@@ -49,7 +61,9 @@ class Patient(PatientInput):
                 "images": [
                     {
                         "img_uri": "patient-images/6d9e588d-424a-4af5-a5e7-f34ba7f75006/2024-01-23T12:05:30.148280Z.jpg",
-                        "img_timestamp": "2024-01-23T12:05:30.148280Z"
+                        "img_timestamp": "2024-01-23T12:05:30.148280Z",
+                        "thumbnail_uri": "patient-images/6d9e588d-424a-4af5-a5e7-f34ba7f75006/2024-01-23T12:05:30.148280Z.thumbnail.webp",
+                        "preview_uri": "patient-images/6d9e588d-424a-4af5-a5e7-f34ba7f75006/2024-01-23T12:05:30.148280Z.preview.webp"
                     },
                     {
                         "img_uri": "patient-images/6d9e588d-424a-4af5-a5e7-f34ba7f75006/2024-01-23T12:04:38.063506Z.jpg",
@@ -76,6 +90,10 @@ class PatientCollection(BaseModel):
     (see https://www.mongodb.com/developer/languages/python/python-quickstart-fastapi/)
     """
     patients: list[PatientList]
+    next_cursor: Optional[str] = Field(
+        None,
+        description="Opaque token to pass back as the `cursor` query parameter to fetch the next page (null on the last page)"
+    )
     model_config = ConfigDict(
         json_schema_extra={
             "example": {
@@ -95,7 +113,114 @@ class PatientCollection(BaseModel):
                         "first_name": "Diane",
                         "last_name": "Simmons"
                     }
+                ],
+                "next_cursor": "WyJTaW1tb25zIiwgIkRpYW5lIiwgImQ4Y2I0YTUzLWY2MWItNDhmMC04MTA2LTU2NzZiNmU4MzY4NCJd"
+            }
+        }
+    )
+
+
+class PatientImagePage(BaseModel):
+    images: list[PatientImage] = Field(..., description="A page of the patient's images, newest first")
+    next_cursor: Optional[str] = Field(
+        None,
+        description="Opaque token to pass back as the `cursor` query parameter to fetch the next (older) page (null on the last page)"
+    )
+
+
+class ImageIngestResult(BaseModel):
+    ingested_count: int = Field(..., description="Number of images recorded for the patient")
+    new_content_count: int = Field(..., description="How many of those were not stored yet (the rest are re-uploads of stored images)")
+    skipped: list[str] = Field(..., description="Names of the uploaded files/archive entries that are not images, and were thus left out")
+    images: list[PatientImage] = Field(..., description="The patient's images after the ingest, newest first")
+
+
+# upper bound on the ids of a single batch get (a ward's worth of patients is in the tens)
+MAX_BATCH_GET_IDS = 1000
+
+
+class PatientBatchGetRequest(BaseModel):
+    ids: list[uuid.UUID] = Field(..., min_length=1, max_length=MAX_BATCH_GET_IDS, description="IDs of the patients to fetch")
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "ids": ["97c2e676-b271-4cde-9f54-1fe1f9a1a037", "4efdddd4-2524-462e-8d91-762fc9ed7395"]
+            }
+        }
+    )
+
+
+class PatientBatch(BaseModel):
+    patients: dict[uuid.UUID, Patient] = Field(..., description="The patients that were found, keyed by their ID")
+    not_found: list[uuid.UUID] = Field(..., description="Requested IDs that match no patient, in request order")
+
+
+class BulkCreateError(BaseModel):
+    index: int = Field(..., description="Zero based position of the rejected record within the request")
+    errors: list[dict] = Field(..., description="Why the record was rejected (same `loc`/`msg`/`type` shape as validation errors)")
+
+
+class BulkCreateResult(BaseModel):
+    inserted_count: int = Field(..., description="Number of patients created")
+    inserted_ids: list[uuid.UUID] = Field(..., description="IDs of the created patients, in request order")
+    errors: list[BulkCreateError] = Field(..., description="Records that were rejected, the rest of the request is unaffected by these")
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "inserted_count": 2,
+                "inserted_ids": ["97c2e676-b271-4cde-9f54-1fe1f9a1a037", "4efdddd4-2524-462e-8d91-762fc9ed7395"],
+                "errors": [
+                    {
+                        "index": 1,
+                        "errors": [{"loc": ["date_of_birth"], "msg": "Field required", "type": "missing"}]
+                    }
                 ]
             }
         }
     )
+
+
+class ImageUploadRequest(BaseModel):
+    filename: str = Field(..., description="Name of the image file being uploaded (only its extension is kept)")
+    content_type: Optional[str] = Field(None, description="MIME type of the image, the upload has to be sent with this same `Content-Type`")
+    size: Optional[int] = Field(None, ge=0, description="Size of the image in bytes, large images are handed out as multipart uploads")
+    img_timestamp: Optional[datetime.datetime] = Field(
+        None,
+        description="ISO 8601 formatted timestamp indicating when the patient's medical image was taken (defaults to now)"
+    )
+    multipart: bool = Field(False, description="Force a multipart upload regardless of `size`")
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "filename": "scan.jpg",
+                "content_type": "image/jpeg",
+                "size": 104857600,
+                "img_timestamp": "2024-01-23T12:05:30.148280Z"
+            }
+        }
+    )
+
+
+class ImageUploadPart(BaseModel):
+    part_number: int = Field(..., description="1 based number of this part")
+    url: str = Field(..., description="Presigned url to PUT this part's bytes to")
+
+
+class ImageUploadTicket(BaseModel):
+    img_key: str = Field(..., description="Object storage key the image is being uploaded to, pass back when completing the upload")
+    url: Optional[str] = Field(None, description="Presigned url to PUT the whole image to (single part uploads only)")
+    upload_id: Optional[str] = Field(None, description="Multipart upload id (multipart uploads only)")
+    part_size: Optional[int] = Field(None, description="Size in bytes of every part but the last (multipart uploads only)")
+    parts: Optional[list[ImageUploadPart]] = Field(None, description="Presigned url per part, parts can be uploaded in parallel (multipart uploads only)")
+    expires_in: int = Field(..., description="Number of seconds the presigned url(s) are valid for")
+
+
+class CompletedImageUploadPart(BaseModel):
+    part_number: int = Field(..., description="1 based number of the part")
+    etag: str = Field(..., description="`ETag` response header storage returned for the part's PUT")
+
+
+class ImageUploadCompletion(BaseModel):
+    img_key: str = Field(..., description="`img_key` of the upload ticket")
+    upload_id: Optional[str] = Field(None, description="`upload_id` of the upload ticket (multipart uploads only)")
+    parts: Optional[list[CompletedImageUploadPart]] = Field(None, description="Every uploaded part (multipart uploads only)")
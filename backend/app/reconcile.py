@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Rebuild the `images` metadata collection from what is actually sitting in the patient image bucket.
+
+Usage (from the backend dir, with the usual app env vars set):
+    python -m app.reconcile
+"""
+import os
+import asyncio
+import datetime
+from pymongo import UpdateOne
+from . import utils, storage, indexes, derivatives, blobs
+
+
+RECONCILE_BATCH_SIZE = 1000
+
+
+async def reconcile_images(db_client, object_storage, bucket: str = None) -> dict:
+    """
+    Upsert a metadata document for every object in the bucket and drop the metadata of objects that no longer exist
+    (content addressed images, see `blobs.py`, cannot be rebuilt from the bucket alone so those are only ever dropped,
+    when their content is gone, and have the refcounts of their contents recounted)
+    :return: counts of upserted and removed image documents
+    :rtype: dict
+    """
+    bucket = bucket or os.environ["PATIENT_IMG_BUCKET"]
+    s3_objects = await object_storage.list_objects(bucket)
+    # derivatives are tracked on their original's document, not as images of their own
+    derivative_keys = {s3_object['Key'] for s3_object in s3_objects if derivatives.is_derivative_key(s3_object['Key'])}
+
+    seen_keys = set()
+    upserted = 0
+    operations = []
+    for s3_object in s3_objects:
+        if s3_object['Key'] in derivative_keys:
+            continue
+        try:
+            image_doc = utils.build_patient_image_document(s3_object['Key'], size=s3_object['Size'])
+        except ValueError:
+            # not one of ours (does not follow the `{patient_id}/{img_timestamp}.ext` layout)
+            continue
+        seen_keys.add(image_doc["_id"])
+        image_derivatives = {
+            rendition: derivatives.derivative_key(image_doc["_id"], rendition) for rendition in derivatives.RENDITIONS
+        }
+        if all(key in derivative_keys for key in image_derivatives.values()):
+            image_doc["derivatives"] = image_derivatives
+        operations.append(UpdateOne({"_id": image_doc.pop("_id")}, {"$set": image_doc}, upsert=True))
+        if len(operations) >= RECONCILE_BATCH_SIZE:
+            upserted += await _flush(db_client, operations)
+
+    upserted += await _flush(db_client, operations)
+
+    object_keys = {s3_object['Key'] for s3_object in s3_objects}
+    stale_keys = []
+    # archived images (see `archive.py`) are no longer in the bucket to begin with
+    async for image_doc in db_client.images.find(utils.HOT_IMAGES, {"_id": 1, "object_key": 1}):
+        if image_doc["_id"] in seen_keys or image_doc.get("object_key") in object_keys:
+            continue
+        # the listing is a snapshot, so check again for images that were uploaded after it was taken (a content
+        # addressed image cannot be rebuilt from the bucket once its document is gone)
+        if await object_storage.object_exists(bucket, image_doc.get("object_key") or image_doc["_id"]):
+            continue
+        stale_keys.append(image_doc["_id"])
+    removed = 0
+    for i in range(0, len(stale_keys), RECONCILE_BATCH_SIZE):
+        # (images archived meanwhile left the bucket on purpose)
+        result = await db_client.images.delete_many({"_id": {"$in": stale_keys[i:i + RECONCILE_BATCH_SIZE]}, **utils.HOT_IMAGES})
+        removed += result.deleted_count
+    await blobs.recount(db_client)
+
+    # we do not track which patients' images actually changed above so conservatively bump every patient's revision
+    # (this is a rare maintenance operation so a round of full refetches by clients is an acceptable price)
+    await db_client.patients.update_many(
+        {}, {"$inc": {"rev": 1}, "$set": {"updated_at": datetime.datetime.now(datetime.timezone.utc)}}
+    )
+
+    return {"upserted": upserted, "removed": removed}
+
+
+async def _flush(db_client, operations) -> int:
+    if not operations:
+        return 0
+    result = await db_client.images.bulk_write(operations, ordered=False)
+    operations.clear()
+    return result.upserted_count + result.matched_count
+
+
+async def main():
+    utils.collect_parameters([
+        "MINIO_SERVER_HOST", "MINIO_SERVER_ACCESS_KEY", "MINIO_SERVER_SECRET_KEY",
+        "DB_NAME", "DB_HOST", "DB_USER", "DB_PASS",
+        "PATIENT_IMG_BUCKET"
+    ])
+    db_client, db_handle = await utils.get_mongodb_connection()
+    object_storage = storage.create_object_storage()
+    try:
+        await indexes.ensure_indexes(db_handle)
+        print(await reconcile_images(db_handle, object_storage))
+    finally:
+        db_client.close()
+        object_storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
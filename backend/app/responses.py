@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Fast path for encoding the (potentially large) patient responses.
+
+FastAPI would validate whatever a route returns against its `response_model` and then encode the result with the
+standard library json encoder, which for a page of patients with their images takes up a good chunk of a request's cpu
+time. The patient documents we read back out of mongo were validated on their way in though, so the heavy routes
+instead pick out the fields of the documented response shape themselves and encode them with orjson straight into a
+`Response` (FastAPI skips its response processing for returned `Response`s, the `response_model` still documents the
+shape in the api docs).
+
+The payloads built here have to match what the corresponding `models` would serialise to, see `test_responses.py`.
+"""
+import orjson
+from fastapi import Response
+
+
+# aware datetimes are rendered with a `Z` suffix (instead of `+00:00`) just like pydantic does
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+def dumps(content, newline: bool = False) -> bytes:
+    return orjson.dumps(content, option=(ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE) if newline else ORJSON_OPTIONS)
+
+
+def json_response(content, status_code: int = 200, headers: dict = None) -> Response:
+    return Response(content=dumps(content), status_code=status_code, headers=headers, media_type="application/json")
+
+
+def patient_payload(patient, include_images: bool = True) -> dict:
+    """
+    `models.Patient` shaped payload of a patient document (`images` as formatted by `utils.format_patient_image_object`)
+    """
+    payload = {
+        "id": patient["_id"],
+        "first_name": patient["first_name"],
+        "last_name": patient["last_name"],
+        "date_of_birth": patient["date_of_birth"],
+    }
+    if include_images:
+        payload["images"] = patient.get("images")
+    return payload
+
+
+def patient_list_payload(patient) -> dict:
+    """
+    `models.PatientList` shaped payload of a (projected) patient document
+    """
+    return {"id": patient["_id"], "first_name": patient["first_name"], "last_name": patient["last_name"]}
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+"""
+Idempotent, resumable loader of patients (and their images) into mongo and the object storage bucket.
+
+Patients are fixture style dicts (see `fixtures.FIXTURE_DATA`, or `benchmarks.datagen` for synthetic ones) that carry
+their own id, so loading the same patients twice is a no-op and a load that died halfway through can simply be re-run:
+per batch we look up which patients and images already exist, insert only the missing patients with a single
+`insert_many`, upload the missing images concurrently and finally record their metadata with another `insert_many`
+(only once every upload of the batch went through, so the metadata index never points at a missing object).
+
+Usage (from the backend dir, with the usual app env vars set), e.g. a staging sized dataset:
+    python -m app.seed --patients 1000000 --images-per-patient 3 --concurrency 64
+"""
+import os
+import io
+import sys
+import json
+import time
+import asyncio
+import pathlib
+import argparse
+import datetime
+import itertools
+from pymongo.errors import BulkWriteError
+from . import models, utils, storage, indexes
+
+
+DEFAULT_BATCH_SIZE = 1000
+IMG_DATASET_DIR = pathlib.Path(__file__).parent.resolve()
+DUPLICATE_KEY_ERROR = 11000
+
+
+def patient_id(entity_data) -> str:
+    return str(entity_data.get("_id") or entity_data["id"])
+
+
+def patient_image_keys(entity_data) -> list[tuple[str, pathlib.Path]]:
+    """
+    :return: list of (object storage key, source file) tuples of the images listed in the patient's `images_lst`
+    """
+    image_keys = []
+    for img_obj in entity_data.get("images_lst", []):
+        img_path = pathlib.Path(img_obj["img_uri"])
+        image_keys.append((f"{patient_id(entity_data)}/{img_obj['img_timestamp']}{img_path.suffix}", img_path))
+    return image_keys
+
+
+async def _insert_missing(collection, documents: list[dict]) -> int:
+    """
+    Insert the documents whose `_id` is not in the collection yet
+    :return: how many were inserted
+    """
+    existing_ids = {
+        doc["_id"] async for doc in collection.find({"_id": {"$in": [doc["_id"] for doc in documents]}}, {"_id": 1})
+    }
+    missing = [doc for doc in documents if doc["_id"] not in existing_ids]
+    if not missing:
+        return 0
+    try:
+        await collection.insert_many(missing, ordered=False)
+    except BulkWriteError as e:
+        # someone else (e.g. a second seeder over the same dataset) got there first, which is just as good
+        if any(error["code"] != DUPLICATE_KEY_ERROR for error in e.details["writeErrors"]):
+            raise
+        return e.details["nInserted"]
+    return len(missing)
+
+
+async def seed_patients(db_client, object_storage, bucket: str, patients, batch_size: int = DEFAULT_BATCH_SIZE,
+                        progress=None) -> dict:
+    """
+    Load the given patients and their images, skipping whatever was loaded already
+    :param db_client: the mongodb database handle
+    :param object_storage: `storage.ObjectStorage` to upload the images with (its concurrency limit bounds how many
+    uploads are in flight at once)
+    :param str bucket: bucket to upload the images to
+    :param patients: iterable of fixture style patient dicts, consumed lazily `batch_size` patients at a time
+    :param progress: optional callable invoked with the running totals after every batch
+    :return: dict of counts of inserted/skipped patients and uploaded/skipped images
+    """
+    totals = {"patients_inserted": 0, "patients_skipped": 0, "images_uploaded": 0, "images_skipped": 0}
+    # there are only a handful of distinct source images, so keep their bytes around instead of re-reading them
+    source_bytes = {}
+    patients = iter(patients)
+    while batch := list(itertools.islice(patients, batch_size)):
+        patient_docs = [
+            utils.patient_to_document(models.PatientInput.model_validate({**entity_data, "_id": patient_id(entity_data)}))
+            for entity_data in batch
+        ]
+        inserted = await _insert_missing(db_client.patients, patient_docs)
+        totals["patients_inserted"] += inserted
+        totals["patients_skipped"] += len(patient_docs) - inserted
+
+        image_sources = dict(itertools.chain.from_iterable(patient_image_keys(entity_data) for entity_data in batch))
+        if not image_sources:
+            if progress:
+                progress(totals)
+            continue
+        existing_keys = {
+            doc["_id"] async for doc in db_client.images.find({"_id": {"$in": list(image_sources)}}, {"_id": 1})
+        }
+        missing_keys = [img_key for img_key in image_sources if img_key not in existing_keys]
+        image_docs = []
+        for img_key in missing_keys:
+            img_path = IMG_DATASET_DIR/image_sources[img_key]
+            if img_path not in source_bytes:
+                source_bytes[img_path] = img_path.read_bytes()
+            image_docs.append(utils.build_patient_image_document(img_key, size=len(source_bytes[img_path])))
+        await asyncio.gather(*(
+            object_storage.upload_fileobj(io.BytesIO(source_bytes[IMG_DATASET_DIR/image_sources[img_key]]), bucket, img_key)
+            for img_key in missing_keys
+        ))
+        if image_docs:
+            await _insert_missing(db_client.images, image_docs)
+            # patients that existed before this run now have new images, so they need a new revision
+            await db_client.patients.update_many(
+                {"_id": {"$in": list({image_doc["patient_id"] for image_doc in image_docs})}},
+                {"$inc": {"rev": 1}, "$set": {"updated_at": datetime.datetime.now(datetime.timezone.utc)}}
+            )
+        totals["images_uploaded"] += len(missing_keys)
+        totals["images_skipped"] += len(existing_keys)
+        if progress:
+            progress(totals)
+    return totals
+
+
+async def main():
+    # imported here as the generator itself builds upon the fixtures (which load through this module)
+    from .benchmarks import datagen
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, required=True, help="number of synthetic patients to load")
+    parser.add_argument("--images-per-patient", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0, help="the same seed always produces the same patients (and ids)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=None, help="concurrent image uploads (default S3_MAX_POOL_CONNECTIONS)")
+    parser.add_argument("--db", default=os.environ.get("DB_NAME"))
+    parser.add_argument("--bucket", default=os.environ.get("PATIENT_IMG_BUCKET"))
+    args = parser.parse_args()
+
+    db_client, db_handle = await utils.get_mongodb_connection(db_name=args.db)
+    object_storage = storage.create_object_storage(max_concurrency=args.concurrency)
+    start = time.perf_counter()
+    try:
+        await indexes.ensure_indexes(db_handle)
+        totals = await seed_patients(
+            db_handle, object_storage, args.bucket,
+            datagen.generate_patients(args.patients, args.images_per_patient, seed=args.seed),
+            batch_size=args.batch_size,
+            progress=lambda totals: print(json.dumps(totals), file=sys.stderr)
+        )
+    finally:
+        db_client.close()
+        object_storage.close()
+    print(json.dumps({**totals, "elapsed_seconds": round(time.perf_counter() - start, 1)}))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
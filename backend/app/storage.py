@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import os
+import json
+import asyncio
+import functools
+import threading
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from . import metrics
+
+
+DEFAULT_S3_MAX_POOL_CONNECTIONS = 32
+PRESIGNED_URL_EXPIRY_SECONDS = 3600
+# uploads bigger than this are handed out as multipart uploads (s3 requires every part but the last to be >= 5MiB)
+MULTIPART_THRESHOLD = 64 * 1024 * 1024
+MULTIPART_PART_SIZE = 16 * 1024 * 1024
+MAX_MULTIPART_PARTS = 10000
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+class ObjectStorage:
+    """
+    Async facade over the (blocking) boto3 s3 client.
+
+    Every boto3 call is shipped off to a dedicated thread pool (sized to match botocore's http connection pool) so that
+    a slow object storage round trip never stalls the event loop, and an `asyncio.Semaphore` bounds how many calls can
+    be in flight at once so that a burst of requests queues up here rather than inside botocore's connection pool.
+    """
+
+    def __init__(self, s3_client=None, max_concurrency: int = DEFAULT_S3_MAX_POOL_CONNECTIONS, presign_client=None,
+                 client_factory=None, presign_client_factory=None):
+        """
+        Either pass in ready made clients or factories building them, in which case the (surprisingly slow, botocore
+        loads and parses its service models) client construction is deferred to the first call that needs it
+        """
+        self._client = s3_client
+        self._client_factory = client_factory
+        # presigned urls are handed out to clients so they have to be signed for the host those clients can reach,
+        # which is not necessarily the (docker network internal) host we talk to
+        self._presign_client = presign_client
+        self._presign_client_factory = presign_client_factory
+        self._client_lock = threading.Lock()
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="object-storage")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._client_factory()
+        return self._client
+
+    @property
+    def presign_client(self):
+        if self._presign_client is None:
+            if self._presign_client_factory is None:
+                return self.client
+            with self._client_lock:
+                if self._presign_client is None:
+                    self._presign_client = self._presign_client_factory()
+        return self._presign_client
+
+    async def _run(self, fn, *args, **kwargs):
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            with metrics.timed("s3", fn.__name__.lstrip("_")):
+                return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def _call(self, operation: str, *args, **kwargs):
+        """
+        Run the s3 client's `operation` in the thread pool (the client is only looked up, and thus possibly built, in
+        the worker thread so a cold client never stalls the event loop)
+        """
+        def call():
+            return getattr(self.client, operation)(*args, **kwargs)
+        call.__name__ = operation
+        return await self._run(call)
+
+    async def warm_up(self, bucket: str):
+        """
+        Build the clients (off the event loop) and make a first round trip to `bucket`, which also opens up a pooled
+        connection for the requests to come
+        """
+        def head_bucket():
+            # touching the presign client builds it as well
+            self.presign_client
+            return self.client.head_bucket(Bucket=bucket)
+        return await self._run(head_bucket)
+
+    async def ensure_bucket(self, bucket: str, public_read: bool = False):
+        """
+        Create `bucket` unless it exists already, optionally letting anyone download its objects. Otherwise any bucket
+        policy is dropped, so that buckets made public by earlier versions (when the ui linked the images straight out
+        of the bucket) only serve their objects through the api again.
+        """
+        def ensure_bucket():
+            try:
+                self.client.head_bucket(Bucket=bucket)
+            except ClientError as e:
+                if e.response["Error"]["Code"] not in ("404", "NoSuchBucket"):
+                    raise
+                self.client.create_bucket(Bucket=bucket)
+                # wait for the bucket to show up rather than hoping it has after a while
+                self.client.get_waiter("bucket_exists").wait(Bucket=bucket)
+            if public_read:
+                self.client.put_bucket_policy(Bucket=bucket, Policy=json.dumps(public_read_policy(bucket)))
+            else:
+                try:
+                    self.client.delete_bucket_policy(Bucket=bucket)
+                except ClientError as e:
+                    if e.response["Error"]["Code"] != "NoSuchBucketPolicy":
+                        raise
+        return await self._run(ensure_bucket)
+
+    async def upload_fileobj(self, fileobj, bucket: str, key: str, extra_args: dict = None):
+        """
+        Upload a (readable, binary) file like object to `bucket` under `key`
+        """
+        return await self._call("upload_fileobj", fileobj, bucket, key, ExtraArgs=extra_args)
+
+    async def list_objects(self, bucket: str, prefix: str = "") -> list[dict]:
+        """
+        List every object under `prefix`, walking through all the result pages within the worker thread
+        :return: list of s3 object dicts (as returned by boto3 in `Contents`)
+        """
+        def _list_objects():
+            paginator = self.client.get_paginator('list_objects_v2')
+            return [
+                s3_obj
+                for page in paginator.paginate(Bucket=bucket, Prefix=prefix)
+                for s3_obj in page.get('Contents', [])
+            ]
+        return await self._run(_list_objects)
+
+    async def download_bytes(self, bucket: str, key: str) -> bytes:
+        """
+        Fetch a whole object into memory (only meant for objects that are reasonably sized, e.g. to post process them)
+        """
+        def _get_object():
+            return self.client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        return await self._run(_get_object)
+
+    async def open_object(self, bucket: str, key: str, byte_range: str = None, if_none_match: str = None) -> dict:
+        """
+        `get_object` without reading the body, hand the response's `Body` to `iter_chunks` to stream it
+        :param byte_range: http `Range` header value (e.g. `bytes=0-1023`) to only fetch part of the object
+        :param if_none_match: http `If-None-Match` header value, a matching object raises a `ClientError` (code 304)
+        :return: the boto3 `get_object` response
+        """
+        kwargs = {}
+        if byte_range:
+            kwargs["Range"] = byte_range
+        if if_none_match:
+            kwargs["IfNoneMatch"] = if_none_match
+        return await self._call("get_object", Bucket=bucket, Key=key, **kwargs)
+
+    async def iter_chunks(self, body, chunk_size: int = STREAM_CHUNK_SIZE):
+        """
+        Read an object's (boto3 `StreamingBody`) body a chunk at a time, every read happening in the thread pool, so
+        that objects of any size can be passed along without ever holding more than a chunk of them in memory
+        """
+        def read_chunk():
+            return body.read(chunk_size)
+        try:
+            while chunk := await self._run(read_chunk):
+                yield chunk
+        finally:
+            body.close()
+
+    async def head_object(self, bucket: str, key: str) -> dict:
+        return await self._call("head_object", Bucket=bucket, Key=key)
+
+    async def object_exists(self, bucket: str, key: str) -> bool:
+        try:
+            await self.head_object(bucket, key)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("404", "NoSuchKey", "NotFound"):
+                raise
+            return False
+
+    async def copy_object(self, source_bucket: str, source_key: str, bucket: str, key: str, extra_args: dict = None):
+        """
+        Server side copy of an object (as a multipart copy for objects too large for a single `copy_object`), the
+        bytes never pass through us
+        """
+        return await self._call(
+            "copy", {"Bucket": source_bucket, "Key": source_key}, bucket, key, ExtraArgs=extra_args
+        )
+
+    async def delete_object(self, bucket: str, key: str):
+        return await self._call("delete_object", Bucket=bucket, Key=key)
+
+    async def create_multipart_upload(self, bucket: str, key: str, content_type: str = None) -> str:
+        """
+        :return: the upload id of the new multipart upload
+        """
+        extra_args = {"ContentType": content_type} if content_type else {}
+        response = await self._call("create_multipart_upload", Bucket=bucket, Key=key, **extra_args)
+        return response["UploadId"]
+
+    async def complete_multipart_upload(self, bucket: str, key: str, upload_id: str, parts: list[dict]):
+        """
+        :param parts: list of `{"PartNumber": int, "ETag": str}` dicts, one per uploaded part
+        """
+        return await self._call(
+            "complete_multipart_upload",
+            Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": sorted(parts, key=lambda p: p["PartNumber"])}
+        )
+
+    async def abort_multipart_upload(self, bucket: str, key: str, upload_id: str):
+        return await self._call("abort_multipart_upload", Bucket=bucket, Key=key, UploadId=upload_id)
+
+    def presigned_put_url(self, bucket: str, key: str, expires_in: int, content_type: str = None) -> str:
+        """
+        Presigned url with which a client can PUT the object straight into storage (signing is a purely local
+        computation so there is no need to go through the thread pool for it)
+        """
+        params = {"Bucket": bucket, "Key": key}
+        if content_type:
+            params["ContentType"] = content_type
+        return self.presign_client.generate_presigned_url("put_object", Params=params, ExpiresIn=expires_in)
+
+    def presigned_upload_part_url(self, bucket: str, key: str, upload_id: str, part_number: int, expires_in: int) -> str:
+        return self.presign_client.generate_presigned_url(
+            "upload_part",
+            Params={"Bucket": bucket, "Key": key, "UploadId": upload_id, "PartNumber": part_number},
+            ExpiresIn=expires_in
+        )
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_object_storage(max_concurrency: int = None) -> ObjectStorage:
+    """
+    Build an `ObjectStorage` against the configured minio server (the boto3 clients themselves are only built once
+    first needed, see `ObjectStorage.warm_up`).
+
+    The botocore connection pool and the worker thread pool are sized together (via `S3_MAX_POOL_CONNECTIONS` if set)
+    so that no worker thread ever has to wait on a free http connection.
+
+    If `MINIO_PUBLIC_ENDPOINT_URL` is set presigned urls are signed for that endpoint instead of the internal one.
+    """
+    max_concurrency = max_concurrency or int(os.environ.get("S3_MAX_POOL_CONNECTIONS", DEFAULT_S3_MAX_POOL_CONNECTIONS))
+    endpoint_url = f"http://{os.environ['MINIO_SERVER_HOST']}:9000"
+    presign_client_factory = None
+    if os.environ.get("MINIO_PUBLIC_ENDPOINT_URL"):
+        # e.g. http://localhost:9000 for the docker compose setup, where `minio` only resolves within the docker network
+        presign_client_factory = functools.partial(_create_s3_client, os.environ["MINIO_PUBLIC_ENDPOINT_URL"], max_concurrency)
+    return ObjectStorage(
+        max_concurrency=max_concurrency,
+        client_factory=functools.partial(_create_s3_client, endpoint_url, max_concurrency),
+        presign_client_factory=presign_client_factory
+    )
+
+
+def public_read_policy(bucket: str) -> dict:
+    """
+    Bucket policy allowing anonymous downloads (the equivalent of `mc anonymous set download`)
+    """
+    return {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Principal": {"AWS": ["*"]},
+                "Action": ["s3:GetBucketLocation", "s3:ListBucket"],
+                "Resource": [f"arn:aws:s3:::{bucket}"]
+            },
+            {
+                "Effect": "Allow",
+                "Principal": {"AWS": ["*"]},
+                "Action": ["s3:GetObject"],
+                "Resource": [f"arn:aws:s3:::{bucket}/*"]
+            }
+        ]
+    }
+
+
+def _create_s3_client(endpoint_url: str, max_concurrency: int):
+    # clients are built from a session of their own as the default boto3 session is not thread safe
+    return boto3.session.Session().client(
+        's3',
+        endpoint_url=endpoint_url,
+        aws_access_key_id=os.environ["MINIO_SERVER_ACCESS_KEY"],
+        aws_secret_access_key=os.environ["MINIO_SERVER_SECRET_KEY"],
+        region_name=os.environ.get("MINIO_REGION", "us-east-1"),
+        config=Config(max_pool_connections=max_concurrency, signature_version="s3v4")
+    )
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import io
+import math
+import asyncio
+import pytest
+from httpx import AsyncClient, ASGITransport
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+from .. import fixtures, admission
+from ..main import app
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+class FakeRedis:
+    """
+    Local stand-in for a `redis.asyncio` client (only what the admission backend uses)
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expiries = {}
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        """
+        Run the python equivalent of the backend's lua token bucket script
+        """
+        assert script == admission.RedisBackend.TAKE_SCRIPT
+        keys, (now, *rates_and_bursts) = keys_and_args[:numkeys], keys_and_args[numkeys:]
+        buckets = list(zip(keys, rates_and_bursts[::2], rates_and_bursts[1::2]))
+        refilled, retry_afters = [], []
+        for key, rate, burst in buckets:
+            tokens, updated_at = self.data.get(key, (burst, now))
+            refilled.append(min(burst, tokens + max(0, now - updated_at) * rate))
+            retry_afters.append(0.0 if refilled[-1] >= 1 else (1 - refilled[-1]) / rate)
+        for tokens, (key, rate, burst) in zip(refilled, buckets):
+            self.data[key] = (tokens - 1 if not any(retry_afters) else tokens, now)
+            self.expiries[key] = math.ceil(burst / rate) + 1
+        return [repr(retry_after).encode() for retry_after in retry_afters]
+
+    async def aclose(self):
+        pass
+
+
+class FakeSlowBackend:
+    """
+    Token buckets that always have a token, but take a round trip (like redis) to say so
+    """
+
+    async def take_all(self, buckets):
+        await asyncio.sleep(0.01)
+        return [0.0 for _ in buckets]
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAdmission:
+
+    @pytest.mark.parametrize(
+        'method, path, expected_class',
+        [
+            ("PUT", "/patients/5936a0f3-a854-4c49-bc96-3e1177d6a456", "upload"),
+            ("POST", "/patients/5936a0f3-a854-4c49-bc96-3e1177d6a456/images/uploads/complete", "upload"),
+            ("POST", "/patients/bulk", "bulk"),
+            ("GET", "/patients/export", "export"),
+            ("GET", "/patients/", "list"),
+            ("GET", "/patients/5936a0f3-a854-4c49-bc96-3e1177d6a456", "default"),
+            ("GET", "/images/patient-images/blobs/0123.jpg", "image"),
+            ("GET", "/health/ready", None),
+        ],
+        ids=[
+            "Admission: image upload",
+            "Admission: presigned upload completion",
+            "Admission: bulk create",
+            "Admission: export",
+            "Admission: patient list",
+            "Admission: patient detail",
+            "Admission: image download",
+            "Admission: probes are exempt",
+        ]
+    )
+    async def test_route_classes(self, method, path, expected_class):
+        assert admission.route_class(method, path) == expected_class
+
+    async def test_memory_backend_token_bucket(self):
+        clock = FakeClock()
+        backend = admission.MemoryBackend(clock=clock)
+        assert [await backend.take("key", rate=2, burst=2) for _ in range(2)] == [0, 0]
+        # the bucket is empty, the next token trickles in after half a second
+        assert await backend.take("key", rate=2, burst=2) == pytest.approx(0.5)
+
+        clock.now = 0.5
+        assert await backend.take("key", rate=2, burst=2) == 0
+        # refills never overflow the burst
+        clock.now = 100
+        assert [await backend.take("key", rate=2, burst=2) for _ in range(3)][-1] > 0
+
+    async def test_redis_backend_shared_between_workers(self):
+        """
+        Test that workers sharing a redis backend draw from the same buckets
+        """
+        clock, redis_client = FakeClock(), FakeRedis()
+        workers = [admission.RedisBackend(redis_client, clock=clock) for _ in range(2)]
+        assert await workers[0].take("key", rate=1, burst=2) == 0
+        assert await workers[1].take("key", rate=1, burst=2) == 0
+        assert await workers[0].take("key", rate=1, burst=2) == pytest.approx(1)
+        assert set(redis_client.expiries.values()) == {3}
+
+        # the bucket refills continuously (no fresh burst at a window edge)
+        clock.now = 1
+        assert await workers[1].take("key", rate=1, burst=2) == 0
+        assert await workers[0].take("key", rate=1, burst=2) == pytest.approx(1)
+
+    @pytest.mark.parametrize(
+        'backend_factory',
+        [lambda clock: admission.MemoryBackend(clock=clock), lambda clock: admission.RedisBackend(FakeRedis(), clock=clock)],
+        ids=["Admission: memory backend", "Admission: redis backend"]
+    )
+    async def test_shed_requests_cost_no_tokens(self, backend_factory):
+        """
+        Test that a request shed by the route bucket leaves the client bucket be (and the other way around)
+        """
+        backend = backend_factory(FakeClock())
+        client_bucket, route_bucket = ("client", 1, 2), ("route", 1, 1)
+        assert await backend.take_all([client_bucket, route_bucket]) == [0, 0]
+        assert await backend.take_all([client_bucket, route_bucket]) == [0, pytest.approx(1)]
+        assert await backend.take_all([client_bucket, route_bucket]) == [0, pytest.approx(1)]
+        # the client's second token is still there
+        assert await backend.take("client", 1, 2) == 0
+        assert await backend.take("client", 1, 2) == pytest.approx(1)
+
+    async def test_rate_limited_uploads_get_429(self, client):
+        """
+        Test that a client exceeding the upload rate is shed with a `Retry-After` while the detail view keeps working
+        """
+        app.admission = admission.AdmissionController(
+            admission.MemoryBackend(), limits={"upload": admission.RouteLimits(client_rate=0.1, client_burst=2)}
+        )
+        patient_id = fixtures.FIXTURE_DATA[0]["id"]
+
+        statuses = []
+        for index in range(3):
+            response = await client.put(
+                f'/patients/{patient_id}',
+                files={'uploaded_img_file': ('scan.jpg', io.BytesIO(b"not really a jpeg"), 'image/jpeg')},
+                data={'img_timestamp': f"2023-01-0{index + 1}T10:00:00.000000Z"}
+            )
+            statuses.append(response.status_code)
+        assert statuses == [200, 200, 429]
+        assert response.headers["Retry-After"] == "10"
+
+        assert (await client.get(f'/patients/{patient_id}')).status_code == 200
+        stats = (await client.get('/admission/stats')).json()
+        assert stats["rejected"] == {"upload:client_rate": 1}
+        assert stats["in_flight"]["upload"] == 0
+
+    async def test_clients_have_separate_buckets(self, client):
+        app.admission = admission.AdmissionController(
+            admission.MemoryBackend(), limits={"list": admission.RouteLimits(client_rate=0.1, client_burst=1)},
+            client_header="X-Client-ID"
+        )
+        assert (await client.get('/patients/', headers={"X-Client-ID": "ward-a"})).status_code == 200
+        assert (await client.get('/patients/', headers={"X-Client-ID": "ward-a"})).status_code == 429
+        assert (await client.get('/patients/', headers={"X-Client-ID": "ward-b"})).status_code == 200
+
+    async def test_clients_behind_the_proxy_have_separate_buckets(self, client):
+        """
+        Test that clients are told apart by the address nginx forwards rather than all sharing nginx' address, and that
+        forwarded addresses are only taken from the trusted proxy
+        """
+        app.admission = admission.AdmissionController(
+            admission.MemoryBackend(), limits={"list": admission.RouteLimits(client_rate=0.1, client_burst=1)}
+        )
+        # what the uvicorn workers put in front of the app (see `gunicorn_conf.py`), with nginx at 127.0.0.1
+        proxied_app = ProxyHeadersMiddleware(app, trusted_hosts="127.0.0.1")
+
+        transport = ASGITransport(app=proxied_app, client=("127.0.0.1", 123))
+        async with AsyncClient(transport=transport, base_url="http://test", follow_redirects=True) as nginx:
+            assert (await nginx.get('/patients/', headers={"X-Forwarded-For": "10.0.0.1"})).status_code == 200
+            assert (await nginx.get('/patients/', headers={"X-Forwarded-For": "10.0.0.1"})).status_code == 429
+            assert (await nginx.get('/patients/', headers={"X-Forwarded-For": "10.0.0.2"})).status_code == 200
+            # an address the client made up itself comes before the one nginx appends, and is ignored
+            response = await nginx.get('/patients/', headers={"X-Forwarded-For": "10.9.9.9, 10.0.0.1"})
+            assert response.status_code == 429
+
+        transport = ASGITransport(app=proxied_app, client=("10.0.0.3", 123))
+        async with AsyncClient(transport=transport, base_url="http://test", follow_redirects=True) as untrusted:
+            assert (await untrusted.get('/patients/', headers={"X-Forwarded-For": "10.0.0.4"})).status_code == 200
+            assert (await untrusted.get('/patients/', headers={"X-Forwarded-For": "10.0.0.5"})).status_code == 429
+
+    async def test_route_bucket_shared_by_clients(self, client):
+        app.admission = admission.AdmissionController(
+            admission.MemoryBackend(), limits={"list": admission.RouteLimits(route_rate=0.1, route_burst=1)},
+            client_header="X-Client-ID"
+        )
+        assert (await client.get('/patients/', headers={"X-Client-ID": "ward-a"})).status_code == 200
+        response = await client.get('/patients/', headers={"X-Client-ID": "ward-b"})
+        assert response.status_code == 429
+        assert "route_rate" in response.json()["detail"]
+
+    async def test_concurrency_cap(self, client):
+        """
+        Test that heavy routes are shed once their concurrency cap is reached (rather than queued)
+        """
+        app.admission = admission.AdmissionController(
+            admission.MemoryBackend(), limits={"export": admission.RouteLimits(max_concurrency=1)}
+        )
+        # pretend an export is already running
+        app.admission.in_flight["export"] = 1
+        response = await client.get('/patients/export')
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+
+        app.admission.in_flight["export"] = 0
+        assert (await client.get('/patients/export')).status_code == 200
+        assert app.admission.in_flight["export"] == 0
+
+    async def test_concurrency_cap_holds_for_simultaneous_requests(self):
+        """
+        Test that requests arriving while others still wait on their token buckets do not get past the concurrency cap
+        """
+        controller = admission.AdmissionController(
+            FakeSlowBackend(), limits={"export": admission.RouteLimits(client_rate=10, max_concurrency=1)}
+        )
+        results = await asyncio.gather(*(controller.admit("export", "ward-a") for _ in range(5)), return_exceptions=True)
+
+        assert sum(result is None for result in results) == 1
+        assert all(isinstance(result, admission.Rejected) for result in results if result is not None)
+        assert controller.in_flight["export"] == 1
+        assert controller.rejected[("export", "concurrency")] == 4
+
+    async def test_limits_overrides(self):
+        limits = admission.load_limits('{"upload": {"client_rate": 2, "max_concurrency": 8}, "batch": {"client_rate": 1}}')
+        assert limits["upload"].as_dict() == {
+            "client_rate": 2, "client_burst": 2, "route_rate": 50, "route_burst": 100, "max_concurrency": 8
+        }
+        assert limits["batch"].client_burst == 1
+
+        with pytest.raises(SystemError):
+            admission.load_limits('{"upload": {"unknown": 1}}')
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import io
+import uuid
+import datetime
+import email.utils
+import pytest
+from .. import fixtures, utils
+from ..main import app
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+class TestConditionalRequests:
+
+    async def test_patient_detail_not_modified(self, client, monkeypatch):
+        """
+        Test that revalidating an unchanged patient gets a 304 without the patient record being assembled
+        """
+        patient_id = fixtures.FIXTURE_DATA[0]["id"]
+        response = await client.get(f'/patients/{patient_id}')
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        # a second past `Last-Modified`, which is truncated to the second
+        later = email.utils.parsedate_to_datetime(response.headers["last-modified"]) + datetime.timedelta(seconds=1)
+
+        async def fail_get_patient_entity(*args, **kwargs):
+            raise AssertionError("the full patient record should not be needed to answer a conditional request")
+
+        monkeypatch.setattr(utils, "get_patient_entity", fail_get_patient_entity)
+
+        for headers in [{"If-None-Match": etag}, {"If-None-Match": f'"stale", W/{etag}'}, {"If-Modified-Since": email.utils.format_datetime(later, usegmt=True)}]:
+            response = await client.get(f'/patients/{patient_id}', headers=headers)
+            assert response.status_code == 304
+            assert response.content == b""
+            assert response.headers["etag"] == etag
+
+    async def test_patient_detail_modified(self, client):
+        """
+        Test that an image upload changes the patient's ETag so that revalidating clients get the new record
+        """
+        patient_id = fixtures.FIXTURE_DATA[0]["id"]
+        response = await client.get(f'/patients/{patient_id}')
+        etag = response.headers["etag"]
+
+        response = await client.put(
+            f'/patients/{patient_id}',
+            files={'uploaded_img_file': ('scan.jpg', io.BytesIO(b"not really a jpeg"), 'image/jpeg')}
+        )
+        assert response.status_code == 200
+
+        response = await client.get(f'/patients/{patient_id}', headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert len(response.json()["images"]) == len(fixtures.FIXTURE_DATA[0]["images_lst"]) + 1
+
+    async def test_patient_modified_within_the_same_second(self, client):
+        """
+        Test that a patient written to twice within one second isn't revalidated by the `Last-Modified` of the first
+        write
+        """
+        patient_id = fixtures.FIXTURE_DATA[0]["id"]
+        written_at = datetime.datetime(2026, 10, 17, 10, 0, 0, 200000, tzinfo=datetime.timezone.utc)
+        await app.mongodb.patients.update_one({"_id": uuid.UUID(patient_id)}, {"$set": {"updated_at": written_at}})
+        last_modified = (await client.get(f'/patients/{patient_id}')).headers["last-modified"]
+        assert last_modified == "Sat, 17 Oct 2026 10:00:00 GMT"
+
+        await app.mongodb.patients.update_one(
+            {"_id": uuid.UUID(patient_id)},
+            {"$inc": {"rev": 1}, "$set": {"updated_at": written_at + datetime.timedelta(milliseconds=500)}}
+        )
+        response = await client.get(f'/patients/{patient_id}', headers={"If-Modified-Since": last_modified})
+        assert response.status_code == 200
+        assert response.headers["last-modified"] == last_modified
+
+    async def test_patient_list_etag(self, client):
+        """
+        Test that an unchanged list page revalidates to a 304 and that a new patient on the page changes its ETag
+        """
+        response = await client.get('/patients')
+        etag = response.headers["etag"]
+
+        response = await client.get('/patients', headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
+        response = await client.post('/patients', json={"first_name": "Ada", "last_name": "Lovelace", "date_of_birth": "1815-12-10"})
+        assert response.status_code == 201
+
+        response = await client.get('/patients', headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert len(response.json()["patients"]) == len(fixtures.FIXTURE_DATA) + 1
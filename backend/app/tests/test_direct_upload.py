@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import httpx
+import pytest
+from .. import fixtures
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+IMG_BYTES = b"not really a jpeg"
+
+
+class TestDirectUpload:
+
+    async def test_single_part_direct_upload(self, client):
+        """
+        Test the presigned PUT flow, the api only ever sees the initiation and completion calls
+        """
+        patient_id = fixtures.FIXTURE_DATA[2]["id"]
+        response = await client.post(f'/patients/{patient_id}/images/uploads', json={
+            "filename": "scan.jpg", "content_type": "image/jpeg", "size": len(IMG_BYTES),
+            "img_timestamp": "2023-05-01T08:30:00Z"
+        })
+        assert response.status_code == 201
+        ticket = response.json()
+        assert ticket["img_key"] == f"{patient_id}/2023-05-01T08:30:00.000000Z.jpg"
+        assert ticket["upload_id"] is None
+
+        async with httpx.AsyncClient() as storage_client:
+            upload_response = await storage_client.put(ticket["url"], content=IMG_BYTES, headers={"Content-Type": "image/jpeg"})
+            assert upload_response.status_code == 200
+
+        response = await client.post(f'/patients/{patient_id}/images/uploads/complete', json={"img_key": ticket["img_key"]})
+        assert response.status_code == 200
+        assert response.json()["images"][0]["img_uri"].endswith(ticket["img_key"])
+
+    async def test_multipart_direct_upload(self, client):
+        """
+        Test the presigned multipart flow
+        """
+        patient_id = fixtures.FIXTURE_DATA[2]["id"]
+        response = await client.post(f'/patients/{patient_id}/images/uploads', json={
+            "filename": "scan.jpg", "size": len(IMG_BYTES), "multipart": True
+        })
+        assert response.status_code == 201
+        ticket = response.json()
+        assert ticket["upload_id"]
+        assert [part["part_number"] for part in ticket["parts"]] == [1]
+
+        async with httpx.AsyncClient() as storage_client:
+            upload_response = await storage_client.put(ticket["parts"][0]["url"], content=IMG_BYTES)
+            assert upload_response.status_code == 200
+            etag = upload_response.headers["etag"]
+
+        response = await client.post(f'/patients/{patient_id}/images/uploads/complete', json={
+            "img_key": ticket["img_key"], "upload_id": ticket["upload_id"], "parts": [{"part_number": 1, "etag": etag}]
+        })
+        assert response.status_code == 200
+        assert response.json()["images"][0]["img_uri"].endswith(ticket["img_key"])
+
+    @pytest.mark.parametrize(
+        'img_key_template,status_code',
+        [
+            ("{patient_id}/2023-05-01T08:30:00.000000Z.jpg", 404),
+            ("{other_patient_id}/2023-05-01T08:30:00.000000Z.jpg", 422),
+        ],
+        ids=[
+            "POST Upload Complete: nothing was uploaded",
+            "POST Upload Complete: key of another patient",
+        ]
+    )
+    async def test_complete_invalid_upload(self, img_key_template, status_code, client):
+        """
+        Test that completing an upload which never happened (or which is not this patient's) is rejected
+        """
+        patient_id = fixtures.FIXTURE_DATA[2]["id"]
+        img_key = img_key_template.format(patient_id=patient_id, other_patient_id=fixtures.FIXTURE_DATA[0]["id"])
+        response = await client.post(f'/patients/{patient_id}/images/uploads/complete', json={"img_key": img_key})
+        assert response.status_code == status_code
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import io
+import uuid
+import asyncio
+import datetime
+import pytest
+from pymongo.errors import OperationFailure
+from .. import fixtures, events
+from ..main import app, event_stream
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+PATIENT_ID = uuid.UUID(fixtures.FIXTURE_DATA[0]["id"])
+OTHER_PATIENT_ID = uuid.UUID(fixtures.FIXTURE_DATA[1]["id"])
+THIRD_PATIENT_ID = uuid.UUID(fixtures.FIXTURE_DATA[2]["id"])
+IMG_KEY = f"{PATIENT_ID}/2023-01-01T10:00:00.000000Z.jpg"
+
+
+def patient_change(operation_type, patient_id=PATIENT_ID):
+    change = {"operationType": operation_type, "ns": {"db": "test", "coll": "patients"}, "documentKey": {"_id": patient_id}}
+    if operation_type != "delete":
+        change["fullDocument"] = {
+            "_id": patient_id, "first_name": "Jim", "last_name": "Jones", "date_of_birth": datetime.datetime(1950, 1, 1),
+            "rev": 2, "updated_at": datetime.datetime(2024, 1, 1)
+        }
+    return change
+
+
+def image_change(operation_type):
+    change = {"operationType": operation_type, "ns": {"db": "test", "coll": "images"}, "documentKey": {"_id": IMG_KEY}}
+    if operation_type != "delete":
+        change["fullDocument"] = {"_id": IMG_KEY, "patient_id": PATIENT_ID, "img_timestamp": datetime.datetime(2023, 1, 1, 10)}
+    return change
+
+
+class FakeChangeStream:
+    """
+    Local stand-in for a motor change stream, yields the given changes and then waits for more like the real one
+    """
+
+    def __init__(self, changes):
+        self.changes = changes
+        self.resume_token = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.changes:
+            await asyncio.Event().wait()
+        self.resume_token = {"_data": len(self.changes)}
+        return self.changes.pop(0)
+
+
+class FakeDatabase:
+
+    def __init__(self, changes):
+        self.changes = changes
+
+    def watch(self, pipeline, **kwargs):
+        return FakeChangeStream(self.changes)
+
+
+class FakeStandaloneDatabase:
+    """
+    Local stand-in for a database on a standalone mongo (no change streams, so the feed polls its patients)
+    """
+
+    def __init__(self, db_client):
+        self.patients = db_client.patients
+
+    def watch(self, pipeline, **kwargs):
+        raise OperationFailure(
+            "The $changeStream stage is only supported on replica sets", code=events.CHANGE_STREAMS_UNSUPPORTED
+        )
+
+
+async def touch_patient(patient_id, updated_at):
+    await app.mongodb.patients.update_one({"_id": patient_id}, {"$inc": {"rev": 1}, "$set": {"updated_at": updated_at}})
+
+
+async def next_event(subscription, event_type, timeout=5):
+    while (event := await asyncio.wait_for(subscription.get(), timeout))["type"] != event_type:
+        pass
+    return event
+
+
+class TestEvents:
+
+    @pytest.mark.parametrize(
+        'change, expected',
+        [
+            (patient_change("insert"), {"type": "patient", "data": {
+                "id": PATIENT_ID, "first_name": "Jim", "last_name": "Jones", "date_of_birth": datetime.date(1950, 1, 1),
+                "rev": 2, "updated_at": datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+            }}),
+            (patient_change("delete"), {"type": "patient", "data": {"id": PATIENT_ID, "deleted": True}}),
+            (image_change("replace"), {"type": "image", "data": {
+                "patient_id": PATIENT_ID, "img_key": IMG_KEY, "image": {
+                    "img_uri": f"patient-images/{IMG_KEY}",
+                    "img_timestamp": datetime.datetime(2023, 1, 1, 10, tzinfo=datetime.timezone.utc),
+                    "thumbnail_uri": None,
+                    "preview_uri": None,
+                    "archived": False
+                }
+            }}),
+            (image_change("delete"), {"type": "image", "data": {"patient_id": PATIENT_ID, "img_key": IMG_KEY, "deleted": True}}),
+        ],
+        ids=[
+            "Events: patient written",
+            "Events: patient deleted",
+            "Events: image written",
+            "Events: image deleted",
+        ]
+    )
+    async def test_change_to_event(self, change, expected, monkeypatch):
+        monkeypatch.setenv("PATIENT_IMG_BUCKET", "patient-images")
+        assert events.change_to_event(change) == expected
+
+    async def test_fan_out_from_a_single_stream(self):
+        """
+        Test that every subscriber gets the changes of a single watcher, filtered down to its patient if it asked for one
+        """
+        feed = events.EventFeed(FakeDatabase([patient_change("update", OTHER_PATIENT_ID), image_change("insert")]))
+        everything, one_patient = feed.subscribe(), feed.subscribe(patient_id=PATIENT_ID)
+        try:
+            assert (await next_event(everything, "hello"))["data"] == {"mode": "change_stream"}
+            assert (await next_event(everything, "patient"))["data"]["id"] == OTHER_PATIENT_ID
+            assert (await next_event(everything, "image"))["data"]["img_key"] == IMG_KEY
+
+            assert (await next_event(one_patient, "hello"))["data"] == {"mode": "change_stream"}
+            assert (await next_event(one_patient, "image"))["data"]["img_key"] == IMG_KEY
+            assert one_patient.queue.empty()
+        finally:
+            await feed.close()
+
+        one_patient.close()
+        assert feed.stats()["subscribers"] == 1
+
+    async def test_watcher_stops_with_the_last_subscriber(self):
+        feed = events.EventFeed(FakeDatabase([patient_change("update")]))
+        first, second = feed.subscribe(), feed.subscribe()
+        assert (await next_event(first, "patient"))["data"]["id"] == PATIENT_ID
+
+        first.close()
+        assert feed.stats()["watching"]
+        second.close()
+        assert not feed.stats()["watching"]
+
+        # and starts over with the next one
+        subscription = feed.subscribe()
+        try:
+            assert (await next_event(subscription, "hello"))["data"] == {"mode": "change_stream"}
+            assert feed.stats()["watching"]
+        finally:
+            await feed.close()
+
+    async def test_polling_catches_late_commits(self, client):
+        """
+        Test that polling publishes a write that committed after changes with a later `updated_at` were already polled,
+        and every change only once
+        """
+        feed = events.EventFeed(FakeStandaloneDatabase(app.mongodb), poll_interval_seconds=0.02)
+        subscription = feed.subscribe()
+        try:
+            assert (await next_event(subscription, "hello"))["data"] == {"mode": "polling"}
+            now = datetime.datetime.now(datetime.timezone.utc)
+            await touch_patient(PATIENT_ID, now + datetime.timedelta(seconds=1))
+            assert (await next_event(subscription, "patient"))["data"]["id"] == PATIENT_ID
+
+            # stamped before the write above, but only committed now
+            await touch_patient(OTHER_PATIENT_ID, now)
+            assert (await next_event(subscription, "patient"))["data"]["id"] == OTHER_PATIENT_ID
+
+            # a few more polls over the same window
+            await asyncio.sleep(0.1)
+            assert subscription.queue.empty()
+        finally:
+            await feed.close()
+
+    async def test_polling_pages_through_changes_sharing_a_timestamp(self, client, monkeypatch):
+        monkeypatch.setattr(events, "POLL_BATCH_SIZE", 2)
+        feed = events.EventFeed(FakeStandaloneDatabase(app.mongodb), poll_interval_seconds=0.02)
+        subscription = feed.subscribe()
+        try:
+            await next_event(subscription, "hello")
+            updated_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=1)
+            for patient_id in (PATIENT_ID, OTHER_PATIENT_ID, THIRD_PATIENT_ID):
+                await touch_patient(patient_id, updated_at)
+
+            received = {(await next_event(subscription, "patient"))["data"]["id"] for _ in range(3)}
+            assert received == {PATIENT_ID, OTHER_PATIENT_ID, THIRD_PATIENT_ID}
+        finally:
+            await feed.close()
+
+    async def test_slow_subscriber_gets_resync(self):
+        feed = events.EventFeed(FakeDatabase([]), queue_size=2)
+        subscription = feed.subscribe()
+        for _ in range(3):
+            feed.publish({"type": "patient", "data": {"id": PATIENT_ID}})
+        await feed.close()
+
+        assert (await subscription.get())["type"] == "resync"
+        assert subscription.queue.empty()
+
+    async def test_sse_encoding_and_heartbeat(self):
+        feed = events.EventFeed(FakeDatabase([]))
+        subscription = feed.subscribe()
+        stream = events.sse_stream(subscription, heartbeat_seconds=0.01)
+        try:
+            assert await anext(stream) == b'event: hello\ndata: {"mode":"change_stream"}\n\n'
+            assert await anext(stream) == b": keep-alive\n\n"
+        finally:
+            await stream.aclose()
+            await feed.close()
+        # closing the stream (i.e. the client going away) unsubscribes
+        assert feed.stats()["subscribers"] == 0
+
+    async def test_feed_reports_writes(self, client):
+        """
+        Test that an upload through the api shows up on the feed (via change streams or, on a standalone mongo, polling)
+        """
+        app.events = events.EventFeed(app.mongodb, poll_interval_seconds=0.05)
+        subscription = app.events.subscribe(patient_id=PATIENT_ID)
+        mode = (await next_event(subscription, "hello"))["data"]["mode"]
+        response = await client.put(
+            f'/patients/{PATIENT_ID}',
+            files={'uploaded_img_file': ('scan.jpg', io.BytesIO(b"not really a jpeg"), 'image/jpeg')},
+            data={'img_timestamp': "2023-01-01T10:00:00.000000Z"}
+        )
+        assert response.status_code == 200
+
+        # the image and the patient's revision bump are separate writes, so collect both in whatever order they come
+        expected_types = {"patient", "image"} if mode == "change_stream" else {"patient"}
+        received = {}
+        while not expected_types <= received.keys():
+            event = await asyncio.wait_for(subscription.get(), 5)
+            received[event["type"]] = event["data"]
+        subscription.close()
+        assert received["patient"]["id"] == PATIENT_ID
+        assert received["patient"]["rev"] > 1
+        if mode == "change_stream":
+            assert received["image"]["img_key"] == IMG_KEY
+
+    async def test_event_stream_endpoint(self, client):
+        """
+        Test the endpoint's response (called directly, the in process test client would wait for the never ending
+        stream to finish), only its first event is read
+        """
+        app.events = events.EventFeed(FakeDatabase([]))
+        response = await event_stream(patient_id=PATIENT_ID)
+        assert response.media_type == "text/event-stream"
+        assert response.headers["X-Accel-Buffering"] == "no"
+        try:
+            assert (await anext(response.body_iterator)).startswith(b"event: hello\n")
+        finally:
+            await response.body_iterator.aclose()
+        assert app.events.stats()["subscribers"] == 0
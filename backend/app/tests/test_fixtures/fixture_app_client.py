@@ -11,7 +11,9 @@ from ...main import app
 
 @pytest.mark.usefixtures("s3_client")
 @pytest_asyncio.fixture(scope="function", autouse=True)
-async def client():
+async def client(monkeypatch):
+    # every test starts out with freshly dropped collections so the app has to (re)create the fixtures on startup
+    monkeypatch.setenv("BOOTSTRAP_ON_STARTUP", "true")
     async with LifespanManager(app):
         async with AsyncClient(app=app, base_url="http://test", follow_redirects=True) as ac:
             yield ac
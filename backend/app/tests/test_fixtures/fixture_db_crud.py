@@ -18,6 +18,8 @@ async def basic_crud():
     os.environ["DB_NAME"] = os.environ.get("TEST_DB_NAME")
     db_client, db_handle = await utils.get_mongodb_connection(db_name=os.environ['TEST_DB_NAME'])
     await db_handle.drop_collection("patients")
+    await db_handle.drop_collection("images")
+    await db_handle.drop_collection("blobs")
 
     await db_handle.create_collection("patients", capped=False)
 
@@ -26,5 +28,7 @@ async def basic_crud():
 
     # for teardown restore the env var for the db name as well as shutdown the db client connection
     await db_handle.drop_collection("patients")
+    await db_handle.drop_collection("images")
+    await db_handle.drop_collection("blobs")
     db_client.close()
     os.environ["DB_NAME"] = orig_db_name
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import os
+import json
+import uuid
+import pytest
+from botocore.exceptions import ClientError
+from .. import health, storage
+from ..main import app
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+class FlakyStorage:
+    """
+    Object storage stand in that fails its first `failures` warm up attempts
+    """
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.attempts = 0
+
+    async def warm_up(self, bucket: str):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ConnectionError("object storage is not up yet")
+
+
+class TestHealth:
+
+    async def test_liveness(self, client):
+        response = await client.get('/health/live')
+        assert response.status_code == 200
+
+    async def test_readiness(self, client, monkeypatch):
+        """
+        Test that the readiness probe reports 503 until the connections are warm and 200 after
+        """
+        monkeypatch.setattr(app, "readiness", health.Readiness())
+        response = await client.get('/health/ready')
+        assert response.status_code == 503
+        assert response.json()["checks"] == {"mongo": False, "object_storage": False}
+
+        await app.readiness.warm_up(app.mongodb, app.storage, os.environ["PATIENT_IMG_BUCKET"])
+        response = await client.get('/health/ready')
+        assert response.status_code == 200
+        assert response.json()["ready"] is True
+
+    async def test_warm_up_retries(self, client, monkeypatch):
+        """
+        Test that warming up keeps retrying whichever connection is not up yet
+        """
+        monkeypatch.setattr(health, "WARM_UP_INITIAL_BACKOFF_SECONDS", 0)
+        object_storage = FlakyStorage(failures=2)
+        readiness = health.Readiness()
+
+        await readiness.warm_up(app.mongodb, object_storage, "any-bucket")
+
+        assert readiness.ready
+        assert object_storage.attempts == 3
+        assert readiness.status()["warm_after_seconds"] is not None
+
+    async def test_ensure_bucket(self, client, s3_client):
+        """
+        Test that missing buckets are created (publicly downloadable if asked for) and existing ones are left be, but
+        for their policy
+        """
+        boto_client, _ = s3_client
+        bucket = f"bootstrap-test-{uuid.uuid4().hex[:8]}"
+        try:
+            await app.storage.ensure_bucket(bucket, public_read=True)
+            await app.storage.ensure_bucket(bucket, public_read=True)
+
+            boto_client.head_bucket(Bucket=bucket)
+            policy = json.loads(boto_client.get_bucket_policy(Bucket=bucket)["Policy"])
+            assert policy == storage.public_read_policy(bucket)
+
+            await app.storage.ensure_bucket(bucket)
+            with pytest.raises(ClientError):
+                boto_client.get_bucket_policy(Bucket=bucket)
+        finally:
+            boto_client.delete_bucket(Bucket=bucket)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import io
+import os
+import asyncio
+import uuid
+import hashlib
+import datetime
+import pytest
+import pytest_asyncio
+from botocore.exceptions import ClientError
+from .. import fixtures, archive, blobs, image_proxy, utils
+from ..main import app
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+ARCHIVE_BUCKET = "test-patient-images-archive"
+# every fixture image was taken before this
+CUTOFF = datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+IMAGE_BYTES = b"an old scan" * 100
+
+
+@pytest_asyncio.fixture(scope="function")
+async def archive_bucket(client, s3_client, monkeypatch):
+    """
+    A clean cold bucket, with the app's image endpoint falling back to it like it does once `ARCHIVE_IMG_BUCKET` is set
+    """
+    monkeypatch.setenv("ARCHIVE_IMG_BUCKET", ARCHIVE_BUCKET)
+    await app.storage.ensure_bucket(ARCHIVE_BUCKET)
+    for s3_object in await app.storage.list_objects(ARCHIVE_BUCKET):
+        await app.storage.delete_object(ARCHIVE_BUCKET, s3_object["Key"])
+    app.image_proxy = image_proxy.ImageProxy(app.storage, fallback_bucket=ARCHIVE_BUCKET)
+    return ARCHIVE_BUCKET
+
+
+async def archive_old_images():
+    return await archive.archive_images(
+        app.mongodb, app.storage, os.environ["PATIENT_IMG_BUCKET"], ARCHIVE_BUCKET, CUTOFF,
+        # like the app's worker does
+        on_update=lambda img_key: app.patient_cache.invalidate(str(utils.parse_image_key(img_key)[0]))
+    )
+
+
+async def upload(client, patient_id, img_bytes, img_timestamp):
+    response = await client.put(
+        f'/patients/{patient_id}',
+        files={'uploaded_img_file': ('scan.jpg', io.BytesIO(img_bytes), 'image/jpeg')},
+        data={'img_timestamp': img_timestamp}
+    )
+    assert response.status_code == 200
+    return response
+
+
+async def object_exists(bucket, key) -> bool:
+    try:
+        await app.storage.head_object(bucket, key)
+        return True
+    except ClientError:
+        return False
+
+
+class TestImageArchive:
+
+    async def test_archive_old_images(self, client, archive_bucket):
+        """
+        Test that old images move to the cold bucket and drop out of the default detail view
+        """
+        entity_data = fixtures.FIXTURE_DATA[0]
+        await upload(client, entity_data["id"], IMAGE_BYTES, "2023-01-01T10:00:00.000000Z")
+        old_images = fixtures.fixture_images(entity_data)
+
+        result = await archive_old_images()
+
+        assert result == {"archived": sum(len(fixtures.fixture_images(data)) for data in fixtures.FIXTURE_DATA), "failed": 0}
+        for img_obj in old_images:
+            key = img_obj["img_uri"].split("/", 1)[1]
+            assert not await object_exists(os.environ["PATIENT_IMG_BUCKET"], key)
+            assert await object_exists(archive_bucket, key)
+
+        response = await client.get(f'/patients/{entity_data["id"]}')
+        assert [img["img_timestamp"] for img in response.json()["images"]] == ["2023-01-01T10:00:00Z"]
+        assert response.json()["images"][0]["archived"] is False
+
+        response = await client.get(f'/patients/{entity_data["id"]}', params={"include_archived": True})
+        archived_images = response.json()["images"][1:]
+        assert [img["img_uri"] for img in archived_images] == [
+            f"{archive_bucket}/{img_obj['img_uri'].split('/', 1)[1]}" for img_obj in old_images
+        ]
+        assert all(img["archived"] for img in archived_images)
+
+        response = await client.get(f'/patients/{entity_data["id"]}/images', params={"include_archived": True, "limit": 1})
+        assert response.json()["next_cursor"] is not None
+
+        # archived images are served from the cold bucket, under their old uri as well
+        for img_uri in (archived_images[0]["img_uri"], old_images[0]["img_uri"]):
+            response = await client.get(f'/images/{img_uri}')
+            assert response.status_code == 200
+
+        assert await archive_old_images() == {"archived": 0, "failed": 0}
+
+    async def test_archiving_bumps_the_revision(self, client, archive_bucket):
+        entity_data = fixtures.FIXTURE_DATA[0]
+        etag = (await client.get(f'/patients/{entity_data["id"]}')).headers["etag"]
+        await archive_old_images()
+        response = await client.get(f'/patients/{entity_data["id"]}', headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()["images"] == []
+
+    async def test_shared_content_stays_hot(self, client, archive_bucket):
+        """
+        Test that content still referred to by a hot image is archived without leaving the hot bucket
+        """
+        patient_id = fixtures.FIXTURE_DATA[1]["id"]
+        await upload(client, patient_id, IMAGE_BYTES, "2020-01-01T10:00:00.000000Z")
+        await upload(client, patient_id, IMAGE_BYTES, "2023-01-01T10:00:00.000000Z")
+        blob = await app.mongodb.blobs.find_one({"_id": hashlib.sha256(IMAGE_BYTES).hexdigest()})
+
+        await archive_old_images()
+
+        assert await object_exists(os.environ["PATIENT_IMG_BUCKET"], blob["object_key"])
+        assert await object_exists(archive_bucket, blob["object_key"])
+        assert "tier" not in await app.mongodb.blobs.find_one({"_id": blob["_id"]})
+        old_image = await app.mongodb.images.find_one({"patient_id": uuid.UUID(patient_id), "sha256": blob["_id"], "tier": "archive"})
+        assert old_image["img_timestamp"].year == 2020
+
+    async def test_reupload_of_archived_content(self, client, archive_bucket):
+        """
+        Test that uploading content that only lives in the cold bucket anymore puts it back into the hot bucket
+        """
+        patient_id = fixtures.FIXTURE_DATA[2]["id"]
+        await upload(client, patient_id, IMAGE_BYTES, "2020-01-01T10:00:00.000000Z")
+        blob = await app.mongodb.blobs.find_one({"_id": hashlib.sha256(IMAGE_BYTES).hexdigest()})
+        await archive_old_images()
+        assert not await object_exists(os.environ["PATIENT_IMG_BUCKET"], blob["object_key"])
+        assert (await app.mongodb.blobs.find_one({"_id": blob["_id"]}))["tier"] == utils.ARCHIVE_TIER
+
+        response = await upload(client, patient_id, IMAGE_BYTES, "2023-01-01T10:00:00.000000Z")
+
+        assert await object_exists(os.environ["PATIENT_IMG_BUCKET"], blob["object_key"])
+        assert "tier" not in await app.mongodb.blobs.find_one({"_id": blob["_id"]})
+        newest_image = response.json()["images"][0]
+        assert (await client.get(f'/images/{newest_image["img_uri"]}')).content == IMAGE_BYTES
+
+    async def test_content_being_uploaded_stays_hot(self, client, archive_bucket):
+        """
+        Test that content an upload took a reference on (but has not recorded its image of yet) stays in the hot bucket
+        """
+        patient_id = fixtures.FIXTURE_DATA[1]["id"]
+        await upload(client, patient_id, IMAGE_BYTES, "2020-01-01T10:00:00.000000Z")
+        blob = await blobs._acquire(app.mongodb, hashlib.sha256(IMAGE_BYTES).hexdigest())
+
+        await archive_old_images()
+
+        assert await object_exists(os.environ["PATIENT_IMG_BUCKET"], blob["object_key"])
+        assert "tier" not in await app.mongodb.blobs.find_one({"_id": blob["_id"]})
+
+    async def test_reupload_while_archiving_content(self, client, archive_bucket, monkeypatch):
+        """
+        Test that content put back into the hot bucket right before archival drops it from there is restored
+        """
+        patient_id = fixtures.FIXTURE_DATA[2]["id"]
+        await upload(client, patient_id, IMAGE_BYTES, "2020-01-01T10:00:00.000000Z")
+        delete_object = app.storage.delete_object
+
+        async def reupload_then_delete(bucket, key):
+            # the upload took its reference after the content got marked archived
+            await blobs.store_content(app.mongodb, app.storage, bucket, io.BytesIO(IMAGE_BYTES), "scan.jpg")
+            await delete_object(bucket, key)
+
+        monkeypatch.setattr(app.storage, "delete_object", reupload_then_delete)
+        await archive_old_images()
+
+        blob = await app.mongodb.blobs.find_one({"_id": hashlib.sha256(IMAGE_BYTES).hexdigest()})
+        assert "tier" not in blob
+        assert await object_exists(os.environ["PATIENT_IMG_BUCKET"], blob["object_key"])
+
+    async def test_reupload_racing_the_delete(self, client, archive_bucket, monkeypatch):
+        """
+        Test that content re-uploaded right before archival deletes it from the hot bucket (with the re-upload only
+        finishing after archival did) is restored to the hot bucket
+        """
+        patient_id = fixtures.FIXTURE_DATA[2]["id"]
+        await upload(client, patient_id, IMAGE_BYTES, "2020-01-01T10:00:00.000000Z")
+        upload_fileobj, delete_object = app.storage.upload_fileobj, app.storage.delete_object
+        uploaded, archived = asyncio.Event(), asyncio.Event()
+        reuploads = []
+
+        async def slow_upload(*args, **kwargs):
+            await upload_fileobj(*args, **kwargs)
+            uploaded.set()
+            await archived.wait()
+
+        async def delete_after_reupload(bucket, key):
+            if not key.startswith(f"{blobs.BLOB_PREFIX}/"):
+                return await delete_object(bucket, key)
+            monkeypatch.setattr(app.storage, "upload_fileobj", slow_upload)
+            reuploads.append(asyncio.create_task(
+                blobs.store_content(app.mongodb, app.storage, bucket, io.BytesIO(IMAGE_BYTES), "scan.jpg")
+            ))
+            await uploaded.wait()
+            await delete_object(bucket, key)
+
+        monkeypatch.setattr(app.storage, "delete_object", delete_after_reupload)
+        await archive_old_images()
+        archived.set()
+        await asyncio.gather(*reuploads)
+
+        blob = await app.mongodb.blobs.find_one({"_id": hashlib.sha256(IMAGE_BYTES).hexdigest()})
+        assert "tier" not in blob
+        assert await object_exists(os.environ["PATIENT_IMG_BUCKET"], blob["object_key"])
+
+    async def test_racing_upload_of_archived_content(self, client, archive_bucket, monkeypatch):
+        """
+        Test that an upload losing the race to record the content to an (since archived) blob still makes it hot again
+        """
+        patient_id = fixtures.FIXTURE_DATA[2]["id"]
+        await upload(client, patient_id, IMAGE_BYTES, "2020-01-01T10:00:00.000000Z")
+        await archive_old_images()
+        acquire = blobs._acquire
+        lookups = []
+
+        async def acquire_after_racing_upload(db_client, digest):
+            lookups.append(digest)
+            # the first lookup happened before the other upload recorded the content
+            return None if len(lookups) == 1 else await acquire(db_client, digest)
+
+        monkeypatch.setattr(blobs, "_acquire", acquire_after_racing_upload)
+        blob, _, created = await blobs.store_content(
+            app.mongodb, app.storage, os.environ["PATIENT_IMG_BUCKET"], io.BytesIO(IMAGE_BYTES), "scan.jpg"
+        )
+
+        assert not created
+        assert "tier" not in await app.mongodb.blobs.find_one({"_id": blob["_id"]})
+        assert await object_exists(os.environ["PATIENT_IMG_BUCKET"], blob["object_key"])
+
+    async def test_image_replaced_while_archiving(self, client, archive_bucket, monkeypatch):
+        """
+        Test that an image replaced between its copy to the cold bucket and being marked archived stays hot
+        """
+        patient_id = fixtures.FIXTURE_DATA[1]["id"]
+        await upload(client, patient_id, IMAGE_BYTES, "2020-01-01T10:00:00.000000Z")
+        copy_object = app.storage.copy_object
+
+        async def copy_then_replace(*args, **kwargs):
+            await copy_object(*args, **kwargs)
+            if args[1].startswith(f"{blobs.BLOB_PREFIX}/"):
+                await upload(client, patient_id, b"a retaken scan" * 100, "2020-01-01T10:00:00.000000Z")
+
+        monkeypatch.setattr(app.storage, "copy_object", copy_then_replace)
+        await archive_old_images()
+
+        image_doc = await app.mongodb.images.find_one({"patient_id": uuid.UUID(patient_id), "sha256": {"$exists": True}})
+        assert "tier" not in image_doc
+        assert image_doc["sha256"] == hashlib.sha256(b"a retaken scan" * 100).hexdigest()
+        assert await object_exists(os.environ["PATIENT_IMG_BUCKET"], image_doc["object_key"])
+
+    async def test_archived_images_listed_without_archive_bucket(self, client, archive_bucket, monkeypatch):
+        """
+        Test that archived images are still listed once archival got switched off
+        """
+        entity_data = fixtures.FIXTURE_DATA[0]
+        await archive_old_images()
+        monkeypatch.delenv("ARCHIVE_IMG_BUCKET")
+
+        response = await client.get(f'/patients/{entity_data["id"]}', params={"include_archived": True})
+        assert response.status_code == 200
+        assert all(img["archived"] for img in response.json()["images"])
+
+    async def test_archive_scan_uses_index(self, client):
+        """
+        Test that the archival scan is answered off an index, in scan order, rather than by a collection scan
+        """
+        last = await app.mongodb.images.find_one({})
+        plan = await app.mongodb.images.find(
+            archive.build_archive_query(CUTOFF, last), {"img_timestamp": 1, "object_key": 1, "sha256": 1}
+        ).sort(archive.ARCHIVE_SCAN_SORT).limit(archive.DEFAULT_BATCH_SIZE).explain()
+        winning_plan = str(plan["queryPlanner"]["winningPlan"])
+        assert "tier_img_timestamp_id" in winning_plan
+        assert "COLLSCAN" not in winning_plan
+        assert "'SORT'" not in winning_plan
+
+    async def test_failed_copy_keeps_image_hot(self, client, archive_bucket):
+        """
+        Test that an image whose content cannot be copied stays hot (and is retried on the next pass)
+        """
+        entity_data = fixtures.FIXTURE_DATA[0]
+        old_image = fixtures.fixture_images(entity_data)[0]
+        await app.storage.delete_object(os.environ["PATIENT_IMG_BUCKET"], old_image["img_uri"].split("/", 1)[1])
+
+        result = await archive_old_images()
+
+        assert result["failed"] == 1
+        image_doc = await app.mongodb.images.find_one({"_id": old_image["img_uri"].split("/", 1)[1]})
+        assert "tier" not in image_doc
+
+    async def test_archive_worker_from_env(self, client, monkeypatch):
+        monkeypatch.delenv("ARCHIVE_IMG_BUCKET", raising=False)
+        assert archive.create_archive_worker(app.mongodb, app.storage) is None
+
+        monkeypatch.setenv("ARCHIVE_IMG_BUCKET", ARCHIVE_BUCKET)
+        monkeypatch.setenv("ARCHIVE_AFTER_DAYS", "30")
+        worker = archive.create_archive_worker(app.mongodb, app.storage)
+        assert (worker.cold_bucket, worker.archive_after) == (ARCHIVE_BUCKET, datetime.timedelta(days=30))
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import io
+import hashlib
+import pathlib
+import pytest
+from .. import fixtures, blobs, reconcile
+from ..main import app
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+IMG_BYTES = (pathlib.Path(fixtures.__file__).parent.resolve()/"img_dataset/3.jpg").read_bytes()
+
+
+async def upload(client, patient_id, img_bytes, img_timestamp):
+    response = await client.put(
+        f'/patients/{patient_id}',
+        files={'uploaded_img_file': ('scan.JPG', io.BytesIO(img_bytes), 'image/jpeg')},
+        data={'img_timestamp': img_timestamp}
+    )
+    assert response.status_code == 200
+    return response
+
+
+class TestImageDedup:
+
+    async def test_duplicate_uploads_share_content(self, client, s3_client):
+        """
+        Test that re-uploading the same image (for the same or another patient) stores its content only once
+        """
+        _, test_bucket_resource = s3_client
+        digest = hashlib.sha256(IMG_BYTES).hexdigest()
+        first_patient_id, second_patient_id = fixtures.FIXTURE_DATA[0]["id"], fixtures.FIXTURE_DATA[1]["id"]
+
+        await upload(client, first_patient_id, IMG_BYTES, "2023-01-01T10:00:00.000000Z")
+        await upload(client, first_patient_id, IMG_BYTES, "2023-01-02T10:00:00.000000Z")
+        await upload(client, second_patient_id, IMG_BYTES, "2023-01-03T10:00:00.000000Z")
+
+        blob = await app.mongodb.blobs.find_one({"_id": digest})
+        assert blob["object_key"] == f"{blobs.BLOB_PREFIX}/{digest}.jpg"
+        assert blob["refcount"] == 3
+        stored_keys = [s3_obj.key for s3_obj in test_bucket_resource.objects.filter(Prefix=f"{blobs.BLOB_PREFIX}/{digest}.jpg")]
+        assert stored_keys == [blob["object_key"]]
+
+        for patient_id, upload_count in [(first_patient_id, 2), (second_patient_id, 1)]:
+            response = await client.get(f'/patients/{patient_id}')
+            uploaded_images = [img for img in response.json()["images"] if img["img_timestamp"].startswith("2023")]
+            assert len(uploaded_images) == upload_count
+            assert all(img["img_uri"].endswith(f"/{blob['object_key']}") for img in uploaded_images)
+
+    async def test_replacing_an_image_releases_its_content(self, client):
+        """
+        Test that uploading different content under the same patient and timestamp drops the old content's reference
+        """
+        patient_id = fixtures.FIXTURE_DATA[2]["id"]
+        await upload(client, patient_id, IMG_BYTES, "2023-01-01T10:00:00.000000Z")
+        await upload(client, patient_id, b"something else entirely", "2023-01-01T10:00:00.000000Z")
+
+        assert (await app.mongodb.blobs.find_one({"_id": hashlib.sha256(IMG_BYTES).hexdigest()}))["refcount"] == 0
+        assert (await app.mongodb.blobs.find_one({"_id": hashlib.sha256(b"something else entirely").hexdigest()}))["refcount"] == 1
+
+    async def test_duplicate_upload_reuses_derivatives(self, client):
+        """
+        Test that the derivatives rendered for a content are handed straight to later uploads of it
+        """
+        patient_id = fixtures.FIXTURE_DATA[0]["id"]
+        await upload(client, patient_id, IMG_BYTES, "2023-01-01T10:00:00.000000Z")
+        await app.derivatives.join()
+
+        response = await upload(client, patient_id, IMG_BYTES, "2023-01-02T10:00:00.000000Z")
+
+        newest_image = response.json()["images"][0]
+        assert newest_image["thumbnail_uri"] is not None
+        assert newest_image["preview_uri"] is not None
+
+    async def test_reconcile_keeps_content_addressed_images(self, client):
+        """
+        Test that the reconcile command leaves content addressed images be and recounts their references
+        """
+        patient_id = fixtures.FIXTURE_DATA[0]["id"]
+        await upload(client, patient_id, IMG_BYTES, "2023-01-01T10:00:00.000000Z")
+        await app.mongodb.blobs.update_one({}, {"$set": {"refcount": 42}})
+
+        result = await reconcile.reconcile_images(app.mongodb, app.storage)
+
+        assert result["removed"] == 0
+        assert await app.mongodb.images.find_one({"_id": f"{patient_id}/2023-01-01T10:00:00.000000Z.JPG"}) is not None
+        assert (await app.mongodb.blobs.find_one({"_id": hashlib.sha256(IMG_BYTES).hexdigest()}))["refcount"] == 1
+
+    async def test_reconcile_keeps_images_uploaded_meanwhile(self, client, monkeypatch):
+        """
+        Test that a content addressed image uploaded after the reconcile command listed the bucket keeps its metadata
+        """
+        patient_id = fixtures.FIXTURE_DATA[0]["id"]
+        list_objects = app.storage.list_objects
+
+        async def list_objects_then_upload(bucket, prefix=""):
+            s3_objects = await list_objects(bucket, prefix)
+            await upload(client, patient_id, IMG_BYTES, "2023-01-01T10:00:00.000000Z")
+            return s3_objects
+
+        monkeypatch.setattr(app.storage, "list_objects", list_objects_then_upload)
+        result = await reconcile.reconcile_images(app.mongodb, app.storage)
+
+        assert result["removed"] == 0
+        assert await app.mongodb.images.find_one({"_id": f"{patient_id}/2023-01-01T10:00:00.000000Z.JPG"}) is not None
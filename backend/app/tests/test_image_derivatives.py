@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import io
+import os
+import pathlib
+import pytest
+from PIL import Image
+from .. import fixtures, derivatives
+from ..main import app
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+class TestImageDerivatives:
+
+    @pytest.mark.parametrize(
+        'img_key,rendition,expected_key',
+        [
+            ("pid/2024-01-23T12:05:30.148280Z.jpg", "thumbnail", "pid/2024-01-23T12:05:30.148280Z.thumbnail.webp"),
+            ("pid/2021-02-01T00:00:00.jpeg", "preview", "pid/2021-02-01T00:00:00.preview.webp"),
+            ("pid/2024-01-23T12:05:30.148280Z", "thumbnail", "pid/2024-01-23T12:05:30.148280Z.thumbnail.webp"),
+        ],
+        ids=[
+            "Derivative key: utc timestamp",
+            "Derivative key: naive timestamp",
+            "Derivative key: no file extension",
+        ]
+    )
+    async def test_derivative_key(self, img_key, rendition, expected_key):
+        assert derivatives.derivative_key(img_key, rendition) == expected_key
+        assert derivatives.is_derivative_key(expected_key)
+        assert not derivatives.is_derivative_key(img_key)
+
+    async def test_upload_generates_derivatives(self, client, s3_client):
+        """
+        Test that an upload gets its thumbnail and preview rendered in the background and exposed on the detail endpoint
+        """
+        entity_data = fixtures.FIXTURE_DATA[0]
+        img_path = pathlib.Path(fixtures.__file__).parent.resolve()/"img_dataset/2.jpg"
+        with open(img_path, "rb") as f:
+            response = await client.put(
+                f'/patients/{entity_data["id"]}',
+                files={'uploaded_img_file': ('scan.jpg', f, 'image/jpeg')},
+                data={'img_timestamp': "2023-01-01T10:00:00.000000Z"}
+            )
+        assert response.status_code == 200
+
+        await app.derivatives.join()
+
+        response = await client.get(f'/patients/{entity_data["id"]}')
+        newest_image = response.json()["images"][0]
+        img_key = newest_image["img_uri"].split("/", 1)[1]
+        assert newest_image["thumbnail_uri"].endswith(derivatives.derivative_key(img_key, "thumbnail"))
+        assert newest_image["preview_uri"].endswith(derivatives.derivative_key(img_key, "preview"))
+
+        s3_boto, _ = s3_client
+        bucket = os.environ["PATIENT_IMG_BUCKET"]
+        for rendition, uri in [("thumbnail", newest_image["thumbnail_uri"]), ("preview", newest_image["preview_uri"])]:
+            s3_object = s3_boto.get_object(Bucket=bucket, Key=uri.split("/", 1)[1])
+            assert s3_object["ContentType"] == derivatives.DERIVATIVE_CONTENT_TYPE
+            with Image.open(io.BytesIO(s3_object["Body"].read())) as rendered:
+                assert rendered.width <= derivatives.RENDITIONS[rendition][0]
+                assert rendered.height <= derivatives.RENDITIONS[rendition][1]
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import io
+import asyncio
+import hashlib
+import tarfile
+import zipfile
+import datetime
+import pytest
+from .. import fixtures, ingest
+from ..main import app
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+FRAMES = [f"frame {index}".encode() * 64 for index in range(5)]
+
+
+def zip_of(entries) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def tar_gz_of(entries) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in entries:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+class FakeStorage:
+    """
+    Local stand-in for the object storage that keeps track of how many uploads run at once
+    """
+
+    def __init__(self, fail_on: bytes = None):
+        self.fail_on = fail_on
+        self.objects = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def upload_fileobj(self, fileobj, bucket, key, extra_args=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            data = fileobj.read()
+            if data == self.fail_on:
+                raise RuntimeError("upload failed")
+            self.objects[key] = data
+        finally:
+            self.in_flight -= 1
+
+
+class TestImageIngest:
+
+    @pytest.mark.parametrize(
+        'files',
+        [
+            [('study.zip', zip_of([(f"series/{index}.jpg", frame) for index, frame in enumerate(FRAMES)]), 'application/zip')],
+            [('study.tar.gz', tar_gz_of([(f"series/{index}.jpg", frame) for index, frame in enumerate(FRAMES)]), 'application/gzip')],
+            [(f'{index}.jpg', frame, 'image/jpeg') for index, frame in enumerate(FRAMES)],
+        ],
+        ids=["Ingest: zip archive", "Ingest: gzipped tar archive", "Ingest: several image files"]
+    )
+    async def test_ingest_study(self, files, client):
+        patient_id = fixtures.FIXTURE_DATA[0]["id"]
+        response = await client.post(
+            f'/patients/{patient_id}/images/bulk',
+            files=[('files', (name, io.BytesIO(data), content_type)) for name, data, content_type in files],
+            data={'img_timestamp': "2023-01-01T10:00:00.000000Z"}
+        )
+        assert response.status_code == 200
+        result = response.json()
+        assert (result["ingested_count"], result["new_content_count"], result["skipped"]) == (len(FRAMES), len(FRAMES), [])
+
+        # frames are a millisecond apart in upload order, so the newest first list has them back to front
+        study_images = [img for img in result["images"] if img["img_timestamp"].startswith("2023-01-01")]
+        assert [datetime.datetime.fromisoformat(img["img_timestamp"]) for img in study_images] == [
+            datetime.datetime(2023, 1, 1, 10, 0, 0, index * 1000, tzinfo=datetime.timezone.utc)
+            for index in reversed(range(len(FRAMES)))
+        ]
+        for image, frame in zip(study_images, reversed(FRAMES)):
+            assert image["img_uri"].endswith(f"{hashlib.sha256(frame).hexdigest()}.jpg")
+
+    async def test_skips_non_images_and_dedups(self, client):
+        patient_id = fixtures.FIXTURE_DATA[1]["id"]
+        archive = zip_of([("0.jpg", FRAMES[0]), ("README.txt", b"not an image"), ("1.png", FRAMES[0]), ("series/", b"")])
+        response = await client.post(
+            f'/patients/{patient_id}/images/bulk',
+            files=[('files', ('study.zip', io.BytesIO(archive), 'application/zip'))]
+        )
+        assert response.status_code == 200
+        result = response.json()
+        assert (result["ingested_count"], result["new_content_count"], result["skipped"]) == (2, 1, ["README.txt"])
+        assert (await app.mongodb.blobs.find_one({"_id": hashlib.sha256(FRAMES[0]).hexdigest()}))["refcount"] == 2
+
+    @pytest.mark.parametrize(
+        'patient_id, files, data, expected_status',
+        [
+            ("00000000-0000-4000-8000-000000000000", [('a.jpg', b"a", 'image/jpeg')], {}, 404),
+            (None, [('study.zip', b"not a zip", 'application/zip')], {}, 422),
+            (None, [('a.jpg', b"a", 'image/jpeg')], {'img_timestamp': "yesterday"}, 422),
+        ],
+        ids=["Ingest: unknown patient", "Ingest: corrupt archive", "Ingest: bad timestamp"]
+    )
+    async def test_ingest_errors(self, patient_id, files, data, expected_status, client):
+        response = await client.post(
+            f'/patients/{patient_id or fixtures.FIXTURE_DATA[0]["id"]}/images/bulk',
+            files=[('files', (name, io.BytesIO(content), content_type)) for name, content, content_type in files],
+            data=data
+        )
+        assert response.status_code == expected_status
+
+    async def test_bounded_concurrency(self):
+        object_storage = FakeStorage()
+        archive = zip_of([(f"{index}.jpg", f"frame {index}".encode()) for index in range(20)])
+        result = await ingest.ingest_study(
+            app.mongodb, object_storage, "bucket", fixtures.FIXTURE_DATA[0]["id"],
+            [(io.BytesIO(archive), "study.zip", "application/zip")],
+            datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc), concurrency=3
+        )
+        assert len(result["ingested"]) == 20
+        assert object_storage.max_in_flight == 3
+
+    async def test_failure_releases_references(self):
+        """
+        Test that a study failing midway records nothing and hands back the references it took
+        """
+        object_storage = FakeStorage(fail_on=b"frame 3")
+        archive = zip_of([(f"{index}.jpg", f"frame {index}".encode()) for index in range(6)])
+        with pytest.raises(RuntimeError):
+            await ingest.ingest_study(
+                app.mongodb, object_storage, "bucket", fixtures.FIXTURE_DATA[0]["id"],
+                [(io.BytesIO(archive), "study.zip", "application/zip")],
+                datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc), concurrency=2
+            )
+        assert await app.mongodb.images.count_documents({"img_timestamp": {"$gte": datetime.datetime(2023, 1, 1)}}) == 0
+        assert await app.mongodb.blobs.count_documents({"refcount": {"$gt": 0}}) == 0
+
+    @pytest.mark.parametrize(
+        'img_timestamp',
+        ["2023-01-01T10:00:00.000000Z", "2023-01-01T09:59:59.999000Z"],
+        ids=["Ingest: same study timestamp", "Ingest: study timestamps overlapping an earlier image"]
+    )
+    async def test_conflicting_timestamp(self, img_timestamp, client):
+        """
+        Test that a study is rejected as a whole rather than overwriting images the patient already has
+        """
+        patient_id = fixtures.FIXTURE_DATA[0]["id"]
+        response = await client.put(
+            f'/patients/{patient_id}',
+            files={'uploaded_img_file': ('scan.jpg', io.BytesIO(b"single upload"), 'image/jpeg')},
+            data={'img_timestamp': "2023-01-01T10:00:00.000000Z"}
+        )
+        assert response.status_code == 200
+        images = response.json()["images"]
+
+        response = await client.post(
+            f'/patients/{patient_id}/images/bulk',
+            files=[('files', (f'{index}.jpg', io.BytesIO(frame), 'image/jpeg')) for index, frame in enumerate(FRAMES)],
+            data={'img_timestamp': img_timestamp}
+        )
+        assert response.status_code == 409
+        assert (await client.get(f'/patients/{patient_id}')).json()["images"] == images
+        assert await app.mongodb.blobs.count_documents({"refcount": {"$gt": 0}}) == 1
+
+    async def test_racing_studies_at_the_same_timestamp(self, monkeypatch):
+        """
+        Test that of two studies recorded at the same timestamp at once only the first one is kept
+        """
+        async def no_conflict(*args):
+            return None
+
+        # both studies got past the conflict check before either got recorded
+        monkeypatch.setattr(ingest, "find_conflicting_image", no_conflict)
+        patient_id = fixtures.FIXTURE_DATA[0]["id"]
+        study_timestamp = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+        await ingest.ingest_study(
+            app.mongodb, FakeStorage(), "bucket", patient_id,
+            [(io.BytesIO(frame), f"{index}.jpg", "image/jpeg") for index, frame in enumerate(FRAMES)], study_timestamp
+        )
+        with pytest.raises(ingest.TimestampConflict):
+            await ingest.ingest_study(
+                app.mongodb, FakeStorage(), "bucket", patient_id,
+                [(io.BytesIO(frame), f"{index}.jpg", "image/jpeg") for index, frame in enumerate(FRAMES[::-1])],
+                study_timestamp
+            )
+
+        image_docs = await app.mongodb.images.find({"img_timestamp": {"$gte": study_timestamp}}).sort("_id").to_list(
+            length=None
+        )
+        assert [doc["sha256"] for doc in image_docs] == [hashlib.sha256(frame).hexdigest() for frame in FRAMES]
+        assert await app.mongodb.blobs.count_documents({"refcount": {"$gt": 1}}) == 0
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import gc
+import io
+import os
+import asyncio
+import pytest
+from .. import fixtures, image_proxy, utils
+from ..main import app
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+IMAGE_BYTES = bytes(range(256)) * 4
+
+
+async def upload_image(client) -> str:
+    """
+    :return: the `img_uri` of a freshly uploaded image
+    """
+    patient_id = fixtures.FIXTURE_DATA[0]["id"]
+    response = await client.put(
+        f'/patients/{patient_id}',
+        files={'uploaded_img_file': ('scan.jpg', io.BytesIO(IMAGE_BYTES), 'image/jpeg')},
+        data={'img_timestamp': "2023-01-01T10:00:00.000000Z"}
+    )
+    assert response.status_code == 200
+    return response.json()["images"][0]["img_uri"]
+
+
+async def chunks_of(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class TestImageProxy:
+
+    @pytest.mark.parametrize(
+        'range_header, expected',
+        [
+            (None, None),
+            ("bytes=0-99", (0, 99)),
+            ("bytes=100-", (100, 1023)),
+            ("bytes=-24", (1000, 1023)),
+            ("bytes=1000-5000", (1000, 1023)),
+            ("bytes=0-1,5-6", None),
+        ],
+        ids=[
+            "Image Range: no range",
+            "Image Range: bounded range",
+            "Image Range: open ended range",
+            "Image Range: suffix range",
+            "Image Range: range past the end is clamped",
+            "Image Range: multiple ranges get the whole image",
+        ]
+    )
+    async def test_parse_range(self, range_header, expected):
+        assert image_proxy.parse_range(range_header, 1024) == expected
+
+    @pytest.mark.parametrize(
+        'range_header',
+        ["bytes=1024-", "bytes=10-5"],
+        ids=["Image Range: range past the end", "Image Range: range ending before it starts"]
+    )
+    async def test_parse_unsatisfiable_range(self, range_header):
+        with pytest.raises(image_proxy.RangeNotSatisfiable):
+            image_proxy.parse_range(range_header, 1024)
+
+    async def test_stream_image(self, client):
+        img_uri = await upload_image(client)
+        response = await client.get(f'/images/{img_uri}')
+        assert response.status_code == 200
+        assert response.content == IMAGE_BYTES
+        assert response.headers["content-type"] == "image/jpeg"
+        assert response.headers["cache-control"] == image_proxy.IMMUTABLE_CACHE_CONTROL
+        assert response.headers["accept-ranges"] == "bytes"
+
+        response = await client.get(f'/images/{img_uri}', headers={"If-None-Match": response.headers["etag"]})
+        assert response.status_code == 304
+
+    async def test_range_request(self, client):
+        img_uri = await upload_image(client)
+        response = await client.get(f'/images/{img_uri}', headers={"Range": "bytes=10-19"})
+        assert response.status_code == 206
+        assert response.content == IMAGE_BYTES[10:20]
+        assert response.headers["content-range"] == f"bytes 10-19/{len(IMAGE_BYTES)}"
+
+        response = await client.get(f'/images/{img_uri}', headers={"Range": "bytes=10-5"})
+        assert response.status_code == 416
+
+    @pytest.mark.parametrize(
+        'img_uri',
+        ["{bucket}/missing/key.jpg", "other-bucket/key.jpg", "{bucket}"],
+        ids=["Image: unknown key", "Image: outside of the patient image bucket", "Image: bucket without a key"]
+    )
+    async def test_unknown_image(self, img_uri, client):
+        response = await client.get(f'/images/{img_uri.format(bucket=os.environ["PATIENT_IMG_BUCKET"])}')
+        assert response.status_code == 404
+
+    async def test_disk_cache(self, client, tmp_path):
+        """
+        Test that a full download lands in the disk cache, which then serves repeat (and range) requests
+        """
+        app.image_proxy = image_proxy.ImageProxy(app.storage, disk_cache=image_proxy.DiskCache(tmp_path))
+        img_uri = await upload_image(client)
+
+        assert (await client.get(f'/images/{img_uri}')).content == IMAGE_BYTES
+        response = await client.get(f'/images/{img_uri}')
+        assert response.content == IMAGE_BYTES
+        assert response.headers["cache-control"] == image_proxy.IMMUTABLE_CACHE_CONTROL
+        stats = (await client.get('/cache/stats')).json()["image_disk_cache"]
+        assert (stats["hits"], stats["misses"], stats["size_bytes"]) == (1, 1, len(IMAGE_BYTES))
+
+        response = await client.get(f'/images/{img_uri}', headers={"Range": "bytes=-4"})
+        assert response.status_code == 206
+        assert response.content == IMAGE_BYTES[-4:]
+        response = await client.get(f'/images/{img_uri}', headers={"Range": f"bytes={len(IMAGE_BYTES)}-"})
+        assert response.status_code == 416
+        assert response.headers["content-range"] == f"bytes */{len(IMAGE_BYTES)}"
+        response = await client.get(f'/images/{img_uri}', headers={"Range": "bytes=10-5"})
+        assert response.status_code == 416
+
+    async def test_overwritten_image_is_not_served_stale(self, client, tmp_path):
+        """
+        Test that an image under an overwritable (not content addressed) key is revalidated rather than kept for good,
+        and that the disk cache serves the new content once it got overwritten
+        """
+        app.image_proxy = image_proxy.ImageProxy(app.storage, disk_cache=image_proxy.DiskCache(tmp_path))
+        bucket = os.environ["PATIENT_IMG_BUCKET"]
+        img_key = utils.build_image_key(fixtures.FIXTURE_DATA[0]["id"], "2023-01-01T10:00:00.000000Z", "scan.jpg")
+        await app.storage.upload_fileobj(io.BytesIO(IMAGE_BYTES), bucket, img_key)
+
+        for _ in range(2):
+            response = await client.get(f'/images/{bucket}/{img_key}')
+            assert response.content == IMAGE_BYTES
+            assert response.headers["cache-control"] == image_proxy.REVALIDATE_CACHE_CONTROL
+        assert app.image_proxy.disk_cache.stats()["hits"] == 1
+
+        await app.storage.upload_fileobj(io.BytesIO(IMAGE_BYTES[::-1]), bucket, img_key)
+        response = await client.get(f'/images/{bucket}/{img_key}')
+        assert response.content == IMAGE_BYTES[::-1]
+
+    async def test_disk_cache_eviction(self, tmp_path):
+        disk_cache = image_proxy.DiskCache(tmp_path, max_bytes=10)
+        for key in ("first", "second"):
+            async for _ in disk_cache.tee(key, {"size": 8}, chunks_of(b"1234", b"5678")):
+                pass
+
+        assert await disk_cache.get("first") is None
+        assert (await disk_cache.get("second"))["size"] == 8
+        assert disk_cache.stats()["evictions"] == 1
+
+    async def test_disk_cache_skips_incomplete_downloads(self, tmp_path):
+        disk_cache = image_proxy.DiskCache(tmp_path)
+        stream = disk_cache.tee("key", {"size": 8}, chunks_of(b"1234", b"5678"))
+        assert await anext(stream) == b"1234"
+        # the client went away
+        await stream.aclose()
+
+        assert await disk_cache.get("key") is None
+        assert list(tmp_path.glob("*/*")) == []
+
+    async def test_disk_cache_cleans_up_abandoned_downloads(self, tmp_path):
+        """
+        Test that a stream dropped without being closed (like one whose client went away) leaves no temporary file
+        behind, and that stale temporary files (e.g. of a killed worker) get swept
+        """
+        disk_cache = image_proxy.DiskCache(tmp_path)
+        stream = disk_cache.tee("key", {"size": 8}, chunks_of(b"1234", b"5678"))
+        assert await anext(stream) == b"1234"
+        del stream
+        gc.collect()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert list(tmp_path.glob("*/*")) == []
+
+        stale_path = tmp_path / "ab" / ".abcd.0123"
+        stale_path.parent.mkdir()
+        stale_path.write_bytes(b"partial")
+        os.utime(stale_path, (0, 0))
+        image_proxy.DiskCache(tmp_path)
+        assert not stale_path.exists()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import io
+import uuid
+import datetime
+import pytest
+from pymongo import ASCENDING
+from .. import fixtures, indexes, utils
+from ..main import app
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+class TestIndexes:
+
+    async def test_ensure_indexes_is_idempotent(self, client):
+        await indexes.ensure_indexes(app.mongodb)
+        report = await indexes.ensure_indexes(app.mongodb)
+        assert report == {collection_name: {"created": [], "dropped": []} for collection_name in indexes.INDEXES}
+
+        for collection_name, index_models in indexes.INDEXES.items():
+            index_info = await app.mongodb[collection_name].index_information()
+            assert {index_model.document["name"] for index_model in index_models} <= set(index_info)
+        assert (await app.mongodb.images.index_information())["sha256"]["partialFilterExpression"] == {"sha256": {"$exists": True}}
+
+    async def test_obsolete_and_changed_indexes(self, client):
+        """
+        Test that superseded indexes are dropped and indexes whose definition changed are rebuilt
+        """
+        await app.mongodb.images.drop_indexes()
+        await app.mongodb.images.create_index(
+            [("patient_id", ASCENDING), ("img_timestamp", -1)], name="patient_id_img_timestamp"
+        )
+        await app.mongodb.images.create_index([("sha256", ASCENDING)], name="sha256")
+
+        report = await indexes.ensure_indexes(app.mongodb)
+
+        assert report["images"] == {
+            "created": ["patient_id_img_timestamp_id", "sha256", "tier_img_timestamp_id"],
+            "dropped": ["patient_id_img_timestamp", "sha256"]
+        }
+        index_info = await app.mongodb.images.index_information()
+        assert "patient_id_img_timestamp" not in index_info
+        assert index_info["sha256"]["partialFilterExpression"] == {"sha256": {"$exists": True}}
+
+    async def test_compact_documents(self, client):
+        """
+        Test that the null fields (and embedded images) of documents written by older versions get stripped
+        """
+        patient_id = uuid.uuid4()
+        await app.mongodb.patients.insert_one({
+            "_id": patient_id, "first_name": "Legacy", "last_name": "Record",
+            "date_of_birth": datetime.datetime(1970, 1, 1), "images": None
+        })
+        await app.mongodb.images.insert_one({
+            "_id": f"{patient_id}/2020-01-01T00:00:00.000000Z", "patient_id": patient_id,
+            "img_timestamp": datetime.datetime(2020, 1, 1), "size": None, "content_type": None
+        })
+
+        assert await indexes.compact_documents(app.mongodb) == {"patients": 1, "images": 2}
+        assert set(await app.mongodb.patients.find_one({"_id": patient_id})) == {"_id", "first_name", "last_name", "date_of_birth"}
+        assert set(await app.mongodb.images.find_one({"patient_id": patient_id})) == {"_id", "patient_id", "img_timestamp"}
+        assert await indexes.compact_documents(app.mongodb) == {"patients": 0, "images": 0}
+
+    async def test_new_documents_are_compact(self, client):
+        response = await client.post('/patients/', json={"first_name": "Ada", "last_name": "Lovelace", "date_of_birth": "1815-12-10"})
+        patient_id = response.json()["id"]
+        assert None not in (await app.mongodb.patients.find_one({"_id": uuid.UUID(patient_id)})).values()
+
+        await client.put(
+            f'/patients/{patient_id}',
+            files={'uploaded_img_file': ('scan', io.BytesIO(b"no extension"), '')},
+            data={'img_timestamp': "2023-01-01T10:00:00.000000Z"}
+        )
+        image_doc = await app.mongodb.images.find_one({"patient_id": uuid.UUID(patient_id)})
+        assert "content_type" not in image_doc
+        assert None not in image_doc.values()
+
+    @pytest.mark.parametrize(
+        'filters, expected_index',
+        [
+            ({"date_of_birth": datetime.date(1986, 9, 18)}, "date_of_birth_last_name_first_name_id"),
+            ({"last_name": "Ro"}, "last_name_first_name_id"),
+        ],
+        ids=[
+            "Explain: date of birth filter",
+            "Explain: last name prefix search",
+        ]
+    )
+    async def test_patient_list_uses_index(self, filters, expected_index, client):
+        """
+        Test that the patient list filters are answered off an index, in list order, rather than by a collection scan
+        """
+        query = utils.build_patient_list_query(**filters)
+        plan = await app.mongodb.patients.find(query, utils.PATIENT_LIST_PROJECTION).sort(utils.PATIENT_LIST_SORT).limit(101).explain()
+        winning_plan = str(plan["queryPlanner"]["winningPlan"])
+        assert expected_index in winning_plan
+        assert "COLLSCAN" not in winning_plan
+        assert "'SORT'" not in winning_plan
+
+    async def test_patient_list_date_of_birth_filter(self, client):
+        entity_data = fixtures.FIXTURE_DATA[0]
+        response = await client.get('/patients', params={"date_of_birth": entity_data["date_of_birth"]})
+        assert response.status_code == 200
+        assert [patient["id"] for patient in response.json()["patients"]] == [entity_data["id"]]
+
+        response = await client.get('/patients', params={"date_of_birth": "not a date"})
+        assert response.status_code == 422
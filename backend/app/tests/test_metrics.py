@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import pytest
+import pytest_asyncio
+from .. import fixtures, metrics, utils
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+@pytest_asyncio.fixture(scope="function")
+async def metrics_enabled():
+    was_enabled = metrics.enabled()
+    metrics.configure(enabled=True)
+    yield
+    metrics.configure(enabled=was_enabled)
+
+
+class TestMetrics:
+
+    async def test_metrics_disabled(self, client):
+        """
+        Test that the scrape endpoint is not served while metrics are disabled
+        """
+        metrics.configure(enabled=False)
+        response = await client.get('/metrics')
+        assert response.status_code == 404
+
+    async def test_metrics_hot_paths(self, client, metrics_enabled):
+        """
+        Test that handler, object storage and image formatting timings show up on the scrape endpoint
+        """
+        patient_id = fixtures.FIXTURE_DATA[0]["id"]
+        response = await client.get(f'/patients/{patient_id}')
+        assert response.status_code == 200
+        response = await client.get('/patients/export', params={"include_images": True})
+        assert response.status_code == 200
+
+        response = await client.get('/metrics')
+        assert response.status_code == 200
+        exposition = response.text
+        assert 'fos_http_request_duration_seconds_count{method="GET",route="get_patient",status="200"}' in exposition
+        assert 'fos_step_duration_seconds_count{step="format_patient_image_objects"}' in exposition
+
+    async def test_metrics_mongo_commands(self, client, metrics_enabled):
+        """
+        Test that mongo commands of a client created with metrics enabled are timed
+        """
+        db_client, db_handle = await utils.get_mongodb_connection()
+        try:
+            await db_handle.patients.find_one({})
+        finally:
+            db_client.close()
+
+        response = await client.get('/metrics')
+        assert 'fos_mongo_command_duration_seconds_count{command="find"}' in response.text
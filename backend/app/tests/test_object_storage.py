@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import io
+import time
+import asyncio
+import pytest
+from ..main import app
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+class TestObjectStorage:
+
+    async def test_slow_upload_does_not_block_other_requests(self, client, monkeypatch):
+        """
+        Test that while one upload is stuck on a slow object storage call the other endpoints keep responding
+        """
+        slow_call_seconds = 2
+        orig_upload_fileobj = app.storage.client.upload_fileobj
+
+        def slow_upload_fileobj(*args, **kwargs):
+            # a blocking sleep, exactly like a sluggish minio would behave from boto3's point of view
+            time.sleep(slow_call_seconds)
+            return orig_upload_fileobj(*args, **kwargs)
+
+        monkeypatch.setattr(app.storage.client, "upload_fileobj", slow_upload_fileobj)
+
+        response = await client.get('/patients')
+        assert response.status_code == 200
+        patient_id = response.json()['patients'][0]['id']
+
+        upload_task = asyncio.create_task(client.put(
+            f'/patients/{patient_id}',
+            files={'uploaded_img_file': ('slow.jpg', io.BytesIO(b"not really a jpeg"), 'image/jpeg')}
+        ))
+        # let the upload get going and park itself on the slow storage call
+        await asyncio.sleep(0.2)
+        assert not upload_task.done()
+
+        start = time.monotonic()
+        response = await client.get(f'/patients/{patient_id}')
+        elapsed = time.monotonic() - start
+
+        assert response.status_code == 200
+        assert elapsed < slow_call_seconds / 2
+        assert not upload_task.done()
+
+        upload_response = await upload_task
+        assert upload_response.status_code == 200
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import uuid
+import pytest
+from .. import fixtures
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+class TestPatientBatchGet:
+
+    async def test_batch_get_patients(self, client):
+        """
+        Test that a batch get returns every found patient exactly like the detail endpoint does, plus the missing ids
+        """
+        unknown_id = str(uuid.uuid4())
+        patient_ids = [entity_data["id"] for entity_data in fixtures.FIXTURE_DATA]
+
+        response = await client.post('/patients/batch-get', json={"ids": [unknown_id, *patient_ids, patient_ids[0]]})
+
+        assert response.status_code == 200
+        batch = response.json()
+        assert batch["not_found"] == [unknown_id]
+        assert sorted(batch["patients"]) == sorted(patient_ids)
+        for patient_id in patient_ids:
+            detail_response = await client.get(f'/patients/{patient_id}')
+            assert batch["patients"][patient_id] == detail_response.json()
+
+    @pytest.mark.parametrize(
+        'body',
+        [
+            {"ids": []},
+            {"ids": ["not-a-uuid"]},
+            {},
+        ],
+        ids=[
+            "POST Patient Batch Get: no ids",
+            "POST Patient Batch Get: invalid id",
+            "POST Patient Batch Get: missing ids",
+        ]
+    )
+    async def test_batch_get_patients_invalid(self, body, client):
+        response = await client.post('/patients/batch-get', json=body)
+        assert response.status_code == 422
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import io
+import pytest
+from .. import fixtures, cache
+from ..main import app
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+class FakeRedis:
+    """
+    Local stand-in for a `redis.asyncio` client (only what the cache backend uses)
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        """
+        Run the python equivalent of one of the backend's lua scripts
+        """
+        (entry_key, generation_key), args = keys_and_args[:numkeys], keys_and_args[numkeys:]
+        if script == cache.RedisBackend.SET_IF_CURRENT_SCRIPT:
+            if int(self.data.get(generation_key, 0)) != int(args[1]):
+                return 0
+            self.data[entry_key] = args[0]
+            return 1
+        if script == cache.RedisBackend.INVALIDATE_SCRIPT:
+            self.data[generation_key] = int(self.data.get(generation_key, 0)) + 1
+            return int(self.data.pop(entry_key, None) is not None)
+        raise NotImplementedError(script)
+
+    async def aclose(self):
+        pass
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestPatientCache:
+
+    async def test_memory_backend_ttl(self):
+        clock = FakeClock()
+        backend = cache.MemoryBackend(ttl_seconds=10, clock=clock)
+        await backend.set("key", {"value": 1})
+
+        clock.now = 9.9
+        assert await backend.get("key") == {"value": 1}
+        clock.now = 10
+        assert await backend.get("key") is None
+
+    async def test_memory_backend_lru_eviction(self):
+        backend = cache.MemoryBackend(max_entries=2)
+        await backend.set("a", 1)
+        await backend.set("b", 2)
+        # touch "a" so that "b" becomes the least recently used entry
+        assert await backend.get("a") == 1
+        await backend.set("c", 3)
+
+        assert await backend.get("b") is None
+        assert await backend.get("a") == 1
+        assert await backend.get("c") == 3
+        assert backend.stats()["evictions"] == 1
+
+    @pytest.mark.parametrize(
+        'backend_factory',
+        [lambda: cache.MemoryBackend(), lambda: cache.RedisBackend(FakeRedis())],
+        ids=["Cache: memory backend", "Cache: redis backend"]
+    )
+    async def test_load_racing_an_invalidation_is_not_cached(self, backend_factory):
+        """
+        Test that a value loaded while its key got invalidated (i.e. read before a write) does not end up in the cache
+        """
+        response_cache = cache.ResponseCache(backend_factory())
+
+        async def stale_loader():
+            # the write (and its invalidation) lands after the load read mongo
+            await response_cache.invalidate("key")
+            return {"rev": 1}
+
+        assert await response_cache.get_or_load("key", stale_loader) == {"rev": 1}
+        assert await response_cache.backend.get("key") is None
+
+        async def fresh_loader():
+            return {"rev": 2}
+
+        assert await response_cache.get_or_load("key", fresh_loader) == {"rev": 2}
+        assert await response_cache.get_or_load("key", stale_loader) == {"rev": 2}
+
+    async def test_memory_backend_generations_are_bounded(self):
+        """
+        Test that dropping old generations never lets a load that started before an invalidation through
+        """
+        backend = cache.MemoryBackend(max_entries=2)
+        generation = await backend.generation("a")
+        for key in ("a", "b", "c"):
+            await backend.delete(key)
+
+        assert len(backend._generations) == 2
+        await backend.set("a", 1, generation=generation)
+        assert await backend.get("a") is None
+        await backend.set("a", 1, generation=await backend.generation("a"))
+        assert await backend.get("a") == 1
+
+    async def test_patient_detail_cache_hit_and_invalidation(self, client):
+        """
+        Test that repeated detail fetches are served from the cache and that an upload invalidates the cached entry
+        """
+        patient_id = fixtures.FIXTURE_DATA[1]["id"]
+
+        first_response = await client.get(f'/patients/{patient_id}')
+        second_response = await client.get(f'/patients/{patient_id}')
+        assert first_response.json() == second_response.json()
+        stats = (await client.get('/cache/stats')).json()
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+
+        response = await client.put(
+            f'/patients/{patient_id}',
+            files={'uploaded_img_file': ('scan.jpg', io.BytesIO(b"not really a jpeg"), 'image/jpeg')}
+        )
+        assert response.status_code == 200
+
+        response = await client.get(f'/patients/{patient_id}')
+        assert len(response.json()["images"]) == len(first_response.json()["images"]) + 1
+        stats = (await client.get('/cache/stats')).json()
+        assert stats["misses"] == 2
+
+    async def test_patient_detail_redis_backend(self, client, monkeypatch):
+        """
+        Test the detail endpoint against the redis backend (with a local stand-in for redis)
+        """
+        fake_redis = FakeRedis()
+        monkeypatch.setattr(app, "patient_cache", cache.ResponseCache(cache.RedisBackend(fake_redis)))
+        patient_id = fixtures.FIXTURE_DATA[0]["id"]
+
+        first_response = await client.get(f'/patients/{patient_id}')
+        assert f"fos:patient:{patient_id}" in fake_redis.data
+        second_response = await client.get(f'/patients/{patient_id}')
+
+        assert second_response.status_code == 200
+        assert first_response.json() == second_response.json()
+        assert app.patient_cache.metrics.hits == 1
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import json
+import pytest
+from .. import fixtures
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+NEW_PATIENTS = [
+    {"first_name": "Ada", "last_name": "Lovelace", "date_of_birth": "1815-12-10"},
+    {"first_name": "Alan", "last_name": "Turing"},
+    {"first_name": "Grace", "last_name": "Hopper", "date_of_birth": "1906-12-09"},
+]
+
+
+class TestPatientCreate:
+
+    async def test_create_patient(self, client):
+        """
+        Test that creating a patient returns the created record which is then retrievable
+        """
+        response = await client.post('/patients', json=NEW_PATIENTS[0])
+
+        assert response.status_code == 201
+        created_patient = response.json()
+        assert {key: created_patient[key] for key in NEW_PATIENTS[0]} == NEW_PATIENTS[0]
+
+        response = await client.get(f'/patients/{created_patient["id"]}')
+        assert response.status_code == 200
+        assert response.json()["first_name"] == NEW_PATIENTS[0]["first_name"]
+
+    async def test_bulk_create_patients_json(self, client):
+        """
+        Test that a JSON array bulk create inserts the valid records and reports the invalid one by its position
+        """
+        response = await client.post('/patients/bulk', json=NEW_PATIENTS)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["inserted_count"] == 2
+        assert len(data["inserted_ids"]) == 2
+        assert [error["index"] for error in data["errors"]] == [1]
+        assert data["errors"][0]["errors"][0]["loc"] == ["date_of_birth"]
+
+        response = await client.get('/patients', params={"limit": 1000})
+        assert len(response.json()["patients"]) == len(fixtures.FIXTURE_DATA) + 2
+
+    async def test_bulk_create_patients_ndjson(self, client):
+        """
+        Test that an NDJSON bulk create reports unparsable lines and duplicate ids without failing the other records
+        """
+        records = [
+            json.dumps(NEW_PATIENTS[0]),
+            "{not json",
+            json.dumps({**NEW_PATIENTS[2], "_id": fixtures.FIXTURE_DATA[0]["id"]}),
+            json.dumps(NEW_PATIENTS[2]),
+        ]
+        response = await client.post(
+            '/patients/bulk',
+            content="\n".join(records).encode(),
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["inserted_count"] == 2
+        assert [error["index"] for error in data["errors"]] == [1, 2]
+        assert data["errors"][1]["errors"][0]["type"] == "value_error.duplicate"
+
+    async def test_bulk_create_patients_not_a_list(self, client):
+        """
+        Test that a JSON body which is not an array is rejected outright
+        """
+        response = await client.post('/patients/bulk', json=NEW_PATIENTS[0])
+        assert response.status_code == 422
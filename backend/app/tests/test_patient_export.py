@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import json
+import pytest
+from .. import fixtures
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+class TestPatientExport:
+
+    @pytest.mark.parametrize(
+        'params',
+        [
+            {},
+            {"batch_size": 1},
+            {"gzip": True},
+        ],
+        ids=[
+            "GET Patient Export: single batch",
+            "GET Patient Export: one patient per batch",
+            "GET Patient Export: gzip compressed",
+        ]
+    )
+    async def test_patients_export(self, params, client):
+        """
+        Test that the export streams out every bootstrapped patient as one json document per line
+        """
+        response = await client.get('/patients/export', params=params)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        if params.get("gzip"):
+            assert response.headers["content-encoding"] == "gzip"
+
+        # (httpx transparently decompresses the gzip content encoding for us)
+        exported_patients = [json.loads(line) for line in response.text.splitlines()]
+        expected_patients = [
+            {key: entity_data[key] for key in ["id", "first_name", "last_name", "date_of_birth"]}
+            for entity_data in fixtures.FIXTURE_DATA
+        ]
+        assert sorted(exported_patients, key=lambda x: x["id"]) == sorted(expected_patients, key=lambda x: x["id"])
+
+    async def test_patients_export_with_images(self, client):
+        """
+        Test that the export includes each patient's images when asked to
+        """
+        response = await client.get('/patients/export', params={"include_images": True, "batch_size": 2})
+
+        assert response.status_code == 200
+        exported_images = {
+            patient["id"]: [img["img_uri"] for img in patient["images"]]
+            for patient in map(json.loads, response.text.splitlines())
+        }
+        expected_images = {
+            entity_data["id"]: [img_obj["img_uri"] for img_obj in fixtures.fixture_images(entity_data)]
+            for entity_data in fixtures.FIXTURE_DATA
+        }
+        assert exported_images == expected_images
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import uuid
+import datetime
+import pytest
+import pytest_asyncio
+from .. import fixtures, utils
+from ..main import app
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+# on top of the fixture image (2021-02-01) Jim gets a few more images, two of which share a timestamp
+HISTORY_TIMESTAMPS = [
+    "2021-03-01T00:00:00.000000Z",
+    "2021-04-01T00:00:00.000000Z",
+    "2021-04-01T00:00:00.000000Z",
+    "2021-05-01T00:00:00.000000Z",
+]
+
+
+@pytest_asyncio.fixture(scope="function")
+async def image_history(client):
+    entity_data = fixtures.FIXTURE_DATA[0]
+    for index, img_timestamp in enumerate(HISTORY_TIMESTAMPS):
+        key = utils.build_image_key(entity_data["id"], img_timestamp, "scan.jpg" if index != 2 else "scan.png")
+        await utils.record_patient_image(app.mongodb, key)
+    # keys (newest first, `_id` descending among equal timestamps) of every image of Jim
+    image_docs = await app.mongodb.images.find({"patient_id": uuid.UUID(entity_data["id"])}).to_list(length=None)
+    return entity_data, [
+        image_doc["_id"] for image_doc in sorted(image_docs, key=lambda doc: (doc["img_timestamp"], doc["_id"]), reverse=True)
+    ]
+
+
+def image_keys(images):
+    return [img_obj["img_uri"].split("/", 1)[1] for img_obj in images]
+
+
+class TestPatientImageHistory:
+
+    @pytest.mark.parametrize(
+        'params, expected_slice',
+        [
+            ({}, slice(None)),
+            ({"limit": 2}, slice(0, 2)),
+            ({"since": "2021-04-01T00:00:00Z"}, slice(0, 3)),
+            ({"until": "2021-04-01T00:00:00Z"}, slice(3, None)),
+            ({"since": "2021-03-01T00:00:00Z", "until": "2021-05-01T00:00:00Z", "limit": 1}, slice(1, 2)),
+        ],
+        ids=[
+            "GET Patient Images: whole history newest first",
+            "GET Patient Images: latest N",
+            "GET Patient Images: since is inclusive",
+            "GET Patient Images: until is exclusive",
+            "GET Patient Images: latest N of a time window",
+        ]
+    )
+    async def test_image_history_filters(self, params, expected_slice, client, image_history):
+        """
+        Test that the since/until/limit filters apply the same way on the image history and detail endpoints
+        """
+        entity_data, keys = image_history
+
+        response = await client.get(f'/patients/{entity_data["id"]}/images', params=params)
+        assert response.status_code == 200
+        assert image_keys(response.json()["images"]) == keys[expected_slice]
+
+        response = await client.get(f'/patients/{entity_data["id"]}', params=params)
+        assert response.status_code == 200
+        assert image_keys(response.json()["images"]) == keys[expected_slice]
+
+    @pytest.mark.parametrize(
+        'limit',
+        [1, 2, 5],
+        ids=[
+            "GET Patient Images: page one image at a time (across equal timestamps)",
+            "GET Patient Images: page with a partial last page",
+            "GET Patient Images: page with everything on one page",
+        ]
+    )
+    async def test_image_history_pagination(self, limit, client, image_history):
+        """
+        Test that walking the pages via `next_cursor` yields every image exactly once, newest first
+        """
+        entity_data, keys = image_history
+        received_keys = []
+        params = {"limit": limit}
+        while True:
+            response = await client.get(f'/patients/{entity_data["id"]}/images', params=params)
+            assert response.status_code == 200
+            data = response.json()
+            assert len(data["images"]) <= limit
+            received_keys.extend(image_keys(data["images"]))
+            if data["next_cursor"] is None:
+                break
+            params["cursor"] = data["next_cursor"]
+        assert received_keys == keys
+
+    async def test_filtered_detail_bypasses_cache(self, client, image_history):
+        """
+        Test that a narrowed down detail response neither comes from nor ends up in the patient cache
+        """
+        entity_data, keys = image_history
+        response = await client.get(f'/patients/{entity_data["id"]}', params={"limit": 1})
+        assert image_keys(response.json()["images"]) == keys[:1]
+
+        response = await client.get(f'/patients/{entity_data["id"]}')
+        assert image_keys(response.json()["images"]) == keys
+
+    async def test_image_history_unknown_patient(self, client):
+        response = await client.get('/patients/5936a0f3-a854-4c49-bc96-000000000000/images')
+        assert response.status_code == 404
+
+    async def test_image_history_invalid_cursor(self, client):
+        response = await client.get(f'/patients/{fixtures.FIXTURE_DATA[0]["id"]}/images', params={"cursor": "not-a-cursor"})
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["loc"] == ["query", "cursor"]
+
+    async def test_image_history_uses_index(self, client, image_history):
+        """
+        Test that a time window page is answered off the image timestamp index rather than by sorting in memory
+        """
+        entity_data, _ = image_history
+        query = utils.build_patient_image_query(
+            entity_data["id"], since=datetime.datetime(2021, 3, 1), until=datetime.datetime(2021, 5, 1)
+        )
+        plan = await app.mongodb.images.find(query).sort(utils.PATIENT_IMAGE_SORT).limit(2).explain()
+        winning_plan = str(plan["queryPlanner"]["winningPlan"])
+        assert "patient_id_img_timestamp_id" in winning_plan
+        assert "'SORT'" not in winning_plan
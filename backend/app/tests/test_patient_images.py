@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import io
+import pytest
+from .. import fixtures, reconcile
+from ..main import app
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+def expected_image_uris(entity_data):
+    return [img_obj["img_uri"] for img_obj in fixtures.fixture_images(entity_data)]
+
+
+class TestPatientImages:
+
+    async def test_patient_detail_images(self, client):
+        """
+        Test that the detail endpoint returns the bootstrapped images (newest first) from the image metadata index
+        """
+        for entity_data in fixtures.FIXTURE_DATA:
+            response = await client.get(f'/patients/{entity_data["id"]}')
+            assert response.status_code == 200
+            assert [img["img_uri"] for img in response.json()["images"]] == expected_image_uris(entity_data)
+
+    async def test_upload_records_image_metadata(self, client):
+        """
+        Test that uploading an image records its metadata so that it immediately shows up on the detail endpoint
+        """
+        entity_data = fixtures.FIXTURE_DATA[1]
+        response = await client.put(
+            f'/patients/{entity_data["id"]}',
+            files={'uploaded_img_file': ('scan.jpg', io.BytesIO(b"not really a jpeg"), 'image/jpeg')},
+            data={'img_timestamp': "2023-01-01T10:00:00.000000Z"}
+        )
+        assert response.status_code == 200
+
+        image_doc = await app.mongodb.images.find_one({"_id": f"{entity_data['id']}/2023-01-01T10:00:00.000000Z.jpg"})
+        assert image_doc["size"] == len(b"not really a jpeg")
+        assert image_doc["content_type"] == "image/jpeg"
+
+        response = await client.get(f'/patients/{entity_data["id"]}')
+        newest_image = response.json()["images"][0]
+        assert newest_image["img_uri"].endswith(f"/{image_doc['object_key']}")
+        assert newest_image["img_timestamp"] == "2023-01-01T10:00:00Z"
+
+    async def test_reconcile_rebuilds_image_metadata(self, client):
+        """
+        Test that the reconcile command rebuilds the image metadata purely from the bucket contents
+        """
+        await app.mongodb.images.delete_many({})
+        await app.mongodb.images.insert_one({"_id": "stale/key.jpg"})
+
+        result = await reconcile.reconcile_images(app.mongodb, app.storage)
+
+        assert result == {
+            "upserted": sum(len(entity_data["images_lst"]) for entity_data in fixtures.FIXTURE_DATA),
+            "removed": 1
+        }
+        for entity_data in fixtures.FIXTURE_DATA:
+            response = await client.get(f'/patients/{entity_data["id"]}')
+            assert [img["img_uri"] for img in response.json()["images"]] == expected_image_uris(entity_data)
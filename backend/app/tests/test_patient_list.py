@@ -3,7 +3,8 @@
 # 01/30/2024
 # FoS for Intuitive Surgical
 import pytest
-from .. import fixtures
+from .. import fixtures, utils
+from ..main import app
 
 
 pytestmark = pytest.mark.asyncio(scope="function")
@@ -52,3 +53,84 @@ class TestPatientList:
         received_patients_data = sorted(data["patients"], key=lambda x: x['first_name'])
 
         assert received_patients_data == actual_patients_data
+
+    @pytest.mark.parametrize(
+        'limit',
+        [1, 2, len(fixtures.FIXTURE_DATA)],
+        ids=[
+            "GET Patient List: paginate one patient per page",
+            "GET Patient List: paginate with a partial last page",
+            "GET Patient List: paginate with everything on one page",
+        ]
+    )
+    async def test_patients_list_pagination(self, limit, client):
+        """
+        Test that walking the pages via `next_cursor` yields every patient exactly once, ordered by last/first name
+        """
+        received_patients_data = []
+        params = {"limit": limit}
+        while True:
+            response = await client.get('/patients', params=params)
+            assert response.status_code == 200
+            data = response.json()
+            assert len(data['patients']) <= limit
+            received_patients_data.extend(data['patients'])
+            if data['next_cursor'] is None:
+                break
+            params["cursor"] = data['next_cursor']
+
+        actual_patients_data = sorted(fixtures.FIXTURE_DATA, key=lambda x: (x['last_name'], x['first_name']))
+        assert [patient['id'] for patient in received_patients_data] == [patient['id'] for patient in actual_patients_data]
+
+    @pytest.mark.parametrize(
+        'params,expected_last_names',
+        [
+            ({"last_name": "Ro"}, ["Rogers"]),
+            ({"first_name": "Di"}, ["Simmons"]),
+            ({"first_name": "Jim", "last_name": "Jo"}, ["Jones"]),
+            ({"last_name": "ro"}, []),
+        ],
+        ids=[
+            "GET Patient List: last name prefix search",
+            "GET Patient List: first name prefix search",
+            "GET Patient List: first and last name prefix search",
+            "GET Patient List: prefix search is case sensitive",
+        ]
+    )
+    async def test_patients_list_search(self, params, expected_last_names, client):
+        """
+        Test the name prefix search filters on the patient list
+        """
+        response = await client.get('/patients', params=params)
+        assert response.status_code == 200
+        assert [patient['last_name'] for patient in response.json()['patients']] == expected_last_names
+
+    async def test_patients_list_invalid_cursor(self, client):
+        """
+        Test that a garbled cursor is rejected as a validation error rather than blowing up
+        """
+        response = await client.get('/patients', params={"cursor": "not-a-cursor"})
+        assert response.status_code == 422
+
+    @pytest.mark.parametrize(
+        'depth',
+        [0, len(fixtures.FIXTURE_DATA) - 1],
+        ids=[
+            "Explain: first page of the patient list",
+            "Explain: deep page of the patient list (cursor)",
+        ]
+    )
+    async def test_patients_list_uses_index(self, depth, client):
+        """
+        Test that a page of the list, however deep, is read off the list sort order index rather than by a collection
+        scan and an in memory sort (which is what made deep pages slow)
+        """
+        cursor = None
+        if depth:
+            _, cursor = await utils.list_patients_page(app.mongodb, depth)
+        query = utils.build_patient_list_query(cursor=cursor)
+        plan = await app.mongodb.patients.find(query, utils.PATIENT_LIST_PROJECTION).sort(utils.PATIENT_LIST_SORT).limit(2).explain()
+        winning_plan = str(plan["queryPlanner"]["winningPlan"])
+        assert "last_name_first_name_id" in winning_plan
+        assert "COLLSCAN" not in winning_plan
+        assert "'SORT'" not in winning_plan
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import json
+import pytest
+from .. import fixtures, models, responses, utils
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+class TestResponses:
+
+    async def test_patient_payload_matches_model(self, client, basic_crud):
+        """
+        Test that the fast path encodes a patient exactly like validating it through `models.Patient` would
+        """
+        _, db_handle = basic_crud
+        for entity_data in fixtures.FIXTURE_DATA:
+            patient = await utils.get_patient_entity(db_handle, entity_data["id"])
+            expected = json.loads(models.Patient.model_validate(patient).model_dump_json())
+            assert json.loads(responses.dumps(responses.patient_payload(patient))) == expected
+
+    async def test_patient_list_payload_matches_model(self, client, basic_crud):
+        """
+        Test that the fast path encodes a patient list page exactly like `models.PatientCollection` would
+        """
+        _, db_handle = basic_crud
+        patients, next_cursor = await utils.list_patients_page(db_handle, 2)
+        expected = json.loads(models.PatientCollection(patients=patients, next_cursor=next_cursor).model_dump_json())
+        payload = {"patients": [responses.patient_list_payload(patient) for patient in patients], "next_cursor": next_cursor}
+        assert json.loads(responses.dumps(payload)) == expected
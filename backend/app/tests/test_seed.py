@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# Author: Suraj Ravichandran
+# 10/17/2026
+# FoS for Intuitive Surgical
+import os
+import pytest
+from .. import seed, fixtures
+from ..main import app
+from ..benchmarks import datagen
+
+
+pytestmark = pytest.mark.asyncio(scope="function")
+
+
+def generated_patients():
+    return datagen.generate_patients(25, images_per_patient=2, seed=42)
+
+
+class TestSeed:
+
+    async def test_seed_patients(self, client, s3_client):
+        """
+        Test that seeding loads every patient, uploads and records every image
+        """
+        _, test_bucket_resource = s3_client
+        result = await seed.seed_patients(app.mongodb, app.storage, os.environ["PATIENT_IMG_BUCKET"], generated_patients(), batch_size=10)
+
+        assert result == {"patients_inserted": 25, "patients_skipped": 0, "images_uploaded": 50, "images_skipped": 0}
+        assert await app.mongodb.patients.count_documents({}) == 25 + len(fixtures.FIXTURE_DATA)
+        patient = next(generated_patients())
+        response = await client.get(f'/patients/{patient["_id"]}')
+        assert response.status_code == 200
+        assert len(response.json()["images"]) == 2
+        uploaded_keys = {s3_obj.key for s3_obj in test_bucket_resource.objects.all()}
+        assert all(key in uploaded_keys for key, _ in seed.patient_image_keys(patient))
+
+    async def test_seed_patients_resumes(self, client):
+        """
+        Test that re-seeding the same dataset only loads what is missing (e.g. after an interrupted run)
+        """
+        bucket = os.environ["PATIENT_IMG_BUCKET"]
+        await seed.seed_patients(app.mongodb, app.storage, bucket, generated_patients())
+        # simulate a run that died halfway through
+        patient = next(generated_patients())
+        await app.mongodb.patients.delete_one({"_id": patient["_id"]})
+        await app.mongodb.images.delete_many({"_id": {"$in": [key for key, _ in seed.patient_image_keys(patient)]}})
+
+        result = await seed.seed_patients(app.mongodb, app.storage, bucket, generated_patients(), batch_size=10)
+
+        assert result == {"patients_inserted": 1, "patients_skipped": 24, "images_uploaded": 2, "images_skipped": 48}
+        assert await app.mongodb.patients.count_documents({}) == 25 + len(fixtures.FIXTURE_DATA)
+        assert await app.mongodb.images.count_documents({}) == 50 + sum(len(entity_data["images_lst"]) for entity_data in fixtures.FIXTURE_DATA)
+
+    async def test_populate_fixtures_is_idempotent(self, client):
+        """
+        Test that populating the fixtures again (as every startup does) leaves the database untouched
+        """
+        patients_before = await app.mongodb.patients.find({}).to_list(length=None)
+
+        await fixtures.populate_fixtures(app.mongodb, app.storage)
+
+        assert await app.mongodb.patients.find({}).to_list(length=None) == patients_before
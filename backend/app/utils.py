@@ -3,20 +3,44 @@
 # 01/20/2024
 # FoS for Intuitive Surgical
 import os
+import re
+import json
 import uuid
+import base64
 import datetime
+import mimetypes
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.server_api import ServerApi
+from . import metrics
 
 
 DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+PATIENT_LIST_SORT = [("last_name", 1), ("first_name", 1), ("_id", 1)]
+PATIENT_LIST_PROJECTION = {"first_name": 1, "last_name": 1}
+PATIENT_IMAGE_PROJECTION = {"img_timestamp": 1, "derivatives": 1, "object_key": 1, "tier": 1}
+PATIENT_IMAGE_SORT = [("img_timestamp", -1), ("_id", -1)]
+# images moved to the cold bucket (see `archive.py`) are marked with this `tier`, hot images have none
+ARCHIVE_TIER = "archive"
+HOT_IMAGES = {"tier": {"$exists": False}}
 UUID4_REGEX_PATTERN = r"^[0-9(a-f|A-F)]{8}-[0-9(a-f|A-F)]{4}-4[0-9(a-f|A-F)]{3}-[89ab][0-9(a-f|A-F)]{3}-[0-9(a-f|A-F)]{12}$"
 
 
 async def get_mongodb_connection(db_name: str = None):
+    """
+    Connect to mongo, the connection pool (one per process, so per worker) is sized via `MONGO_MAX_POOL_SIZE` and
+    `MONGO_MIN_POOL_SIZE` if set (pymongo's defaults of 100 and 0 otherwise)
+    """
     db_name = db_name or os.environ['DB_NAME']
     mongo_uri = f"mongodb://{os.environ['DB_USER']}:{os.environ['DB_PASS']}@{os.environ['DB_HOST']}:27017/{db_name}"
-    db_client = AsyncIOMotorClient(mongo_uri, server_api=ServerApi('1'), uuidRepresentation="standard")
+    pool_options = {
+        option: int(os.environ[env_var])
+        for option, env_var in [("maxPoolSize", "MONGO_MAX_POOL_SIZE"), ("minPoolSize", "MONGO_MIN_POOL_SIZE")]
+        if os.environ.get(env_var)
+    }
+    db_client = AsyncIOMotorClient(
+        mongo_uri, server_api=ServerApi('1'), uuidRepresentation="standard", event_listeners=metrics.command_listeners(),
+        **pool_options
+    )
     db_handle = db_client[db_name]
     return db_client, db_handle
 
@@ -31,48 +55,258 @@ def collect_parameters(keys):
             raise SystemError(f'Missing environment variable: {key}')
 
 
+def patient_to_document(patient) -> dict:
+    """
+    Convert a validated `models.PatientInput` into the document we store in mongo
+    """
+    # nulls are left out rather than stored (see `indexes.COMPACT_FIELDS`)
+    patient_data = patient.model_dump(by_alias=True, exclude_none=True)
+    # see https://stackoverflow.com/a/44273588 for why I'm converting to datetime
+    patient_data["date_of_birth"] = datetime.datetime.combine(patient_data["date_of_birth"], datetime.time.min)
+    # revision counter and last write time, the basis of the HTTP validators (ETag/Last-Modified) of the patient
+    patient_data["rev"] = 1
+    patient_data["updated_at"] = datetime.datetime.now(datetime.timezone.utc)
+    return patient_data
+
+
+async def bump_patient_revision(db_client, patient_id):
+    """
+    Record that the patient's record (or its images) changed, every write affecting what the patient's detail looks
+    like has to go through here so that clients holding on to the old version get to see the new one
+    """
+    await db_client.patients.update_one(
+        {"_id": uuid.UUID(str(patient_id))},
+        {"$inc": {"rev": 1}, "$set": {"updated_at": datetime.datetime.now(datetime.timezone.utc)}}
+    )
+
+
+async def aiter_list(items):
+    """
+    Wrap a plain list into an async iterator (for helpers that consume async streams)
+    """
+    for item in items:
+        yield item
+
+
 def get_utcnow():
     """
     Get a string representing UTC now already preformatted with the desired output format
     :return: string
     """
-    return datetime.datetime.now(datetime.timezone.utc).strftime(DATETIME_FORMAT)
+    return format_timestamp(datetime.datetime.now(datetime.timezone.utc))
 
 
-def get_patient_images(s3_client, patient_id: str):
+def format_timestamp(timestamp: datetime.datetime) -> str:
+    """
+    Format a timestamp (converted to UTC) the way we embed it in image object keys
+    :return: string
+    """
+    return as_utc(timestamp).strftime(DATETIME_FORMAT)
+
+
+def build_image_key(patient_id: str, img_timestamp: str, filename: str) -> str:
+    """
+    Object storage key for a patient image, i.e. `{patient_id}/{img_timestamp}.{ext}` (extension taken from `filename`)
+    """
+    file_type_suffix = filename.rsplit(".", 1)
+    file_type_suffix = f".{file_type_suffix[1]}" if len(file_type_suffix) > 1 else ""
+    return f"{patient_id}/{img_timestamp}{file_type_suffix}"
+
+
+def parse_image_key(key: str):
+    """
+    Split an object storage key of the form `{patient_id}/{img_timestamp}[.ext]` into its parts
+    :param str key: object storage key (without the bucket name)
+    :return: tuple of (patient_id, img_timestamp)
+    :rtype: tuple(uuid.UUID, datetime.datetime)
+    """
+    patient_id, file_name = key.split("/", 1)
+    # incase there is a ".jpeg" (or other img) extension remove it
+    if "Z" in file_name:
+        img_ts = f"{file_name.split('Z')[0]}Z"
+    elif "." in file_name:
+        img_ts = file_name.rsplit(".", 1)[0]
+    else:
+        img_ts = file_name
+    return uuid.UUID(patient_id), as_utc(datetime.datetime.fromisoformat(img_ts))
+
+
+def as_utc(timestamp: datetime.datetime) -> datetime.datetime:
+    """
+    Timestamps without any timezone info are treated as being in UTC (which is what we store them as in mongo)
+    """
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp.astimezone(datetime.timezone.utc)
+
+
+def build_patient_image_document(key: str, size: int = None, content_type: str = None) -> dict:
+    """
+    Build the `images` collection document (our metadata index over the object storage bucket) for the object `key`
+    """
+    patient_id, img_timestamp = parse_image_key(key)
+    image_doc = {"_id": key, "patient_id": patient_id, "img_timestamp": img_timestamp}
+    # whatever we do not know is left out rather than stored as null (see `indexes.COMPACT_FIELDS`)
+    if size is not None:
+        image_doc["size"] = size
+    if content_type := content_type or mimetypes.guess_type(key)[0]:
+        image_doc["content_type"] = content_type
+    return image_doc
+
+
+async def record_patient_image(db_client, key: str, size: int = None, content_type: str = None):
+    """
+    Upsert the metadata for a freshly uploaded patient image (keyed on its object storage key, so re-uploads and
+    the reconcile command can safely re-record the same image)
+    """
+    image_doc = build_patient_image_document(key, size=size, content_type=content_type)
+    await db_client.images.replace_one({"_id": key}, image_doc, upsert=True)
+    await bump_patient_revision(db_client, image_doc["patient_id"])
+    return image_doc
+
+
+def encode_image_cursor(image_doc) -> str:
+    """
+    Encode the sort key of the last image on a page of a patient's image history into an opaque (url safe) cursor token
+    """
+    sort_key = [format_timestamp(image_doc["img_timestamp"]), image_doc["_id"]]
+    return base64.urlsafe_b64encode(json.dumps(sort_key).encode()).decode()
+
+
+def decode_image_cursor(cursor: str):
+    """
+    Inverse of `encode_image_cursor`
+    :return: tuple of (img_timestamp, image key)
+    :raises ValueError: if the cursor token is malformed
+    """
+    try:
+        img_timestamp, img_key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return as_utc(datetime.datetime.strptime(img_timestamp, DATETIME_FORMAT)), str(img_key)
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def build_patient_image_query(
+        patient_id: str, since: datetime.datetime = None, until: datetime.datetime = None, cursor: str = None,
+        include_archived: bool = False
+) -> dict:
+    """
+    Build the mongo filter for (a page of) a patient's image history.
+
+    `since` is inclusive and `until` exclusive, both turn into a range on `img_timestamp` and the cursor into a keyset
+    condition on `(img_timestamp, _id)` (descending), so everything is answered off the
+    `(patient_id, img_timestamp, _id)` index without mongo ever looking at images outside of the requested window.
+
+    Archived images are left out unless `include_archived` is set. Those are the oldest ones, i.e. at the far end of
+    the newest first index order, so a `limit`ed listing of the hot images rarely gets to see them at all.
+    """
+    query = {"patient_id": uuid.UUID(patient_id)}
+    if not include_archived:
+        query.update(HOT_IMAGES)
+    img_timestamp_range = {}
+    if since is not None:
+        img_timestamp_range["$gte"] = as_utc(since)
+    if until is not None:
+        img_timestamp_range["$lt"] = as_utc(until)
+    if img_timestamp_range:
+        query["img_timestamp"] = img_timestamp_range
+    if cursor:
+        cursor_timestamp, cursor_key = decode_image_cursor(cursor)
+        query["$or"] = [
+            {"img_timestamp": {"$lt": cursor_timestamp}},
+            {"img_timestamp": cursor_timestamp, "_id": {"$lt": cursor_key}},
+        ]
+    return query
+
+
+async def get_patient_images(
+        db_client, patient_id: str, since: datetime.datetime = None, until: datetime.datetime = None, limit: int = None,
+        include_archived: bool = False
+):
     """
     Helper function to obtain all the medical images associated with the provided patient id
-    :param s3_client: the boto3 s3_client handle
+    (served by the `(patient_id, img_timestamp, _id)` index on the images collection, newest first)
+    :param db_client: the mongodb database handle
     :param str patient_id: uuid of the patient
+    :param since: only images taken at or after this time
+    :param until: only images taken before this time
+    :param int limit: only the latest `limit` images (of the time window)
+    :param include_archived: whether to include the images that were moved to the cold bucket
     :return: list of patient image uris
     :rtype: list(dict)
     """
-    paginator = s3_client.get_paginator('list_objects_v2')
-    s3_objects = (
-        s3_obj
-        for page in paginator.paginate(Bucket=os.environ['PATIENT_IMG_BUCKET'], Prefix=patient_id)
-        for s3_obj in page.get('Contents', [])
-    )
-    sorted_s3_objects = sorted(s3_objects, key=lambda obj: int(obj['LastModified'].strftime('%s')), reverse=True)
-    return [format_patient_image_object(s3_object) for s3_object in sorted_s3_objects]
+    image_docs = await db_client.images.find(
+        build_patient_image_query(patient_id, since=since, until=until, include_archived=include_archived),
+        PATIENT_IMAGE_PROJECTION
+    ).sort(PATIENT_IMAGE_SORT).limit(limit or 0).to_list(length=None)
+    with metrics.timed("step", "format_patient_image_objects"):
+        return [format_patient_image_object(image_doc) for image_doc in image_docs]
 
 
-def format_patient_image_object(s3_object) -> dict:
-    # incase there is a ".jpeg" (or other img) extension remove it
-    if "Z" in s3_object['Key']:
-        split_parts = s3_object['Key'].split("/")[1].split("Z")
-        img_ts = f"{split_parts[0]}Z"
-    elif "." in s3_object['Key']:
-        split_parts = s3_object['Key'].split("/")[1].rsplit(".", 1)
-        img_ts = split_parts[0]
+async def list_patient_images_page(
+        db_client, patient_id: str, limit: int, cursor: str = None,
+        since: datetime.datetime = None, until: datetime.datetime = None, include_archived: bool = False
+):
+    """
+    Fetch one page of a patient's image history ordered newest first
+    :return: tuple of (list of patient image uris, next page cursor or None if this is the last page)
+    :raises ValueError: if the cursor token is malformed
+    """
+    query = build_patient_image_query(patient_id, since=since, until=until, cursor=cursor, include_archived=include_archived)
+    # fetch one extra image so that we know whether there is a next page without a separate count
+    image_docs = await db_client.images.find(
+        query, PATIENT_IMAGE_PROJECTION
+    ).sort(PATIENT_IMAGE_SORT).limit(limit + 1).to_list(length=None)
+    next_cursor = None
+    if len(image_docs) > limit:
+        image_docs = image_docs[:limit]
+        next_cursor = encode_image_cursor(image_docs[-1])
+    with metrics.timed("step", "format_patient_image_objects"):
+        return [format_patient_image_object(image_doc) for image_doc in image_docs], next_cursor
+
 
+async def get_images_for_patients(db_client, patient_ids, include_archived: bool = False) -> dict:
+    """
+    Bulk version of `get_patient_images`, fetches the images of many patients with a single `$in` query
+    :param db_client: the mongodb database handle
+    :param patient_ids: iterable of patient uuids
+    :param include_archived: whether to include the images that were moved to the cold bucket
+    :return: mapping of patient uuid to its list of patient image uris (newest first), patients without any images
+        are absent from the mapping
+    :rtype: dict(uuid.UUID, list(dict))
+    """
+    images_by_patient = {}
+    query = {"patient_id": {"$in": list(patient_ids)}}
+    if not include_archived:
+        query.update(HOT_IMAGES)
+    image_docs = await db_client.images.find(
+        query, {"patient_id": 1, **PATIENT_IMAGE_PROJECTION}
+    ).sort([("patient_id", 1), *PATIENT_IMAGE_SORT]).to_list(length=None)
+    with metrics.timed("step", "format_patient_image_objects"):
+        for image_doc in image_docs:
+            images_by_patient.setdefault(image_doc["patient_id"], []).append(format_patient_image_object(image_doc))
+    return images_by_patient
+
+
+def format_patient_image_object(image_doc) -> dict:
+    bucket = os.environ['PATIENT_IMG_BUCKET']
+    archived = image_doc.get('tier') == ARCHIVE_TIER
+    # archival may have been switched off since (no `ARCHIVE_IMG_BUCKET`), list the image under the hot bucket then
+    # rather than failing the whole listing
+    image_bucket = (os.environ.get('ARCHIVE_IMG_BUCKET') or bucket) if archived else bucket
+    derivatives = image_doc.get('derivatives') or {}
     return {
-        'img_uri': f"{os.environ['PATIENT_IMG_BUCKET']}/{s3_object['Key']}",
-        'img_timestamp': datetime.datetime.fromisoformat(img_ts)
+        # content addressed images (see `blobs.py`) live under their `object_key`, the rest under their own key (in the
+        # cold bucket once archived, their much smaller renditions stay put)
+        'img_uri': f"{image_bucket}/{image_doc.get('object_key') or image_doc['_id']}",
+        'img_timestamp': as_utc(image_doc['img_timestamp']),
+        'thumbnail_uri': f"{bucket}/{derivatives['thumbnail']}" if 'thumbnail' in derivatives else None,
+        'preview_uri': f"{bucket}/{derivatives['preview']}" if 'preview' in derivatives else None,
+        'archived': archived
     }
 
 
-async def get_patient_entity(db_client, s3_client, patient_id):
+async def get_patient_entity(db_client, patient_id, **image_filters):
     """
     Utility function to retrieve patient database entry provided `patient_id` specified exists in the
     database else returns None.
@@ -81,12 +315,97 @@ async def get_patient_entity(db_client, s3_client, patient_id):
     patient's medical images if they're available.
 
     :param db_client:
-    :param s3_client:
     :param patient_id:
+    :param image_filters: `since`/`until`/`limit` to narrow down the images with (see `get_patient_images`)
     :return:
     """
     if (patient := await db_client.patients.find_one({"_id": uuid.UUID(patient_id)})) is not None:
-        patient["images"] = get_patient_images(s3_client, patient_id)
+        patient["images"] = await get_patient_images(db_client, patient_id, **image_filters)
         patient["date_of_birth"] = patient["date_of_birth"].date()
         return patient
     return None
+
+
+async def get_patient_entities(db_client, patient_ids) -> dict:
+    """
+    Bulk version of `get_patient_entity`, looks up many patients with a single `$in` query and their images with
+    another one (see `get_images_for_patients`)
+    :param db_client: the mongodb database handle
+    :param patient_ids: iterable of patient uuids
+    :return: mapping of patient uuid to patient entity, patients that do not exist are absent from the mapping
+    :rtype: dict(uuid.UUID, dict)
+    """
+    patients = {
+        patient["_id"]: patient
+        async for patient in db_client.patients.find({"_id": {"$in": list(set(patient_ids))}})
+    }
+    images_by_patient = await get_images_for_patients(db_client, patients) if patients else {}
+    for patient_id, patient in patients.items():
+        patient["images"] = images_by_patient.get(patient_id, [])
+        patient["date_of_birth"] = patient["date_of_birth"].date()
+    return patients
+
+
+def encode_list_cursor(patient) -> str:
+    """
+    Encode the sort key of the last patient on a page into an opaque (url safe) cursor token
+    """
+    sort_key = [patient["last_name"], patient["first_name"], str(patient["_id"])]
+    return base64.urlsafe_b64encode(json.dumps(sort_key).encode()).decode()
+
+
+def decode_list_cursor(cursor: str):
+    """
+    Inverse of `encode_list_cursor`
+    :return: tuple of (last_name, first_name, patient_id)
+    :raises ValueError: if the cursor token is malformed
+    """
+    try:
+        last_name, first_name, patient_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(last_name), str(first_name), uuid.UUID(patient_id)
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def build_patient_list_query(cursor: str = None, first_name: str = None, last_name: str = None,
+                             date_of_birth: datetime.date = None) -> dict:
+    """
+    Build the mongo filter for one page of the patient list.
+
+    Name filters are (case sensitive) prefix matches which mongo can answer straight off the name indexes, the date of
+    birth filter is an exact match served by its own index (which is also in list order), and the cursor turns into a
+    keyset condition on `(last_name, first_name, _id)` so that fetching page N costs the same as fetching page 1 (no
+    skip).
+    """
+    conditions = []
+    if date_of_birth:
+        conditions.append({"date_of_birth": datetime.datetime.combine(date_of_birth, datetime.time.min)})
+    if last_name:
+        conditions.append({"last_name": {"$regex": f"^{re.escape(last_name)}"}})
+    if first_name:
+        conditions.append({"first_name": {"$regex": f"^{re.escape(first_name)}"}})
+    if cursor:
+        cursor_last_name, cursor_first_name, cursor_id = decode_list_cursor(cursor)
+        conditions.append({"$or": [
+            {"last_name": {"$gt": cursor_last_name}},
+            {"last_name": cursor_last_name, "first_name": {"$gt": cursor_first_name}},
+            {"last_name": cursor_last_name, "first_name": cursor_first_name, "_id": {"$gt": cursor_id}},
+        ]})
+    if not conditions:
+        return {}
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+async def list_patients_page(db_client, limit: int, cursor: str = None, first_name: str = None, last_name: str = None,
+                             date_of_birth: datetime.date = None):
+    """
+    Fetch one page of the (abridged) patient list ordered by `(last_name, first_name, _id)`
+    :return: tuple of (list of patient dicts, next page cursor or None if this is the last page)
+    """
+    query = build_patient_list_query(cursor=cursor, first_name=first_name, last_name=last_name, date_of_birth=date_of_birth)
+    # fetch one extra record so that we know whether there is a next page without a separate count
+    patients = await db_client.patients.find(query, PATIENT_LIST_PROJECTION).sort(PATIENT_LIST_SORT).to_list(length=limit + 1)
+    if len(patients) > limit:
+        patients = patients[:limit]
+        return patients, encode_list_cursor(patients[-1])
+    return patients, None